@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Content-addressed asset store: assets_dir/<asset_id> (sharded if the directory opted in, see
+layout.py) plus a small SQLite index (assets_dir/.assets.sqlite3) recording which documents
+reference each asset.
+
+An asset id is derived from the SHA-256 of its bytes, so a stored file never changes: put_*
+skip the write when the file already exists and otherwise rename a fully written temp file
+into place. Reference counts come from (asset_id, doc_id) rows; set_refs() replaces a
+document's rows on re-ingest, so counts stay exact across backfills.
+
+The index also maps resolved source URLs to the asset they produced, with the response's
+ETag / Last-Modified and a freshness deadline (Cache-Control max-age, else url_ttl). The assets
+stage reuses a fresh entry without a request and revalidates a stale one with a conditional
+GET, so re-ingesting an archive costs almost no asset traffic.
+
+Failed URLs are remembered too (negative cache): a URL that 404s or times out is not requested
+again until a TTL chosen by failure class has passed (NEGATIVE_TTLS: long for 404/410, short
+for timeouts and 5xx). The table lives in the shared index, so every worker process skips it.
+
+Usage:
+  python -m ingest.asset_store failures [--assets dir] [--limit 20]   # top failing hosts
+  python -m ingest.asset_store forget [--assets dir] [host ...]       # clear the negative cache
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .layout import entry_path, find_entry
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+INDEX_NAME = ".assets.sqlite3"
+# Keep in sync with raw_ingest/common/asset_store.py
+SCHEMA_VERSION = 3
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    asset_id TEXT NOT NULL,
+    doc_id   TEXT NOT NULL,
+    PRIMARY KEY (asset_id, doc_id)
+);
+CREATE INDEX IF NOT EXISTS refs_doc ON refs (doc_id);
+"""
+# user_version -> statements upgrading the previous version
+_MIGRATIONS: dict[int, tuple[str, ...]] = {
+    2: (
+        """CREATE TABLE IF NOT EXISTS urls (
+            url           TEXT PRIMARY KEY,
+            asset_id      TEXT NOT NULL,
+            etag          TEXT,
+            last_modified TEXT,
+            fetched_at    REAL NOT NULL,
+            fresh_until   REAL NOT NULL
+        )""",
+    ),
+    3: (
+        """CREATE TABLE IF NOT EXISTS failures (
+            url         TEXT PRIMARY KEY,
+            host        TEXT NOT NULL,
+            kind        TEXT NOT NULL,
+            error       TEXT,
+            failures    INTEGER NOT NULL DEFAULT 0,
+            elapsed     REAL NOT NULL DEFAULT 0,
+            failed_at   REAL NOT NULL,
+            retry_after REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS failures_host ON failures (host)",
+    ),
+}
+# Mode of stored files: mkstemp creates 0600 temp files, and assets are served as plain files.
+# Fixed rather than derived from the umask, which can only be read by setting it process-wide.
+FILE_MODE = 0o644
+# How long a cached URL is reused without revalidation when the server sends no max-age
+DEFAULT_URL_TTL = 7 * 24 * 3600.0
+# Failure kind -> seconds a failing URL is skipped before it is tried again
+NEGATIVE_TTLS = {
+    "not_found": 7 * 24 * 3600.0,  # 404 / 410
+    "client_error": 24 * 3600.0,  # other 4xx
+    "too_large": 24 * 3600.0,  # over max_bytes, or an empty body
+    "server_error": 15 * 60.0,  # 5xx
+    "network": 10 * 60.0,  # DNS / connection refused / reset
+    "timeout": 5 * 60.0,
+}
+
+
+class AssetStore:
+    """One assets directory: immutable asset files and their document references."""
+
+    def __init__(self, assets_dir: Path, url_ttl: float = DEFAULT_URL_TTL):
+        self.assets_dir = Path(assets_dir)
+        self.url_ttl = url_ttl
+        self.assets_dir.mkdir(parents=True, exist_ok=True)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        # Files moved into place / writes avoided because the asset already existed
+        self.written = 0
+        self.skipped = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = _open_index(self.assets_dir / INDEX_NAME)
+        return self._conn
+
+    def path(self, asset_id: str) -> Path:
+        """Where asset_id is written in the directory's layout (flat or sharded, see layout.py)."""
+        return entry_path(self.assets_dir, asset_id)
+
+    def has(self, asset_id: str) -> bool:
+        return find_entry(self.assets_dir, asset_id) is not None
+
+    def temp_file(self) -> tuple[int, Path]:
+        """(fd, path) of a new temp file next to the assets, so put_file() is a rename."""
+        fd, tmp = tempfile.mkstemp(dir=self.assets_dir, prefix=".", suffix=".part")
+        return fd, Path(tmp)
+
+    def put_file(self, tmp: Path, asset_id: str) -> Path:
+        """Move a fully written temp file into place, or drop it if the asset already exists."""
+        existing = find_entry(self.assets_dir, asset_id)
+        if existing is not None:
+            tmp.unlink(missing_ok=True)
+            self.skipped += 1
+            return existing
+        final = self.path(asset_id)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, final)
+        self.written += 1
+        return final
+
+    def put_bytes(self, data: bytes, asset_id: str) -> Path:
+        existing = find_entry(self.assets_dir, asset_id)
+        if existing is not None:
+            self.skipped += 1
+            return existing
+        fd, tmp = self.temp_file()
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        return self.put_file(tmp, asset_id)
+
+    def put_copy(self, src: Path, asset_id: str) -> Path:
+        """Copy src into the store (streamed) unless asset_id is already present."""
+        existing = find_entry(self.assets_dir, asset_id)
+        if existing is not None:
+            self.skipped += 1
+            return existing
+        fd, tmp = self.temp_file()
+        with os.fdopen(fd, "wb") as out, open(src, "rb") as f:
+            shutil.copyfileobj(f, out)
+        return self.put_file(tmp, asset_id)
+
+    def set_refs(self, doc_id: str, asset_ids: list[str]) -> None:
+        """Record that doc_id references exactly asset_ids (replacing its previous references)."""
+        conn = self.conn
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM refs WHERE doc_id = ?", (doc_id,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO refs (asset_id, doc_id) VALUES (?, ?)",
+                    [(asset_id, doc_id) for asset_id in set(asset_ids)],
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def refcount(self, asset_id: str) -> int:
+        """Number of documents referencing asset_id."""
+        conn = self.conn
+        with self._lock:
+            row = conn.execute("SELECT COUNT(*) FROM refs WHERE asset_id = ?", (asset_id,)).fetchone()
+        return row[0]
+
+    def lookup_url(self, url: str) -> dict | None:
+        """Cache entry for url (asset_id, etag, last_modified, fetched_at, fresh_until) if its asset is stored."""
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT asset_id, etag, last_modified, fetched_at, fresh_until FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not self.has(row[0]):
+            return None
+        return dict(zip(("asset_id", "etag", "last_modified", "fetched_at", "fresh_until"), row))
+
+    def record_url(self, url: str, asset_id: str, etag: str | None, last_modified: str | None, fresh_for: float) -> None:
+        """Remember that url returned asset_id (after a 200 or a 304 revalidation)."""
+        now = time.time()
+        conn = self.conn
+        with self._lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, asset_id, etag, last_modified, fetched_at, fresh_until) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, asset_id, etag, last_modified, now, now + max(0.0, fresh_for)),
+            )
+            conn.execute("DELETE FROM failures WHERE url = ?", (url,))
+
+    def lookup_failure(self, url: str) -> dict | None:
+        """Negative cache entry for url (kind, error, failures, retry_after) while it is still live."""
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT kind, error, failures, retry_after FROM failures WHERE url = ? AND retry_after > ?",
+                (url, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("kind", "error", "failures", "retry_after"), row))
+
+    def record_failure(self, url: str, host: str, kind: str, error: str, elapsed: float = 0.0) -> None:
+        """Skip url for NEGATIVE_TTLS[kind] seconds; elapsed is the time the failed fetch took."""
+        now = time.time()
+        ttl = NEGATIVE_TTLS.get(kind, NEGATIVE_TTLS["network"])
+        conn = self.conn
+        with self._lock:
+            conn.execute(
+                "INSERT INTO failures (url, host, kind, error, failures, elapsed, failed_at, retry_after) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET kind = excluded.kind, error = excluded.error, "
+                "failures = failures + 1, elapsed = elapsed + excluded.elapsed, "
+                "failed_at = excluded.failed_at, retry_after = excluded.retry_after",
+                (url, host, kind, error[:500], elapsed, now, now + ttl),
+            )
+
+    def failing_hosts(self, limit: int = 20) -> list[dict]:
+        """Hosts ordered by total time lost to failed fetches: urls, failures, seconds, kinds."""
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute(
+                "SELECT host, COUNT(*), SUM(failures), SUM(elapsed), GROUP_CONCAT(DISTINCT kind) "
+                "FROM failures GROUP BY host ORDER BY SUM(elapsed) DESC, SUM(failures) DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(zip(("host", "urls", "failures", "elapsed", "kinds"), row)) for row in rows]
+
+    def forget_failures(self, hosts: list[str] | None = None) -> int:
+        """Drop negative cache entries (all, or for hosts) so those URLs are tried again."""
+        conn = self.conn
+        with self._lock:
+            if hosts:
+                cur = conn.executemany("DELETE FROM failures WHERE host = ?", [(h.lower(),) for h in hosts])
+            else:
+                cur = conn.execute("DELETE FROM failures")
+        return cur.rowcount
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _open_index(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another process may have migrated meanwhile
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                for stmt in _SCHEMA.split(";"):
+                    if stmt.strip():
+                        conn.execute(stmt)
+                version = 1
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                for stmt in _MIGRATIONS[v]:
+                    conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return conn
+
+
+# One store per assets directory per process; dropped after fork (sqlite handles must not cross)
+_STORES: dict[Path, AssetStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(assets_dir: Path) -> AssetStore:
+    key = Path(assets_dir).resolve()
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = AssetStore(key)
+    return store
+
+
+def _reset_after_fork() -> None:
+    global _STORES_LOCK
+    _STORES.clear()
+    _STORES_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or clear the asset negative cache")
+    ap.add_argument("--assets", default=None, help="Assets directory (default: data/assets)")
+    sub = ap.add_subparsers(dest="command")
+    fl = sub.add_parser("failures", help="Hosts that cost the most time in failed asset fetches")
+    fl.add_argument("--limit", type=int, default=20, help="Max hosts listed")
+    fg = sub.add_parser("forget", help="Clear negative cache entries so the URLs are fetched again")
+    fg.add_argument("hosts", nargs="*", help="Only these hosts (default: all)")
+    args = ap.parse_args()
+
+    store = AssetStore(Path(args.assets or REPO_ROOT / "data" / "assets"))
+    if args.command == "forget":
+        print(f"forgotten: {store.forget_failures(args.hosts)}")
+        return
+    for row in store.failing_hosts(getattr(args, "limit", 20)):
+        print(
+            row["host"],
+            f"urls={row['urls']}",
+            f"failures={row['failures']}",
+            f"lost={row['elapsed']:.1f}s",
+            f"kinds={row['kinds']}",
+        )
+
+
+if __name__ == "__main__":
+    main()
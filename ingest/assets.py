@@ -1,18 +1,52 @@
 """
 Resolve figure refs: download or decode images, save to assets/, rewrite Document with paths.
 
+Figures from SingleFile pages usually carry kc-inline handles (see inline_data.py) instead of
+data: URIs; their bytes are read from the inline store passed to process_assets.
+
+Remote images are fetched concurrently (a thread pool capped at max_concurrency, at most
+per_host requests to one host at a time); results are applied in document order, so sections
+and asset ids do not depend on which download finishes first. Each distinct source (after
+resolving relative URLs) is staged once per document and shared by every figure using it.
+
+Downloads are streamed in chunks to a temp file in assets_dir while their SHA-256 is computed,
+then renamed into place; a download larger than max_bytes is aborted. asset_id is the first
+16 hex digits of the SHA-256 of the whole file. Files go through asset_store.AssetStore, which
+skips writing assets that already exist and records which documents reference each asset.
+
+Each download is also recorded in the store's URL cache: a URL seen before is reused without a
+request while fresh, then revalidated with If-None-Match / If-Modified-Since (304 = reuse).
+Failures are recorded as well: a URL that 404ed, timed out, etc. is skipped without a request
+until its negative cache TTL (asset_store.NEGATIVE_TTLS, by failure kind) runs out. A URL that
+already produced an asset keeps it when revalidation fails (stale-if-error).
+
 Image format: we preserve the source format (spec 6.5: assets/<asset_id>.<ext>).
-If the page uses data:image/webp;base64,... or Content-Type image/webp, we save as .webp.
+If the page uses data:image/webp;base64,... or Content-Type image/webp, we save as .webp
+(data: URIs are decoded by data_uri.decode_data_uri; image/svg+xml is saved as .svg).
 No conversion to PNG/JPG is done unless we add an optional policy later.
 """
-import base64
 import hashlib
-import re
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urldefrag, urljoin, urlparse
 
 import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from .asset_store import AssetStore, get_store
+from .data_uri import decode_data_uri
+from .http_client import get_session
+from .inline_data import INLINE_SCHEME, inline_path, read_inline
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_PER_HOST = 4
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+_TIMEOUT = 15
 
 
 def ensure_dir(p: Path) -> None:
@@ -31,100 +65,332 @@ def _ext_from_content_type(ct: str) -> str:
     return ".png"
 
 
+def _asset_id(digest: str, ext: str) -> str:
+    return f"{digest[:16]}{ext}"
+
+
 def _asset_id_from_bytes(data: bytes, ext: str) -> str:
-    h = hashlib.sha256(data[:65536]).hexdigest()[:16]
-    return f"{h}{ext}"
+    return _asset_id(hashlib.sha256(data).hexdigest(), ext)
+
+
+class _Rejected(ValueError):
+    """A response we refuse to store (too large or empty)."""
+
+
+def _failure_kind(exc: Exception) -> str | None:
+    """Negative cache kind for a failed fetch, or None for errors not worth caching (local I/O)."""
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status in (404, 410):
+            return "not_found"
+        return "client_error" if status < 500 else "server_error"
+    if isinstance(exc, _Rejected):
+        return "too_large"
+    if isinstance(exc, requests.ConnectionError):
+        # Read timeouts while streaming the body surface as ConnectionError(ReadTimeoutError)
+        if exc.args and isinstance(exc.args[0], ReadTimeoutError):
+            return "timeout"
+        return "network"
+    if isinstance(exc, requests.RequestException):
+        return "network"
+    return None
+
 
+def _fresh_for(headers, default: float) -> float:
+    """Seconds a response may be reused without revalidation (Cache-Control, else default)."""
+    cc = headers.get("Cache-Control", "").lower()
+    if "no-store" in cc or "no-cache" in cc:
+        return 0.0
+    for part in cc.split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "max-age" and value.strip().isdigit():
+            return float(value.strip())
+    return default
 
-def resolve_src(src: str, base_url: str | None) -> tuple[bytes | None, str]:
+
+def download_to_temp(
+    url: str,
+    store: AssetStore,
+    session: requests.Session | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> tuple[Path | None, str] | None:
+    """
+    Stream url into a temp file in the store, hashing as it goes. Returns (temp_path, asset_id),
+    (None, asset_id) when the URL cache answers (fresh entry or 304), or None on any error or
+    once the body exceeds max_bytes (the temp file is removed). Failures go to the negative
+    cache, and a URL with a live negative entry returns None without a request. A URL cached
+    from an earlier download never loses its asset: when revalidation fails, the stored asset
+    is returned (stale-if-error), and the negative cache only applies to URLs with no asset.
+    """
+    cached = store.lookup_url(url)
+    headers = {}
+    if cached is not None:
+        if cached["fresh_until"] > time.time():
+            return None, cached["asset_id"]
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    elif store.lookup_failure(url) is not None:
+        return None
+    http = session or get_session()
+    started = time.monotonic()
+    fd, tmp = store.temp_file()
+    try:
+        with os.fdopen(fd, "wb") as out, http.get(url, headers=headers, timeout=_TIMEOUT, stream=True) as r:
+            if r.status_code == 304 and cached is not None:
+                tmp.unlink()
+                store.record_url(
+                    url,
+                    cached["asset_id"],
+                    r.headers.get("ETag", cached["etag"]),
+                    r.headers.get("Last-Modified", cached["last_modified"]),
+                    # A 304 without Cache-Control keeps the freshness the 200 had
+                    _fresh_for(r.headers, cached["fresh_until"] - cached["fetched_at"]),
+                )
+                return None, cached["asset_id"]
+            r.raise_for_status()
+            declared = r.headers.get("Content-Length", "")
+            if declared.isdigit() and int(declared) > max_bytes:
+                raise _Rejected(f"asset too large: {declared} bytes")
+            h = hashlib.sha256()
+            size = 0
+            for chunk in r.iter_content(_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _Rejected(f"asset too large: over {max_bytes} bytes")
+                h.update(chunk)
+                out.write(chunk)
+            if not size:
+                raise _Rejected("empty asset")
+            ext = _ext_from_content_type(r.headers.get("Content-Type", ""))
+            asset_id = _asset_id(h.hexdigest(), ext)
+            fresh_for = _fresh_for(r.headers, store.url_ttl)
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        # Recorded before the rename; lookup_url ignores entries whose asset file is missing
+        store.record_url(url, asset_id, etag, last_modified, fresh_for)
+        return tmp, asset_id
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        kind = _failure_kind(e)
+        if kind is not None:
+            store.record_failure(url, urlparse(url).netloc.lower(), kind, str(e), time.monotonic() - started)
+        # Stale-if-error: the asset the URL last returned is still stored
+        return (None, cached["asset_id"]) if cached is not None else None
+
+
+def stage_src(
+    src: str,
+    base_url: str | None,
+    store: AssetStore,
+    inline_store: Path | None = None,
+    session: requests.Session | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> tuple[Path | None, str] | None:
     """
-    Resolve image src to bytes. Handles http(s) URLs and data: URLs.
-    Returns (bytes, ext) or (None, "") on failure.
+    Resolve image src for the store. HTTP(S) is streamed to a temp file; data: URIs are decoded
+    and kc-inline files copied straight into the store (their ids are known up front).
+    Returns (temp_path, asset_id) with temp_path None when nothing is left to move, or None.
     """
     src = (src or "").strip()
-    if not src:
-        return None, ""
+    url = None
+    if src.startswith("http://") or src.startswith("https://"):
+        url = src
+    elif src and base_url and not src.startswith(INLINE_SCHEME) and not src.startswith("data:"):
+        url = urljoin(base_url, src)
+    if url is not None:
+        return download_to_temp(url, store, session, max_bytes)
+    if src.startswith(INLINE_SCHEME):
+        # Inline store files are named <sha256><ext> of their bytes
+        p = inline_path(src, inline_store)
+        if p is None or p.stat().st_size > max_bytes:
+            return None
+        asset_id = _asset_id(p.stem, p.suffix)
+        store.put_copy(p, asset_id)
+        return None, asset_id
+    data, ext = resolve_src(src, inline_store)
+    if not data or len(data) > max_bytes:
+        return None
+    asset_id = _asset_id_from_bytes(data, ext)
+    store.put_bytes(data, asset_id)
+    return None, asset_id
+
 
+def resolve_src(src: str, inline_store: Path | None = None) -> tuple[bytes | None, str]:
+    """
+    Resolve a local image src to bytes: data: URLs and kc-inline handles. Remote sources are
+    not fetched here; stage_src streams them through download_to_temp (size cap, URL and
+    negative caches). Returns (bytes, ext) or (None, "") otherwise.
+    """
+    src = (src or "").strip()
+    if src.startswith(INLINE_SCHEME):
+        return read_inline(src, inline_store)
     if src.startswith("data:"):
-        # data:image/png;base64,...
-        m = re.match(r"data:image/(\w+);base64,(.+)", src)
-        if m:
-            try:
-                data = base64.b64decode(m.group(2))
-                ext = "." + (m.group(1).lower() or "png")
-                if ext == ".jpeg":
-                    ext = ".jpg"
-                return data, ext
-            except Exception:
-                return None, ""
-        return None, ""
+        # data:image/png;base64,... (also svg+xml, extra parameters and percent-encoded payloads)
+        return decode_data_uri(src)
+    return None, ""
+
 
+def _fetch_host(src: str, base_url: str | None) -> str | None:
+    """Host stage_src would fetch src from, or None if it is resolved without the network."""
+    src = (src or "").strip()
+    if not src or src.startswith(INLINE_SCHEME) or src.startswith("data:"):
+        return None
     if src.startswith("http://") or src.startswith("https://"):
-        try:
-            r = requests.get(src, timeout=15)
-            r.raise_for_status()
-            ct = r.headers.get("Content-Type", "")
-            ext = _ext_from_content_type(ct) or ".png"
-            return r.content, ext
-        except Exception:
-            return None, ""
+        return urlparse(src).netloc.lower()
     if base_url:
-        url = urljoin(base_url, src)
-        try:
-            r = requests.get(url, timeout=15)
-            r.raise_for_status()
-            ct = r.headers.get("Content-Type", "")
-            ext = _ext_from_content_type(ct) or ".png"
-            return r.content, ext
-        except Exception:
-            return None, ""
-    return None, ""
+        return urlparse(urljoin(base_url, src)).netloc.lower()
+    return None
+
+
+def _source_key(src: str, base_url: str | None) -> str:
+    """The source stage_src fetches or decodes for src (relative URLs resolved, fragments dropped)."""
+    src = (src or "").strip()
+    if src.startswith("http://") or src.startswith("https://"):
+        return urldefrag(src)[0]
+    if src and base_url and not src.startswith((INLINE_SCHEME, "data:")):
+        return urldefrag(urljoin(base_url, src))[0]
+    return src
+
+
+def resolve_all(
+    srcs: list[str],
+    base_url: str | None,
+    store: AssetStore,
+    inline_store: Path | None = None,
+    session: requests.Session | None = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> list[tuple[Path | None, str] | None]:
+    """
+    stage_src for each of srcs; returns results in the same order. Network fetches run on up
+    to max_concurrency threads with at most per_host in flight per host. The caller owns the
+    returned temp files.
+    """
+    results: list[tuple[Path | None, str] | None] = [None] * len(srcs)
+    by_host: dict[str, list[int]] = {}
+
+    def stage(i: int) -> tuple[Path | None, str] | None:
+        return stage_src(srcs[i], base_url, store, inline_store, session, max_bytes)
+
+    for i, src in enumerate(srcs):
+        host = _fetch_host(src, base_url)
+        if host is None:
+            results[i] = stage(i)
+        else:
+            by_host.setdefault(host, []).append(i)
+    n_remote = sum(len(v) for v in by_host.values())
+    if n_remote <= 1 or max_concurrency <= 1:
+        for idxs in by_host.values():
+            for i in idxs:
+                results[i] = stage(i)
+        return results
+
+    limits = {host: threading.BoundedSemaphore(max(1, per_host)) for host in by_host}
+
+    def fetch(i: int, host: str) -> tuple[Path | None, str] | None:
+        with limits[host]:
+            return stage(i)
+
+    # Submit round-robin across hosts so one slow host does not hold every worker thread
+    order: list[tuple[int, str]] = []
+    queues = [(host, iter(idxs)) for host, idxs in by_host.items()]
+    while queues:
+        remaining = []
+        for host, it in queues:
+            i = next(it, None)
+            if i is not None:
+                order.append((i, host))
+                remaining.append((host, it))
+        queues = remaining
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, n_remote)) as pool:
+        futures = [(i, pool.submit(fetch, i, host)) for i, host in order]
+        for i, fut in futures:
+            results[i] = fut.result()
+    return results
 
 
 def process_assets(
     doc: dict[str, Any],
     assets_dir: Path,
     base_url: str | None = None,
+    inline_store: Path | None = None,
+    session: requests.Session | None = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    max_bytes: int = DEFAULT_MAX_BYTES,
 ) -> dict[str, Any]:
     """
     For each section with assets (figure), resolve original_src, save to assets_dir,
     rewrite section.assets with asset_id and path. Removes _original_src.
+    inline_store is the directory kc-inline handles were spilled to by the parser.
+    Assets larger than max_bytes are dropped like failed downloads.
     """
     doc = dict(doc)
     sections = list(doc.get("sections") or [])
     ensure_dir(assets_dir)
     base_url = base_url or (doc.get("meta") or {}).get("source", {}).get("url")
 
-    for sec in sections:
-        if sec.get("type") != "figure" or not sec.get("assets"):
-            continue
-        new_assets = []
-        for a in sec["assets"]:
-            orig = a.get("_original_src")
-            if not orig:
-                new_assets.append({
-                    "asset_id": a.get("asset_id") or "",
-                    "path": a.get("path") or "",
-                    "caption": a.get("caption"),
-                })
+    srcs = [
+        a["_original_src"]
+        for sec in sections
+        if sec.get("type") == "figure" and sec.get("assets")
+        for a in sec["assets"]
+        if a.get("_original_src")
+    ]
+    # Repeated sources (icons, dividers, avatars) are fetched once and fanned out to every figure
+    keys = [_source_key(src, base_url) for src in srcs]
+    unique = list(dict.fromkeys(keys))
+    store = get_store(assets_dir)
+    staged = resolve_all(unique, base_url, store, inline_store, session, max_concurrency, per_host, max_bytes)
+    by_key = dict(zip(unique, staged))
+    pending = iter(keys)
+    try:
+        for sec in sections:
+            if sec.get("type") != "figure" or not sec.get("assets"):
                 continue
-            data, ext = resolve_src(orig, base_url)
-            if not data:
+            new_assets = []
+            for a in sec["assets"]:
+                orig = a.get("_original_src")
+                if not orig:
+                    new_assets.append({
+                        "asset_id": a.get("asset_id") or "",
+                        "path": a.get("path") or "",
+                        "caption": a.get("caption"),
+                    })
+                    continue
+                key = next(pending)
+                item = by_key[key]
+                if item is None:
+                    new_assets.append({
+                        "asset_id": "",
+                        "path": "",
+                        "caption": a.get("caption"),
+                    })
+                    continue
+                tmp, asset_id = item
+                if tmp is not None:
+                    # Atomic, and skipped when the asset is already stored
+                    store.put_file(tmp, asset_id)
+                    # Later references to the same source reuse the stored file
+                    by_key[key] = (None, asset_id)
+                rel_path = f"assets/{asset_id}"
                 new_assets.append({
-                    "asset_id": "",
-                    "path": "",
+                    "asset_id": asset_id,
+                    "path": rel_path,
                     "caption": a.get("caption"),
                 })
-                continue
-            asset_id = _asset_id_from_bytes(data, ext)
-            out_path = assets_dir / asset_id
-            out_path.write_bytes(data)
-            rel_path = f"assets/{asset_id}"
-            new_assets.append({
-                "asset_id": asset_id,
-                "path": rel_path,
-                "caption": a.get("caption"),
-            })
-        sec["assets"] = new_assets
+            sec["assets"] = new_assets
+    finally:
+        # Temp files not moved into place (failed run, or figures skipped above)
+        for item in staged:
+            if item is not None and item[0] is not None:
+                item[0].unlink(missing_ok=True)
+    if doc.get("doc_id"):
+        asset_ids = [a["asset_id"] for sec in sections for a in sec.get("assets") or [] if a.get("asset_id")]
+        store.set_refs(doc["doc_id"], asset_ids)
     doc["sections"] = sections
     return doc
@@ -0,0 +1 @@
+# Benchmarks for ingest stages (run as python -m ingest.bench.<name>).
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Parity check and throughput comparison for parse_html tree backends.
+Every backend must produce the same meta and sections as html.parser on each sample page;
+mismatches are reported and the exit status is 1.
+
+The default corpus is ingest/bench/samples: real-world shaped pages (a blog post, a Sphinx
+docs page, a Juejin article) under a directory named after the adapter that parses them
+(samples/<adapter>/*.html uses ingest/html/adapters/<adapter>.yaml; other files use --adapter).
+A --corpus that does not exist is an error; --synthetic adds the ingest.bench.blocks page.
+
+Parity holds for well-formed pages like these, not for every malformed input. html.parser
+keeps the tree as written, while libxml2 (lxml, lxml.html) repairs it the way browsers do:
+  nested <p>           <p>a <p>b</p> c</p>: html.parser nests the inner p, so the outer
+                       paragraph reads "a b c"; lxml closes the outer p at the inner one
+                       ("a", then "b"; " c" is left outside any paragraph)
+  <?...?> PIs          both keep the instruction as paragraph text, but html.parser drops the
+                       leading "?" ('php echo "x"; ?') and lxml keeps it ('?php echo "x"; ?')
+  <![CDATA[...]]>      html.parser unwraps CDATA to its raw text ("raw <b>x</b> text"); lxml
+                       treats it as a bogus comment plus tags ("[CDATA[raw <b x text]]>")
+Pages that depend on these cases can differ between backends; html.parser stays the default.
+Usage: python -m ingest.bench.backends [--corpus ingest/bench/samples] [--adapter ...] [--synthetic] [files ...]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest.bench.blocks import synthetic_page
+from ingest.html.parser import BACKENDS, DEFAULT_BACKEND, parse_html
+
+SAMPLES = Path(__file__).resolve().parent / "samples"
+ADAPTERS = REPO_ROOT / "ingest" / "html" / "adapters"
+
+
+def _adapter_for(path: Path, default: str) -> str:
+    """adapters/<dir>.yaml for samples/<dir>/page.html, else default."""
+    candidate = ADAPTERS / f"{path.parent.name}.yaml"
+    return str(candidate) if candidate.is_file() else default
+
+
+def _first_diff(a: list, b: list) -> str:
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return f"section {i}: {x!r} != {y!r}"
+    return f"section count {len(a)} != {len(b)}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare parse_html backends")
+    ap.add_argument("files", nargs="*", help="HTML files (in addition to --corpus)")
+    ap.add_argument("--corpus", default=str(SAMPLES), help="Directory of *.html samples ('' for none)")
+    ap.add_argument("--adapter", default=str(ADAPTERS / "generic.yaml"), help="Adapter for files outside samples/<adapter>/")
+    ap.add_argument("--synthetic", action="store_true", help="Also check the synthetic page from ingest.bench.blocks")
+    ap.add_argument("--source-uri", default="https://example.com/post/1", help="source_uri passed to parse_html")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed runs per backend and file (best is kept)")
+    args = ap.parse_args()
+
+    files = [Path(f) for f in args.files]
+    if args.corpus:
+        corpus = Path(args.corpus)
+        if not corpus.is_dir():
+            print(f"corpus not found: {corpus}", file=sys.stderr)
+            sys.exit(2)
+        files.extend(sorted(corpus.rglob("*.html")))
+    tmp = None
+    if args.synthetic:
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".html", encoding="utf-8", delete=False)
+        tmp.write(synthetic_page(20000))
+        tmp.close()
+        files.append(Path(tmp.name))
+    if not files:
+        print("no HTML files to compare", file=sys.stderr)
+        sys.exit(2)
+
+    failed = 0
+    totals = {b: 0.0 for b in BACKENDS}
+    total_bytes = 0
+    try:
+        for path in files:
+            total_bytes += path.stat().st_size
+            adapter = _adapter_for(path, args.adapter)
+            outputs = {}
+            for backend in BACKENDS:
+                best = None
+                for _ in range(max(1, args.repeat)):
+                    t0 = time.perf_counter()
+                    out = parse_html(path, adapter, source_uri=args.source_uri, backend=backend)
+                    elapsed = time.perf_counter() - t0
+                    best = elapsed if best is None else min(best, elapsed)
+                outputs[backend] = out
+                totals[backend] += best
+            ref = outputs[DEFAULT_BACKEND]
+            before = failed
+            for backend, out in outputs.items():
+                if out["meta"] != ref["meta"]:
+                    print(f"MISMATCH {path} [{backend}] meta: {out['meta']!r} != {ref['meta']!r}")
+                    failed += 1
+                elif out["sections"] != ref["sections"]:
+                    print(f"MISMATCH {path} [{backend}] {_first_diff(ref['sections'], out['sections'])}")
+                    failed += 1
+            if failed == before:
+                print(f"ok {path} sections={len(ref['sections'])}")
+    finally:
+        if tmp is not None:
+            Path(tmp.name).unlink(missing_ok=True)
+
+    mb = total_bytes / (1024 * 1024)
+    print(f"files: {len(files)}  size: {mb:.2f} MB")
+    for backend in BACKENDS:
+        t = totals[backend]
+        speedup = totals[DEFAULT_BACKEND] / t if t else 0.0
+        print(f"{backend:12s} {t:.3f}s  {mb / t if t else 0:.2f} MB/s  {speedup:.1f}x")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark block extraction: compiled, once-per-document selector matching vs the previous
+per-descendant container.select() scan. Checks both produce identical sections.
+The previous scan is quadratic, so it is timed on a smaller page (--naive-elements).
+Usage: python -m ingest.bench.blocks [--elements 10000] [--naive-elements 1000] [--adapter ...]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from bs4 import BeautifulSoup
+
+from ingest.html.adapter_loader import get_compiled_adapter, load_adapter
+from ingest.html.parser import _build_section, _extract_blocks
+
+
+def synthetic_page(n_elements: int) -> str:
+    """Article-like page with roughly n_elements tags in the body."""
+    chunks = ["<html><head><title>bench</title></head><body><div id=\"article-root\">"]
+    count = 0
+    i = 0
+    while count < n_elements:
+        chunks.append(
+            f"<h2>Heading {i}</h2>"
+            f"<p>Paragraph {i} with <a href=\"/link/{i}\">a link</a> and <span>inline</span>.</p>"
+            f"<div><img src=\"https://example.com/img/{i}.png\" alt=\"figure {i}\"></div>"
+            f"<pre><code class=\"language-python\">print({i})</code></pre>"
+            f"<ul><li>item {i}<ul><li>nested {i}</li></ul></li><li>other</li></ul>"
+            f"<blockquote><p>quote {i}</p></blockquote>"
+        )
+        count += 15
+        i += 1
+    chunks.append("</div></body></html>")
+    return "".join(chunks)
+
+
+def naive_extract_blocks(container, blocks_config: list, base_url: str = "") -> list[dict]:
+    """Previous algorithm: container.select(sel) for every selector at every descendant."""
+    selector_to_block = [
+        (b["selector"], b.get("type", "paragraph"), b.get("attrs") or {})
+        for b in blocks_config
+        if b.get("selector")
+    ]
+    sections = []
+    seen = set()
+    for el in list(container.descendants):
+        if not getattr(el, "name", None) or id(el) in seen:
+            continue
+        btype, attrs_config = None, None
+        for sel, bt, bd in selector_to_block:
+            try:
+                if el in (container.select(sel) or []):
+                    btype, attrs_config = bt, bd
+                    break
+            except Exception:
+                continue
+        if not btype:
+            continue
+        seen.add(id(el))
+        if btype == "list" or (btype == "paragraph" and el.name == "blockquote"):
+            for desc in el.descendants:
+                if getattr(desc, "name", None):
+                    seen.add(id(desc))
+        section = _build_section(el, btype, attrs_config, base_url, len(sections))
+        if section is not None:
+            sections.append(section)
+    return sections
+
+
+def _load_page(n_elements: int):
+    soup = BeautifulSoup(synthetic_page(n_elements), "html.parser")
+    return soup.find("div", id="article-root") or soup.body
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark block extraction")
+    ap.add_argument("--elements", type=int, default=10000, help="Approximate tag count of the page")
+    ap.add_argument("--naive-elements", type=int, default=1000, help="Page size for the old scan (0 to skip)")
+    ap.add_argument("--adapter", default=str(REPO_ROOT / "ingest" / "html" / "adapters" / "juejin.yaml"))
+    args = ap.parse_args()
+
+    blocks_config = (load_adapter(Path(args.adapter)).get("content") or {}).get("blocks") or []
+    blocks = get_compiled_adapter(args.adapter).blocks
+    base_url = "https://example.com/"
+
+    container = _load_page(args.elements)
+    n_tags = sum(1 for _ in container.find_all(True))
+    t0 = time.perf_counter()
+    sections = _extract_blocks(container, blocks, base_url)
+    t_fast = time.perf_counter() - t0
+    print(f"compiled: tags={n_tags} sections={len(sections)} time={t_fast:.3f}s")
+
+    if args.naive_elements <= 0:
+        return
+    container = _load_page(args.naive_elements)
+    n_tags = sum(1 for _ in container.find_all(True))
+    t0 = time.perf_counter()
+    fast = _extract_blocks(container, blocks, base_url)
+    t_fast = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    slow = naive_extract_blocks(container, blocks_config, base_url)
+    t_slow = time.perf_counter() - t0
+    print(
+        f"naive:    tags={n_tags} sections={len(slow)} time={t_slow:.3f}s "
+        f"(compiled {t_fast:.3f}s, {t_slow / t_fast:.0f}x) identical={fast == slow}"
+    )
+    if fast != slow:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
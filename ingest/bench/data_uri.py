@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark data: URI decoding on large inline images: the previous regex + base64.b64decode
+path vs data_uri.decode_data_uri (sliced header, a2b_base64 over payload slices). Reports best
+wall time and peak Python memory (tracemalloc), and checks both decode the same bytes. Expect
+similar times (both decode in binascii) and a lower peak for the sliced decoder; its gain is
+the header forms it accepts, listed at the end.
+Usage: python -m ingest.bench.data_uri [--mb 5] [--repeat 20]
+"""
+import argparse
+import base64
+import os
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest.data_uri import decode_data_uri
+
+
+def regex_decode(src: str) -> tuple[bytes | None, str]:
+    """The pre-decoder implementation from assets.resolve_src, kept for comparison."""
+    m = re.match(r"data:image/(\w+);base64,(.+)", src)
+    if m:
+        try:
+            data = base64.b64decode(m.group(2))
+            ext = "." + (m.group(1).lower() or "png")
+            if ext == ".jpeg":
+                ext = ".jpg"
+            return data, ext
+        except Exception:
+            return None, ""
+    return None, ""
+
+
+def measure(fn, src: str, repeat: int) -> tuple[float, float]:
+    """(best seconds, peak MB above the input) over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(src)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(src)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / (1 << 20)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark data: URI decoding")
+    ap.add_argument("--mb", type=float, default=5.0, help="Decoded image size (MB)")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    data = os.urandom(int(args.mb * (1 << 20)))
+    src = "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+    old, new = regex_decode(src), decode_data_uri(src)
+    if old != new or new[0] != data:
+        print("MISMATCH between regex and sliced decoders")
+        sys.exit(1)
+    print(f"uri: {len(src) / (1 << 20):.1f} MB  decoded: {len(data) / (1 << 20):.1f} MB")
+    t_old, m_old = measure(regex_decode, src, args.repeat)
+    t_new, m_new = measure(decode_data_uri, src, args.repeat)
+    print(f"regex:  {t_old * 1000:8.2f} ms  peak {m_old:6.1f} MB")
+    print(f"sliced: {t_new * 1000:8.2f} ms  peak {m_new:6.1f} MB  {t_old / t_new:.1f}x")
+
+    # Forms only the new decoder accepts
+    for extra in (
+        "data:image/svg+xml;base64," + base64.b64encode(b"<svg/>").decode(),
+        "data:image/png;name=figure.png;base64," + base64.b64encode(b"\x89PNG").decode(),
+        "data:image/svg+xml;charset=utf-8,%3Csvg%2F%3E",
+    ):
+        print(f"{extra[:40]:40s} regex={regex_decode(extra)[1] or '-':5s} sliced={decode_data_uri(extra)[1]}")
+
+
+if __name__ == "__main__":
+    main()
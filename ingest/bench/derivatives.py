@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark the derivatives stage on a figure-heavy document: process_assets stores synthetic
+PNG originals (decoded from data: URIs), then derive_assets encodes display / thumbnail copies
+serially, with the process pool, and again with every derivative already stored. Checks that
+each derivative is smaller than its original and that stored files are readable by other users
+(mode asset_store.FILE_MODE, 0644), as a web server serving assets/ needs.
+Usage: python -m ingest.bench.derivatives [--images 24] [--side 2400] [--workers 4]
+"""
+import argparse
+import base64
+import copy
+import io
+import stat
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest import derivatives
+from ingest.asset_store import FILE_MODE
+from ingest.assets import process_assets
+from ingest.layout import find_entry
+
+
+def synthetic_png(side: int, seed: int) -> bytes:
+    """A side x side RGB image with smooth gradients and some noise (photo-like to encoders)."""
+    from PIL import Image
+
+    gradient = Image.linear_gradient("L").resize((side, side))
+    noise = Image.effect_noise((side, side), 24 + seed % 16)
+    im = Image.merge("RGB", (gradient, noise, gradient.rotate(90 * (seed % 4))))
+    buf = io.BytesIO()
+    im.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def figure_doc(images: int, side: int) -> dict:
+    sections = []
+    for i in range(images):
+        src = "data:image/png;base64," + base64.b64encode(synthetic_png(side, i)).decode("ascii")
+        sections.append({"section_id": f"fig-{i}", "type": "figure", "assets": [{"_original_src": src, "caption": f"figure {i}"}]})
+    return {"doc_id": "bench-derivatives", "meta": {"title": "derivatives"}, "sections": sections}
+
+
+def check(doc: dict, assets_dir: Path) -> list[str]:
+    """Problems with the stored originals and derivatives of doc (empty when all is well)."""
+    problems = []
+    for sec in doc["sections"]:
+        for a in sec.get("assets") or []:
+            original = find_entry(assets_dir, a["asset_id"])
+            files = [original]
+            if not a.get("derivatives"):
+                problems.append(f"{a['asset_id']}: no derivatives")
+            for d in (a.get("derivatives") or {}).values():
+                p = find_entry(assets_dir, d["asset_id"])
+                if p is None:
+                    problems.append(f"{d['asset_id']}: missing")
+                elif p.stat().st_size >= original.stat().st_size:
+                    problems.append(f"{d['asset_id']}: not smaller than {a['asset_id']}")
+                files.append(p)
+            for p in filter(None, files):
+                mode = stat.S_IMODE(p.stat().st_mode)
+                if mode != FILE_MODE or not mode & stat.S_IROTH:
+                    problems.append(f"{p.name}: mode {mode:04o}, expected {FILE_MODE:04o} and world-readable")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the asset derivatives stage")
+    ap.add_argument("--images", type=int, default=24, help="Figures in the document")
+    ap.add_argument("--side", type=int, default=2400, help="Side of each original (px)")
+    ap.add_argument("--workers", type=int, default=derivatives.DEFAULT_POLICY.workers)
+    args = ap.parse_args()
+    if not derivatives.available():
+        print("derivatives need Pillow (pip install Pillow)")
+        sys.exit(1)
+
+    doc = figure_doc(args.images, args.side)
+    with tempfile.TemporaryDirectory(prefix="kc-bench-") as tmp:
+        for label, workers in (("serial", 1), (f"pool x{args.workers}", args.workers)):
+            assets_dir = Path(tmp) / label.replace(" ", "-")
+            # process_assets rewrites the sections it is given
+            stored = process_assets(copy.deepcopy(doc), assets_dir)
+            policy = replace(derivatives.DEFAULT_POLICY, workers=workers)
+            t0 = time.perf_counter()
+            derived = derivatives.derive_assets(stored, assets_dir, policy)
+            t_first = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            derivatives.derive_assets(stored, assets_dir, policy)
+            t_again = time.perf_counter() - t0
+            print(f"{label:10s} {t_first:7.2f}s  re-run (already stored) {t_again:6.3f}s")
+            problems = check(derived, assets_dir)
+            if problems:
+                print("\n".join(f"FAILED: {p}" for p in problems))
+                sys.exit(1)
+    print(f"ok: derivatives smaller than originals, files stored as {FILE_MODE:04o}")
+
+
+if __name__ == "__main__":
+    main()
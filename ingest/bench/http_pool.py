@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark asset fetches against a local HTTP server: one connection per request (module-level
+requests.get, the previous behaviour) vs the pooled process-wide session. Reports TCP
+connections accepted by the server (handshakes) and wall time, serial and concurrent.
+Usage: python -m ingest.bench.http_pool [--images 40] [--delay-ms 20] [--kb 50]
+"""
+import argparse
+import http.server
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest.asset_store import AssetStore
+from ingest.assets import resolve_all
+from ingest.http_client import make_session
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        conn = super().get_request()
+        with _COUNT_LOCK:
+            _Server.connections += 1
+        return conn
+
+
+_COUNT_LOCK = threading.Lock()
+
+
+def _handler(delay: float, body: bytes):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; without TCP_NODELAY keep-alive responses
+        # stall on Nagle + delayed ACK, which production servers avoid
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class _Unpooled:
+    """Stands in for a session: every get() opens a new connection, like requests.get."""
+
+    def get(self, url, **kwargs):
+        return requests.get(url, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pooled vs unpooled asset fetches")
+    ap.add_argument("--images", type=int, default=40, help="Images per document")
+    ap.add_argument("--delay-ms", type=float, default=20.0, help="Server think time per image")
+    ap.add_argument("--kb", type=int, default=50, help="Image size (KB)")
+    args = ap.parse_args()
+
+    server = _Server(("127.0.0.1", 0), _handler(args.delay_ms / 1000, b"\x89PNG" + b"x" * (args.kb * 1024)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+    srcs = [f"img/{i}.png" for i in range(args.images)]
+
+    tmp = tempfile.TemporaryDirectory(prefix="kc-bench-")
+    try:
+        for label, concurrency in (("serial", 1), ("concurrent", 8)):
+            for name, session in (("unpooled", _Unpooled()), ("pooled", make_session())):
+                # Two documents, so the pooled session also shows reuse across documents
+                _Server.connections = 0
+                t0 = time.perf_counter()
+                for _ in range(2):
+                    results = resolve_all(srcs, base, AssetStore(Path(tmp.name)), session=session, max_concurrency=concurrency)
+                    for item in results:
+                        if item is not None:
+                            item[0].unlink()
+                elapsed = time.perf_counter() - t0
+                ok = sum(1 for item in results if item is not None)
+                print(f"{label:10s} {name:8s} {elapsed:7.3f}s  connections={_Server.connections:4d}  ok={ok}/{len(srcs)}")
+    finally:
+        server.shutdown()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
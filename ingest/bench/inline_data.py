@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark spilling data: URIs before parsing on an image-heavy SingleFile-style page:
+parse + normalize + assets time and peak Python memory (tracemalloc), with and without spill.
+Also checks parity on a page with data URIs outside <img> src / data-src (paragraph text,
+<code>/<pre>, CSS url(...), links): spilling must leave them byte-identical and produce the
+same sections and assets as parsing without a store; a mismatch exits 1.
+Usage: python -m ingest.bench.inline_data [--images 40] [--image-kb 500]
+"""
+import argparse
+import base64
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest.assets import process_assets
+from ingest.html.parser import parse_html
+from ingest.inline_data import INLINE_SCHEME, spill_data_uris
+from ingest.normalize import normalize
+
+ADAPTER = REPO_ROOT / "ingest" / "html" / "adapters" / "generic.yaml"
+
+
+def write_page(path: Path, images: int, image_kb: int) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<html><head><title>inline</title></head><body>")
+        for i in range(images):
+            payload = base64.b64encode(os.urandom(image_kb * 1024)).decode("ascii")
+            f.write(f"<h2>Figure {i}</h2><p>Text before figure {i}.</p>")
+            f.write(f'<figure><img src="data:image/png;base64,{payload}" alt="figure {i}"></figure>')
+        f.write("</body></html>")
+
+
+PARITY_PAGE = """<html><head><title>parity</title>
+<style>.hero {{ background: url(data:image/png;base64,{b64}); }}</style></head><body>
+<p>Inline images look like <code>data:image/png;base64,{b64}</code> in HTML.</p>
+<pre>&lt;img src="data:image/gif;base64,{b64}"&gt;</pre>
+<p>A <a href="data:image/png;base64,{b64}">link to the image</a> and plain text data:image/png;base64,{b64} too.</p>
+<figure><img src="data:image/png;base64,{b64}" alt="spilled src"></figure>
+<figure><img class="lazy" data-src='data:image/webp;base64,{b64}' alt="spilled data-src"></figure>
+<div>data:image/svg+xml;base64,{b64}</div>
+</body></html>
+"""
+
+
+def parity(tmp_dir: Path) -> list[str]:
+    """Differences between parsing PARITY_PAGE with and without spilling (empty when equal)."""
+    html_path = tmp_dir / "parity.html"
+    html_path.write_text(PARITY_PAGE.format(b64=base64.b64encode(os.urandom(96)).decode("ascii")), encoding="utf-8")
+    plain = run(html_path, None, tmp_dir / "parity-assets-inline")
+    spilled = run(html_path, tmp_dir / "parity-inline", tmp_dir / "parity-assets-spill")
+    problems = [
+        f"section {i}: {a!r} != {b!r}"
+        for i, (a, b) in enumerate(zip(plain["sections"], spilled["sections"]))
+        if a != b
+    ]
+    if len(plain["sections"]) != len(spilled["sections"]):
+        problems.append(f"section count {len(plain['sections'])} != {len(spilled['sections'])}")
+    texts = [sec.get("content") or "" for sec in spilled["sections"]]
+    if any(INLINE_SCHEME in t for t in texts):
+        problems.append("kc-inline handle in section text")
+    if not any(a.get("asset_id") for sec in spilled["sections"] for a in sec.get("assets") or []):
+        problems.append("the <img> figure was not stored")
+    # Only the two <img> attribute values are replaced; every other character is unchanged
+    original = html_path.read_text(encoding="utf-8")
+    out = spill_data_uris(html_path, tmp_dir / "parity-inline")
+    handles = re.findall(re.escape(INLINE_SCHEME) + r"[0-9a-f]{64}\.\w+", out)
+    restored = re.sub(re.escape(INLINE_SCHEME) + r"[0-9a-f]{64}\.\w+", "", out)
+    expected = re.sub(r"(<img\b[^>]*\s(?:data-)?src=[\"'])data:image/[^\"']+", r"\1", original)
+    if len(handles) != 2 or restored != expected:
+        problems.append(f"spilled HTML differs outside <img> src / data-src ({len(handles)} handles)")
+    return problems
+
+
+def run(html_path: Path, store: Path | None, assets_dir: Path) -> dict:
+    out = parse_html(html_path, ADAPTER, inline_store=store)
+    doc = normalize(out, "bench", str(html_path), "")
+    return process_assets(doc, assets_dir, inline_store=store)
+
+
+def measure(html_path: Path, store: Path | None, assets_dir: Path) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    run(html_path, store, assets_dir)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    run(html_path, store, assets_dir)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark data: URI spilling")
+    ap.add_argument("--images", type=int, default=40, help="Inline images on the page")
+    ap.add_argument("--image-kb", type=int, default=500, help="Decoded size of each image (KB)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="kc-bench-") as tmp:
+        tmp_dir = Path(tmp)
+        problems = parity(tmp_dir)
+        if problems:
+            print("\n".join(f"MISMATCH: {p}" for p in problems))
+            sys.exit(1)
+        print("parity: data URIs outside <img> src / data-src unchanged")
+        html_path = tmp_dir / "page.html"
+        write_page(html_path, args.images, args.image_kb)
+        size_mb = html_path.stat().st_size / (1024 * 1024)
+        print(f"page: {size_mb:.1f} MB, {args.images} inline images")
+
+        t_plain, peak_plain = measure(html_path, None, tmp_dir / "assets-inline")
+        t_spill, peak_spill = measure(html_path, tmp_dir / "inline", tmp_dir / "assets-spill")
+        mb = 1024 * 1024
+        print(f"inline: {t_plain:.3f}s  peak {peak_plain / mb:.1f} MB")
+        print(f"spill:  {t_spill:.3f}s  peak {peak_spill / mb:.1f} MB")
+        print(f"time {t_plain / t_spill:.1f}x  memory {peak_plain / max(peak_spill, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
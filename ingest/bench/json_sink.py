@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark the document JSON sink: stdlib json vs orjson, indented vs compact. The input is a
+synthetic EPUB-sized Document (CJK and English paragraphs, nested lists, tables, figures), or
+an existing Document JSON with --doc. Reports best wall time of write_json, output size and
+peak Python memory (tracemalloc), and checks every variant parses back to the same document.
+Usage: python -m ingest.bench.json_sink [--sections 20000] [--repeat 5] [--doc data/docs/<id>.json]
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest import jsonio
+
+_CJK = "知识库的文档在写入之前会被规范化为章节、列表、表格和图片，并保存为结构化数据。"
+_EN = "Sections are normalized into headings, paragraphs, lists and tables before the sink writes them. "
+
+
+def synthetic_doc(n_sections: int, seed: int = 0) -> dict:
+    """A Document shaped like a large parsed book."""
+    rnd = random.Random(seed)
+    sections = []
+    for i in range(n_sections):
+        sec = {"section_id": f"sec-{i}", "type": "paragraph", "content": "", "items": [], "rows": [], "assets": [], "annotations": {}}
+        kind = rnd.random()
+        if i % 50 == 0:
+            sec.update(type="heading", level=1 + i % 3, content=f"第 {i // 50} 章 Chapter {i // 50}")
+        elif kind < 0.65:
+            sec["content"] = (_CJK if rnd.random() < 0.5 else _EN) * rnd.randint(1, 6)
+        elif kind < 0.85:
+            sec["type"] = "list"
+            sec["items"] = [
+                {"text": _EN[: rnd.randint(20, 90)], "items": [{"text": _CJK[:20]}] if rnd.random() < 0.3 else []}
+                for _ in range(rnd.randint(2, 8))
+            ]
+        elif kind < 0.95:
+            sec["type"] = "table"
+            sec["rows"] = [[f"{_CJK[c:c + 6]} {r}.{c}" for c in range(5)] for r in range(rnd.randint(3, 12))]
+        else:
+            sec["type"] = "figure"
+            asset_id = uuid.UUID(int=rnd.getrandbits(128)).hex[:16] + ".png"
+            sec["assets"] = [{"asset_id": asset_id, "path": f"assets/{asset_id}", "caption": _CJK[:16]}]
+        sections.append(sec)
+    return {
+        "doc_id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "meta": {
+            "title": "合成测试书 Synthetic book",
+            "source": {"type": "epub", "uri": "file:///books/synthetic.epub"},
+            "ingested_at": "2026-01-01T00:00:00+00:00",
+            "tags": ["bench", "epub"],
+        },
+        "sections": sections,
+    }
+
+
+def measure(fn, repeat: int) -> tuple[float, float]:
+    """(best seconds, peak MB) over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / (1 << 20)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the document JSON sink")
+    ap.add_argument("--sections", type=int, default=20000, help="Sections in the synthetic document")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--doc", default="", help="Benchmark an existing Document JSON instead")
+    args = ap.parse_args()
+
+    if args.doc:
+        doc = json.loads(Path(args.doc).read_text(encoding="utf-8"))
+    else:
+        doc = synthetic_doc(args.sections)
+    print(f"sections: {len(doc.get('sections') or [])}  orjson: {'yes' if jsonio.orjson is not None else 'no'}")
+
+    saved = jsonio.orjson
+    backends = [("json", None)] + ([("orjson", saved)] if saved is not None else [])
+    base = None
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "doc.json"
+        try:
+            for name, mod in backends:
+                jsonio.orjson = mod
+                for compact in (False, True):
+                    t, peak = measure(lambda: jsonio.write_json(doc, out, compact), args.repeat)
+                    size = out.stat().st_size / (1 << 20)
+                    if json.loads(out.read_bytes()) != doc:
+                        print(f"MISMATCH: {name} compact={compact} does not round-trip")
+                        sys.exit(1)
+                    base = base or t
+                    label = f"{name} {'compact' if compact else 'indent'}"
+                    print(f"{label:16s} {t * 1000:8.1f} ms  {size:6.1f} MB  peak {peak:6.1f} MB  {base / t:.1f}x")
+        finally:
+            jsonio.orjson = saved
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark adapter routing: compiled RouteIndex lookups vs the previous linear scan (which
+also stat()ed adapter files on every match attempt). Checks both pick the same adapter.
+Usage: python -m ingest.bench.routes [--routes 1000] [--lookups 20000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from ingest.router import compile_routes, select_adapter
+
+ADAPTERS = ["ingest/html/adapters/generic.yaml", "ingest/html/adapters/juejin.yaml", "ingest/html/adapters/missing.yaml"]
+
+
+def linear_select_adapter(source_uri: str, routes: list[dict], repo_root: Path) -> Path | None:
+    """The pre-index implementation, kept for comparison."""
+    if not source_uri.strip():
+        return None
+    parsed = urlparse(source_uri)
+    if parsed.scheme and parsed.netloc:
+        domain = parsed.netloc.lower()
+        path = parsed.path or "/"
+    else:
+        domain = ""
+        path = source_uri
+    path = path or "/"
+    for rule in routes:
+        rule_domain = (rule.get("domain") or "*").lower()
+        prefix = (rule.get("path_prefix") or "").strip()
+        if rule_domain != "*" and rule_domain != domain:
+            continue
+        if prefix and not path.startswith(prefix):
+            continue
+        adapter_ref = rule.get("adapter")
+        if not adapter_ref:
+            continue
+        adapter_path = repo_root / adapter_ref
+        if adapter_path.exists():
+            return adapter_path.resolve()
+        if Path(adapter_ref).exists():
+            return Path(adapter_ref).resolve()
+    return None
+
+
+def synthetic_routes(n: int, rng: random.Random) -> list[dict]:
+    """n site rules (some with path prefixes, some wildcard-domain prefixes) and a final catch-all."""
+    routes = []
+    for i in range(n - 1):
+        kind = rng.random()
+        adapter = rng.choice(ADAPTERS)
+        if kind < 0.05:
+            routes.append({"domain": "*", "path_prefix": f"/section{i % 20}/", "adapter": adapter})
+        elif kind < 0.6:
+            routes.append({"domain": f"site{i % 400}.example.com", "path_prefix": f"/p{i % 7}/", "adapter": adapter})
+        else:
+            routes.append({"domain": f"site{i % 400}.example.com", "adapter": adapter})
+    routes.append({"domain": "*", "adapter": ADAPTERS[0]})
+    return routes
+
+
+def synthetic_uris(n: int, rng: random.Random) -> list[str]:
+    uris = []
+    for i in range(n):
+        host = f"site{rng.randrange(500)}.example.com"
+        path = rng.choice(["/p1/", "/p3/", "/section4/", "/blog/", "/"]) + f"post-{i}"
+        uris.append(f"https://{host}{path}")
+    uris.append("/local/file.html")
+    return uris
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark adapter routing")
+    ap.add_argument("--routes", type=int, default=1000, help="Number of routes")
+    ap.add_argument("--lookups", type=int, default=20000, help="Number of source URIs routed")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    routes = synthetic_routes(args.routes, rng)
+    uris = synthetic_uris(args.lookups, rng)
+
+    t0 = time.perf_counter()
+    index = compile_routes(routes, REPO_ROOT)
+    t_compile = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = [select_adapter(u, index, REPO_ROOT) for u in uris]
+    t_indexed = time.perf_counter() - t0
+
+    # The linear scan is slow; time it on a sample and extrapolate per lookup
+    sample = uris[: max(1, min(len(uris), 2000))]
+    t0 = time.perf_counter()
+    linear = [linear_select_adapter(u, routes, REPO_ROOT) for u in sample]
+    t_linear = (time.perf_counter() - t0) / len(sample)
+
+    mismatches = [u for u, a, b in zip(sample, indexed, linear) if a != b]
+    for u in mismatches[:10]:
+        print(f"MISMATCH {u}")
+    per_indexed = t_indexed / len(uris)
+    print(f"routes: {len(routes)}  lookups: {len(uris)}  compile: {t_compile * 1000:.1f} ms")
+    print(f"linear:  {t_linear * 1e6:9.1f} us/lookup")
+    print(f"indexed: {per_indexed * 1e6:9.1f} us/lookup  {t_linear / per_indexed:.0f}x")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Corpus sink: Documents appended to rolling, size-bounded segment files plus a manifest, so
+chunking and embedding jobs read a few large files instead of millions of data/docs/*.json.
+
+  data/corpus/manifest.json                         sealed segments: name, docs, sections, bytes
+  data/corpus/20260101T120000-4242-000001.jsonl     one compact Document per line
+  data/corpus/...-000002.jsonl.zst                  the same, zstd-compressed (needs zstandard)
+  data/corpus/...-000003.parquet                    one row per Document (needs pyarrow)
+
+Parquet rows keep doc_id, title, url, rawdoc_id and ingested_at as columns; meta and sections
+are JSON strings, so section shapes stay as free as in the JSON sink while readers can select
+columns (iter_sections reads only doc_id and sections). Any other top-level Document keys
+(references, ...) go to the JSON column extra, so iter_documents returns the same Document
+from every format.
+
+Each writer process owns its segment: it is written as <name>.open under an exclusive flock
+and sealed (renamed and added to the manifest, under the manifest lock) when it reaches
+segment_bytes, is segment_seconds old, or the writer closes. Readers only see sealed
+segments. JSONL segments are flushed after every Document; a segment left open by a crashed
+process is repaired up to its last complete line and sealed by the next writer or `recover`.
+Parquet buffers row groups, so an orphaned Parquet segment cannot be read; it is set aside as
+<name>.orphan (the per-document files, or `pack`, rebuild it), which is why run_ingest and
+the poller refuse --no-docs with Parquet.
+
+Usage:
+  python -m ingest.corpus ls      [--corpus dir]
+  python -m ingest.corpus cat     [--corpus dir] [--sections]   # JSON lines to stdout
+  python -m ingest.corpus pack    [--corpus dir] [--docs dir] [--format jsonl|jsonl.zst|parquet] [--segment-mb 256]
+  python -m ingest.corpus recover [--corpus dir]
+"""
+import argparse
+import fcntl
+import io
+import json
+import multiprocessing.util
+import os
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from .jsonio import dumps, loads
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+_LOCK_NAME = ".manifest.lock"
+OPEN_SUFFIX = ".open"
+FORMATS = {"jsonl": ".jsonl", "jsonl.zst": ".jsonl.zst", "parquet": ".parquet"}
+# Documents per Parquet row group
+ROW_GROUP_DOCS = 256
+ZSTD_LEVEL = 3
+
+
+@dataclass(frozen=True)
+class CorpusPolicy:
+    root: Path
+    format: str = "jsonl"  # jsonl | jsonl.zst | parquet
+    segment_bytes: int = 256 * 1024 * 1024
+    # Also seal a segment this long after it was opened (at its next append), so a long-running
+    # poller publishes what it wrote
+    segment_seconds: float = 3600.0
+    # Also write the per-document <doc_id>.json / .md files; required for parquet, whose
+    # buffered rows only the per-document files can rebuild after a crash
+    keep_docs: bool = True
+
+
+def available(fmt: str) -> bool:
+    """Whether the library a segment format needs is installed."""
+    if fmt == "jsonl.zst":
+        return zstandard is not None
+    if fmt == "parquet":
+        return pq is not None
+    return fmt in FORMATS
+
+
+def _format_of(name: str) -> str:
+    for fmt, ext in sorted(FORMATS.items(), key=lambda kv: -len(kv[1])):
+        if name.endswith(ext):
+            return fmt
+    raise ValueError(f"not a corpus segment: {name}")
+
+
+class _ManifestLock:
+    """Exclusive flock on <root>/.manifest.lock around a manifest read-modify-write."""
+
+    def __init__(self, root: Path):
+        self.path = Path(root) / _LOCK_NAME
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+
+
+def read_manifest(root: Path) -> dict[str, Any]:
+    try:
+        return json.loads((Path(root) / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"version": MANIFEST_VERSION, "segments": []}
+
+
+def _add_segment(root: Path, entry: dict[str, Any]) -> None:
+    root = Path(root)
+    with _ManifestLock(root):
+        manifest = read_manifest(root)
+        manifest["segments"] = [s for s in manifest["segments"] if s["name"] != entry["name"]] + [entry]
+        tmp = root / f"{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, root / MANIFEST_NAME)
+
+
+def _seal(root: Path, open_path: Path, docs: int, sections: int) -> dict[str, Any]:
+    """Rename an open segment to its final name and record it in the manifest."""
+    final = open_path.with_name(open_path.name[: -len(OPEN_SUFFIX)])
+    os.replace(open_path, final)
+    entry = {
+        "name": final.name,
+        "format": _format_of(final.name),
+        "docs": docs,
+        "sections": sections,
+        "bytes": final.stat().st_size,
+        "sealed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    _add_segment(root, entry)
+    return entry
+
+
+class CorpusWriter:
+    """Appends Documents to this process's open segment, rolling it at policy.segment_bytes."""
+
+    def __init__(self, policy: CorpusPolicy):
+        if not available(policy.format):
+            raise RuntimeError(f"corpus format {policy.format} needs {'zstandard' if policy.format == 'jsonl.zst' else 'pyarrow'}")
+        self.policy = policy
+        self.root = Path(policy.root)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._path: Path | None = None
+        self._raw = None  # the segment file (holds the flock)
+        self._out = None  # what Documents are written to (the file, a zstd stream or a ParquetWriter)
+        self._rows: list[dict[str, Any]] = []
+        self._docs = self._sections = self._buffered = 0
+        self._opened_at = 0.0
+        self._recovered = False
+
+    def _open(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not self._recovered:
+            # Seal what crashed writers left behind before adding segments of our own
+            recover(self.root)
+            self._recovered = True
+        self._seq += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        name = f"{stamp}-{os.getpid()}-{self._seq:06d}{FORMATS[self.policy.format]}{OPEN_SUFFIX}"
+        self._path = self.root / name
+        # Locked before it gets the name recover() looks for
+        tmp = self.root / f"{name}.tmp"
+        self._raw = open(tmp, "xb")
+        fcntl.flock(self._raw.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(tmp, self._path)
+        if self.policy.format == "jsonl.zst":
+            self._out = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(self._raw, closefd=False)
+        elif self.policy.format == "parquet":
+            self._out = pq.ParquetWriter(self._raw, _parquet_schema(), compression="zstd")
+        else:
+            self._out = self._raw
+        self._docs = self._sections = self._buffered = 0
+        self._opened_at = time.monotonic()
+
+    def append(self, doc: dict[str, Any]) -> str:
+        """Append doc; returns the name of the segment it went to (sealed once rolled)."""
+        with self._lock:
+            if self._path is None:
+                self._open()
+            name = self._path.name[: -len(OPEN_SUFFIX)]
+            if self.policy.format == "parquet":
+                self._rows.append(_parquet_row(doc))
+                self._buffered += sum(len(v) for v in self._rows[-1].values() if isinstance(v, str))
+                if len(self._rows) >= ROW_GROUP_DOCS:
+                    self._flush_rows()
+            else:
+                self._out.write(dumps(doc, compact=True) + b"\n")
+                # Durable per Document (JSONL only; Parquet rows wait for the row group): the
+                # ledger marks it done right after the sink
+                if self.policy.format == "jsonl.zst":
+                    self._out.flush(zstandard.FLUSH_BLOCK)
+                else:
+                    self._out.flush()
+            self._docs += 1
+            self._sections += len(doc.get("sections") or [])
+            if (
+                self._raw.tell() + self._buffered >= self.policy.segment_bytes
+                or time.monotonic() - self._opened_at >= self.policy.segment_seconds
+            ):
+                self._close_segment()
+            return name
+
+    def _flush_rows(self) -> None:
+        if self._rows:
+            self._out.write_table(pa.Table.from_pylist(self._rows, schema=_parquet_schema()))
+            self._rows, self._buffered = [], 0
+
+    def _close_segment(self) -> None:
+        if self._path is None:
+            return
+        if self.policy.format == "parquet":
+            self._flush_rows()
+            self._out.close()
+        elif self.policy.format == "jsonl.zst":
+            self._out.close()
+        self._raw.close()
+        _seal(self.root, self._path, self._docs, self._sections)
+        self._path = self._raw = self._out = None
+
+    def close(self) -> None:
+        """Seal the open segment (if any)."""
+        with self._lock:
+            self._close_segment()
+
+
+def _parquet_schema():
+    return pa.schema(
+        [
+            ("doc_id", pa.string()),
+            ("title", pa.string()),
+            ("url", pa.string()),
+            ("rawdoc_id", pa.string()),
+            ("ingested_at", pa.string()),
+            ("meta", pa.string()),
+            ("sections", pa.string()),
+            ("extra", pa.string()),
+        ]
+    )
+
+
+# Document keys with their own column; the rest are kept in extra
+_PARQUET_DOC_KEYS = frozenset({"doc_id", "meta", "sections"})
+
+
+def _parquet_row(doc: dict[str, Any]) -> dict[str, Any]:
+    meta = doc.get("meta") or {}
+    source = meta.get("source") or {}
+    extra = {k: v for k, v in doc.items() if k not in _PARQUET_DOC_KEYS}
+    return {
+        "doc_id": doc.get("doc_id"),
+        "title": meta.get("title"),
+        "url": source.get("url"),
+        "rawdoc_id": source.get("rawdoc_id"),
+        "ingested_at": meta.get("ingested_at"),
+        "meta": dumps(meta, compact=True).decode("utf-8"),
+        "sections": dumps(doc.get("sections") or [], compact=True).decode("utf-8"),
+        "extra": dumps(extra, compact=True).decode("utf-8") if extra else None,
+    }
+
+
+# One writer per policy and process, sealed at interpreter exit (also in pool workers)
+_WRITERS: dict[CorpusPolicy, CorpusWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+_FINALIZER_PID = 0
+# Writers inherited across fork: kept referenced so their buffers are never flushed twice
+_INHERITED: list[CorpusWriter] = []
+
+
+def _close_all() -> None:
+    for w in list(_WRITERS.values()):
+        w.close()
+
+
+def get_writer(policy: CorpusPolicy) -> CorpusWriter:
+    global _FINALIZER_PID
+    with _WRITERS_LOCK:
+        if _FINALIZER_PID != os.getpid():
+            # multiprocessing runs exit finalizers in the main process and in pool workers,
+            # which skip atexit; registered here because a forked worker clears the registry
+            multiprocessing.util.Finalize(None, _close_all, exitpriority=10)
+            _FINALIZER_PID = os.getpid()
+        w = _WRITERS.get(policy)
+        if w is None:
+            w = _WRITERS[policy] = CorpusWriter(policy)
+    return w
+
+
+def _reset_after_fork() -> None:
+    global _WRITERS_LOCK
+    _INHERITED.extend(_WRITERS.values())
+    _WRITERS.clear()
+    _WRITERS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _salvage_jsonl(path: Path, fmt: str) -> tuple[int, int]:
+    """Cut an orphaned JSONL segment back to its last complete Document; (docs, sections)."""
+    if fmt == "jsonl.zst":
+        good = bytearray()
+        dobj = zstandard.ZstdDecompressor().decompressobj()
+        with open(path, "rb") as f:
+            # Small chunks: a damaged tail only costs the Documents in the last one
+            try:
+                while chunk := f.read(1 << 14):
+                    good += dobj.decompress(chunk)
+            except zstandard.ZstdError:
+                pass
+        data = bytes(good[: good.rfind(b"\n") + 1])
+    else:
+        data = path.read_bytes()
+        data = data[: data.rfind(b"\n") + 1]
+    docs = sections = 0
+    for line in data.splitlines():
+        docs += 1
+        sections += len(loads(line).get("sections") or [])
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data) if fmt == "jsonl.zst" else data)
+    os.replace(tmp, path)
+    return docs, sections
+
+
+def recover(root: Path) -> list[str]:
+    """
+    Seal segments left open by writers that are gone (their flock is free). JSONL segments
+    keep every complete Document; Parquet ones are renamed to <name>.orphan. Returns the
+    segment names handled.
+    """
+    handled = []
+    for path in sorted(Path(root).glob(f"*{OPEN_SUFFIX}")):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # its writer is alive
+            fmt = _format_of(path.name[: -len(OPEN_SUFFIX)])
+            if fmt == "parquet" or (fmt == "jsonl.zst" and zstandard is None):
+                os.replace(path, path.with_name(path.name[: -len(OPEN_SUFFIX)] + ".orphan"))
+            else:
+                docs, sections = _salvage_jsonl(path, fmt)
+                _seal(root, path, docs, sections)
+            handled.append(path.name)
+        finally:
+            os.close(fd)
+    return handled
+
+
+def segments(root: Path) -> list[Path]:
+    """Sealed segment files, in manifest (append) order."""
+    root = Path(root)
+    return [root / s["name"] for s in read_manifest(root)["segments"] if (root / s["name"]).exists()]
+
+
+def _iter_lines(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        if path.name.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"{path.name} needs zstandard (pip install zstandard)")
+            f = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def _iter_parquet(path: Path, columns: list[str]) -> Iterator[dict[str, Any]]:
+    if pq is None:
+        raise RuntimeError(f"{path.name} needs pyarrow (pip install pyarrow)")
+    pf = pq.ParquetFile(path)
+    # Segments written before a column was added simply lack it
+    present = set(pf.schema_arrow.names)
+    for batch in pf.iter_batches(columns=[c for c in columns if c in present], batch_size=ROW_GROUP_DOCS):
+        yield from batch.to_pylist()
+
+
+def iter_documents(root: Path) -> Iterator[dict[str, Any]]:
+    """Every Document in the sealed segments, streamed one segment and batch at a time."""
+    for path in segments(root):
+        if path.suffix == ".parquet":
+            for row in _iter_parquet(path, ["doc_id", "meta", "sections", "extra"]):
+                doc = {"doc_id": row["doc_id"], "meta": loads(row["meta"]), "sections": loads(row["sections"])}
+                if row.get("extra"):
+                    doc.update(loads(row["extra"]))
+                yield doc
+        else:
+            for line in _iter_lines(path):
+                yield loads(line)
+
+
+def iter_sections(root: Path) -> Iterator[tuple[str, dict[str, Any]]]:
+    """(doc_id, section) for every section of every Document, in order."""
+    for path in segments(root):
+        if path.suffix == ".parquet":
+            for row in _iter_parquet(path, ["doc_id", "sections"]):
+                for sec in loads(row["sections"]):
+                    yield row["doc_id"], sec
+        else:
+            for line in _iter_lines(path):
+                doc = loads(line)
+                for sec in doc.get("sections") or []:
+                    yield doc["doc_id"], sec
+
+
+def pack(docs_dir: Path, policy: CorpusPolicy) -> int:
+    """Append every <doc_id>.json under docs_dir (any layout) to the corpus; returns the count."""
+    writer = CorpusWriter(policy)
+    n = 0
+    try:
+        for p in sorted(Path(docs_dir).rglob("*.json")):
+            if not p.name.startswith("."):
+                writer.append(loads(p.read_bytes()))
+                n += 1
+    finally:
+        writer.close()
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="List, read, pack or repair the consolidated document corpus")
+    ap.add_argument("--corpus", default=None, help="Corpus directory (default: data/corpus)")
+    sub = ap.add_subparsers(dest="command")
+    sub.add_parser("ls", help="Sealed segments and totals")
+    ct = sub.add_parser("cat", help="Stream Documents (or sections) as JSON lines")
+    ct.add_argument("--sections", action="store_true", help="One {doc_id, section} per line")
+    pk = sub.add_parser("pack", help="Append existing per-document JSON files to the corpus")
+    pk.add_argument("--docs", default=None, help="Docs directory (default: data/docs)")
+    pk.add_argument("--format", default="jsonl", choices=tuple(FORMATS), help="Segment format")
+    pk.add_argument("--segment-mb", type=int, default=256, help="Roll segments at this size")
+    sub.add_parser("recover", help="Seal segments left open by crashed writers")
+    args = ap.parse_args()
+
+    root = Path(args.corpus or REPO_ROOT / "data" / "corpus")
+    if args.command == "cat":
+        out = sys.stdout.buffer
+        if args.sections:
+            for doc_id, sec in iter_sections(root):
+                out.write(dumps({"doc_id": doc_id, "section": sec}, compact=True) + b"\n")
+        else:
+            for doc in iter_documents(root):
+                out.write(dumps(doc, compact=True) + b"\n")
+        return
+    if args.command == "pack":
+        if not available(args.format):
+            print(f"--format {args.format} needs {'zstandard' if args.format == 'jsonl.zst' else 'pyarrow'}", file=sys.stderr)
+            sys.exit(1)
+        policy = CorpusPolicy(root, args.format, args.segment_mb * 1024 * 1024)
+        print(f"packed: {pack(Path(args.docs or REPO_ROOT / 'data' / 'docs'), policy)}")
+        return
+    if args.command == "recover":
+        root.mkdir(parents=True, exist_ok=True)
+        for name in recover(root):
+            print("recovered:", name)
+        return
+    segs = read_manifest(root)["segments"]
+    for s in segs:
+        print(s["name"], f"docs={s['docs']}", f"sections={s['sections']}", f"bytes={s['bytes']}")
+    print(f"segments={len(segs)} docs={sum(s['docs'] for s in segs)} bytes={sum(s['bytes'] for s in segs)}")
+
+
+if __name__ == "__main__":
+    main()
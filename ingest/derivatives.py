@@ -0,0 +1,204 @@
+"""
+Optional asset policy stage (after process_assets): bounded-size derivatives of figure images.
+
+Originals are kept as they are. For each raster figure asset, Pillow writes into the same store:
+
+  display    longest side <= display_side, in policy.format (WebP or JPEG); only when the
+             original is larger than that or heavier than min_bytes
+  thumbnail  longest side <= thumb_side
+
+A derivative is kept only if it is smaller than the original file, and animated images
+contribute their first frame. Derivative ids are derived from the original asset id and the
+policy (<stem>.w1600q80.webp), so re-ingesting a document finds them and does not encode
+again. Each figure asset gains its dimensions and a "derivatives" mapping:
+
+  {"asset_id": "...", "path": "assets/...", "caption": null, "width": 2880, "height": 1800,
+   "derivatives": {"display": {"asset_id": "...", "path": "assets/...", "width": 1600, "height": 1000},
+                   "thumbnail": {...}}}
+
+Encoding runs in a process pool (policy.workers, shared across documents) because it is CPU
+bound. Pillow is optional: available() reports whether it is installed.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from .asset_store import AssetStore, get_store
+from .layout import find_entry
+
+RASTER_EXTS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tif", ".tiff"})
+_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg")}
+# Refuse to decode images larger than this (decompression bombs)
+MAX_PIXELS = 100_000_000
+
+
+@dataclass(frozen=True)
+class DerivativePolicy:
+    display_side: int = 1600
+    thumb_side: int = 320
+    format: str = "webp"  # webp | jpeg
+    quality: int = 80
+    # Originals within display_side and at most this size get no display copy
+    min_bytes: int = 256 * 1024
+    workers: int = min(4, os.cpu_count() or 1)
+
+    def specs(self) -> tuple[tuple[str, int], ...]:
+        return (("display", self.display_side), ("thumbnail", self.thumb_side))
+
+
+DEFAULT_POLICY = DerivativePolicy()
+
+
+def available() -> bool:
+    """Whether Pillow is installed (derive_assets needs it)."""
+    return Image is not None
+
+
+def derivative_id(asset_id: str, side: int, policy: DerivativePolicy) -> str:
+    stem = asset_id.split(".", 1)[0]
+    return f"{stem}.w{side}q{policy.quality}{_FORMATS[policy.format][1]}"
+
+
+def _flatten(im, fmt: str):
+    """im converted to a mode fmt can encode (alpha composited on white for JPEG)."""
+    has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+    if has_alpha:
+        im = im.convert("RGBA")
+        if fmt == "JPEG":
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            return bg
+        return im
+    return im if im.mode == "RGB" else im.convert("RGB")
+
+
+def _derive_one(src: str, asset_id: str, assets_dir: str, policy: DerivativePolicy) -> dict[str, Any] | None:
+    """
+    Pool worker: {"width", "height", "derivatives": {kind: {asset_id, width, height}}} for one
+    original, encoding derivatives not already in the store. None if it cannot be decoded.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    # File placement only: the worker never touches the store's index
+    store = AssetStore(Path(assets_dir))
+    size = os.path.getsize(src)
+    derivatives: dict[str, dict[str, Any]] = {}
+    try:
+        with Image.open(src) as im:
+            width, height = im.size
+            frame = None
+            for kind, side in policy.specs():
+                if max(width, height) <= side and (kind != "display" or size <= policy.min_bytes):
+                    continue
+                did = derivative_id(asset_id, side, policy)
+                existing = find_entry(store.assets_dir, did)
+                if existing is None:
+                    if frame is None:
+                        # JPEG decodes at a reduced scale when the largest target allows it
+                        im.draft("RGB", (policy.display_side, policy.display_side))
+                        frame = _flatten(ImageOps.exif_transpose(im), _FORMATS[policy.format][0])
+                    out = frame.copy()
+                    out.thumbnail((side, side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                    buf = io.BytesIO()
+                    out.save(buf, format=_FORMATS[policy.format][0], quality=policy.quality)
+                    if buf.tell() >= size:
+                        # Re-encoding did not pay off; the original serves this size
+                        continue
+                    existing = store.put_bytes(buf.getvalue(), did)
+                with Image.open(existing) as d:
+                    derivatives[kind] = {"asset_id": did, "width": d.size[0], "height": d.size[1]}
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return {"width": width, "height": height, "derivatives": derivatives}
+
+
+# One pool per process, created on first use and shared across documents
+_POOL: ProcessPoolExecutor | None = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL, _POOL_WORKERS = ProcessPoolExecutor(workers), workers
+        return _POOL
+
+
+def _reset_after_fork() -> None:
+    global _POOL, _POOL_LOCK
+    _POOL = None
+    _POOL_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def derive_assets(doc: dict[str, Any], assets_dir: Path, policy: DerivativePolicy = DEFAULT_POLICY) -> dict[str, Any]:
+    """
+    Add dimensions and derivatives to each raster figure asset of doc (already processed by
+    process_assets). Assets that fail to decode are left unchanged. Derivatives are added to
+    the document's asset references. Raises RuntimeError when Pillow is not installed.
+    """
+    if Image is None:
+        raise RuntimeError("asset derivatives need Pillow (pip install Pillow)")
+    doc = dict(doc)
+    sections = [dict(sec) for sec in doc.get("sections") or []]
+    store = get_store(assets_dir)
+    originals: dict[str, Path] = {}
+    for sec in sections:
+        if sec.get("type") != "figure":
+            continue
+        for a in sec.get("assets") or []:
+            asset_id = a.get("asset_id") or ""
+            if asset_id and asset_id not in originals and Path(asset_id).suffix.lower() in RASTER_EXTS:
+                p = find_entry(store.assets_dir, asset_id)
+                if p is not None:
+                    originals[asset_id] = p
+
+    args = [(str(p), asset_id, str(store.assets_dir), policy) for asset_id, p in originals.items()]
+    if policy.workers <= 1 or len(args) <= 1:
+        results = [_derive_one(*a) for a in args]
+    else:
+        pool = _get_pool(policy.workers)
+        results = list(pool.map(_derive_one, *zip(*args)))
+    info = dict(zip(originals, results))
+
+    for sec in sections:
+        if sec.get("type") != "figure" or not sec.get("assets"):
+            continue
+        new_assets = []
+        for a in sec["assets"]:
+            found = info.get(a.get("asset_id") or "")
+            if found is not None:
+                a = dict(a, width=found["width"], height=found["height"])
+                if found["derivatives"]:
+                    a["derivatives"] = {
+                        kind: {"asset_id": d["asset_id"], "path": f"assets/{d['asset_id']}", "width": d["width"], "height": d["height"]}
+                        for kind, d in found["derivatives"].items()
+                    }
+            new_assets.append(a)
+        sec["assets"] = new_assets
+    doc["sections"] = sections
+
+    if doc.get("doc_id"):
+        asset_ids = []
+        for sec in sections:
+            for a in sec.get("assets") or []:
+                if a.get("asset_id"):
+                    asset_ids.append(a["asset_id"])
+                asset_ids.extend(d["asset_id"] for d in (a.get("derivatives") or {}).values())
+        store.set_refs(doc["doc_id"], asset_ids)
+    return doc
@@ -1,12 +1,20 @@
 """
 Load HTML adapter YAML and resolve selector format: css:selector@attr
+
+get_compiled_adapter() returns a CompiledAdapter (meta selectors pre-split, soupsieve patterns
+for root and blocks, attrs defaults filled in), cached per process by adapter path + mtime so
+batch and long-running ingest pay the YAML/selector cost once per adapter.
 """
 import re
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
+import soupsieve as sv
 import yaml
 
+META_KEYS = ("title", "url", "published_at", "updated_at")
+
 
 def _resolve_adapter_path(adapter_ref: str, repo_root: Path) -> Path:
     """Resolve adapter path (relative to repo root) to absolute path."""
@@ -49,3 +57,114 @@ def get_meta_value(adapter_meta: dict, key: str) -> str | list[str] | None:
     if isinstance(v, list):
         return v
     return str(v).strip()
+
+
+# (compiled pattern, attr or None for text content)
+MetaSelector = tuple[Any, str | None]
+# (compiled pattern, block type, normalized attrs config)
+BlockMatcher = tuple[Any, str, dict[str, str]]
+
+
+@dataclass(frozen=True)
+class CompiledAdapter:
+    """Adapter YAML with selectors parsed and compiled once."""
+
+    path: Path
+    raw: dict[str, Any]
+    meta: dict[str, list[MetaSelector]] = field(default_factory=dict)
+    authors: MetaSelector | None = None
+    root_selector: str = "body"
+    root: Any = None
+    blocks: list[BlockMatcher] = field(default_factory=list)
+
+
+_ADAPTER_CACHE: dict[Path, tuple[int, CompiledAdapter]] = {}
+
+
+def _compile_selector(selector: str | None):
+    """Compile a CSS selector with soupsieve; None if empty or invalid."""
+    if not selector:
+        return None
+    try:
+        return sv.compile(selector)
+    except Exception:
+        return None
+
+
+def _compile_meta_spec(spec: str) -> MetaSelector | None:
+    sel, attr = parse_meta_selector(spec)
+    pattern = _compile_selector(sel)
+    if pattern is None:
+        return None
+    return pattern, attr
+
+
+def compile_blocks(blocks_config: list) -> list[BlockMatcher]:
+    """
+    Compile content.blocks in order. Entries without a selector or with an invalid one are
+    dropped (the parser used to skip a selector whose select() raised).
+    """
+    compiled: list[BlockMatcher] = []
+    for block_def in blocks_config or []:
+        pattern = _compile_selector(block_def.get("selector"))
+        if pattern is None:
+            continue
+        attrs = dict(block_def.get("attrs") or {})
+        attrs.setdefault("src", "src")
+        attrs.setdefault("caption", "alt")
+        compiled.append((pattern, block_def.get("type", "paragraph"), attrs))
+    return compiled
+
+
+def compile_adapter(adapter: dict[str, Any], path: Path) -> CompiledAdapter:
+    """Pre-parse meta selectors and compile root/block selectors of a loaded adapter."""
+    adapter = adapter or {}
+    meta_config = adapter.get("meta") or {}
+    meta: dict[str, list[MetaSelector]] = {}
+    for key in META_KEYS:
+        spec = get_meta_value(meta_config, key)
+        if spec is None:
+            continue
+        specs = spec if isinstance(spec, list) else [spec]
+        compiled = [m for m in (_compile_meta_spec(s) for s in specs) if m is not None]
+        if compiled:
+            meta[key] = compiled
+
+    authors = None
+    authors_spec = get_meta_value(meta_config, "authors")
+    if authors_spec and isinstance(authors_spec, str):
+        authors = _compile_meta_spec(authors_spec)
+
+    content = adapter.get("content") or {}
+    root_sel = content.get("root") or "body"
+    if isinstance(root_sel, str) and root_sel.startswith("css:"):
+        root_sel = root_sel[4:].strip()
+
+    return CompiledAdapter(
+        path=path,
+        raw=adapter,
+        meta=meta,
+        authors=authors,
+        root_selector=root_sel,
+        root=_compile_selector(root_sel if isinstance(root_sel, str) else None),
+        blocks=compile_blocks(content.get("blocks") or []),
+    )
+
+
+def get_compiled_adapter(adapter_path: Path | str) -> CompiledAdapter:
+    """
+    Load and compile adapter YAML, cached per process. The cache entry is rebuilt when the
+    file's mtime changes, so edited adapters are picked up by long-running pollers.
+    """
+    path = Path(adapter_path).resolve()
+    mtime = path.stat().st_mtime_ns
+    cached = _ADAPTER_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    compiled = compile_adapter(load_adapter(path), path)
+    _ADAPTER_CACHE[path] = (mtime, compiled)
+    return compiled
+
+
+def clear_adapter_cache() -> None:
+    _ADAPTER_CACHE.clear()
@@ -0,0 +1,261 @@
+"""
+Native lxml.html backend for parse_html: same meta/sections as the BeautifulSoup path on
+well-formed pages, but the tree is built by libxml2 and selectors run as XPath via cssselect.
+libxml2 repairs malformed markup (nested <p>, processing instructions, CDATA) differently from
+html.parser; ingest/bench/backends.py lists the known differences.
+
+Text helpers mirror parser.py on lxml's text/tail model: get_text() skips comments and
+script/style/template strings, while inline content keeps comment text (bs4 treats comments
+as plain strings when iterating children).
+"""
+from typing import Any
+from urllib.parse import urljoin
+
+import lxml.html
+from cssselect import SelectorError
+from lxml.cssselect import CSSSelector
+
+from .adapter_loader import BlockMatcher, CompiledAdapter
+
+_NON_TEXT_TAGS = ("script", "style", "template")
+
+# selector string -> CSSSelector (None if cssselect cannot translate it)
+_CSS_CACHE: dict[str, CSSSelector | None] = {}
+
+
+def _css(pattern) -> CSSSelector | None:
+    """CSSSelector for a soupsieve-compiled pattern, translated once per selector string."""
+    if pattern is None:
+        return None
+    sel = pattern.pattern
+    if sel not in _CSS_CACHE:
+        try:
+            _CSS_CACHE[sel] = CSSSelector(sel)
+        except (SelectorError, ValueError):
+            _CSS_CACHE[sel] = None
+    return _CSS_CACHE[sel]
+
+
+def build_tree(html: str):
+    """Parse a whole document; returns the <html> root element."""
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input with an XML encoding declaration is rejected; hand lxml the bytes instead
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+
+def _is_element(node) -> bool:
+    return isinstance(node.tag, str)
+
+
+def _iter_text(elem):
+    if elem.text:
+        yield elem.text
+    for child in elem:
+        if _is_element(child) and child.tag not in _NON_TEXT_TAGS:
+            yield from _iter_text(child)
+        if child.tail:
+            yield child.tail
+
+
+def _text(elem) -> str:
+    if elem is None:
+        return ""
+    return "".join(_iter_text(elem)).strip()
+
+
+def _node_text(node) -> str:
+    """Text of a comment/processing-instruction node, as bs4 str() would give it."""
+    return (node.text or "").strip()
+
+
+def _content_with_links(elem, base_url: str | None = None) -> tuple[str, list[dict[str, str]]]:
+    """lxml counterpart of parser._content_with_links."""
+    if elem is None:
+        return "", []
+    if not _is_element(elem):
+        return _node_text(elem), []
+    links: list[dict[str, str]] = []
+    parts: list[str] = []
+    if elem.text:
+        parts.append(elem.text.strip())
+    for child in elem:
+        if not _is_element(child):
+            parts.append(_node_text(child))
+        elif child.tag == "a":
+            href = (child.get("href") or "").strip()
+            if base_url and href and not href.startswith(("http://", "https://", "#")):
+                href = urljoin(base_url, href)
+            anchor = _text(child)
+            if href:
+                parts.append(f"[{anchor}]({href})")
+                links.append({"href": href, "text": anchor})
+            else:
+                parts.append(anchor)
+        else:
+            c, l = _content_with_links(child, base_url)
+            if c:
+                parts.append(c)
+            links.extend(l)
+        if child.tail:
+            parts.append(child.tail.strip())
+    return (" ".join(parts).strip(), links)
+
+
+def _list_items_tree(ul_or_ol, base_url: str | None = None) -> list[dict[str, Any] | str]:
+    """lxml counterpart of parser._list_items_tree."""
+    items: list[dict[str, Any] | str] = []
+    for li in ul_or_ol:
+        if not _is_element(li) or li.tag != "li":
+            continue
+        text_parts: list[str] = []
+        sub_items: list[dict[str, Any] | str] = []
+        if li.text and li.text.strip():
+            text_parts.append(li.text.strip())
+        for child in li:
+            if _is_element(child) and child.tag in ("ul", "ol"):
+                sub_items.extend(_list_items_tree(child, base_url))
+            else:
+                part, _ = _content_with_links(child, base_url)
+                if part:
+                    text_parts.append(part)
+            if child.tail and child.tail.strip():
+                text_parts.append(child.tail.strip())
+        text = " ".join(text_parts).strip()
+        if sub_items:
+            items.append({"text": text, "items": sub_items})
+        else:
+            items.append(text if text else "")
+    return items
+
+
+def _heading_level(el) -> int:
+    name = el.tag
+    if len(name) == 2 and name[0] == "h" and name[1].isdigit():
+        return min(6, max(1, int(name[1])))
+    return 1
+
+
+def _code_language(el) -> str | None:
+    lang = el.get("lang")
+    if lang:
+        return lang
+    classes = (el.get("class") or "").split()
+    return next((c.replace("language-", "") for c in classes if "language-" in c), None)
+
+
+def _build_section(el, btype: str, attrs_config: dict, base_url: str, index: int) -> dict | None:
+    """lxml counterpart of parser._build_section."""
+    section: dict[str, Any] = {"type": btype}
+    if btype == "heading":
+        section["level"] = _heading_level(el)
+        section["content"] = _text(el)
+        section["section_id"] = el.get("data-id") or f"heading-{index}"
+    elif btype == "code":
+        section["content"] = _text(el)
+        lang = _code_language(el)
+        if lang:
+            section["annotations"] = {"language": str(lang)}
+    elif btype == "figure":
+        src = el.get("src") or el.get(attrs_config.get("src", "src"))
+        caption = el.get("alt") or el.get(attrs_config.get("caption", "alt")) or ""
+        if not src:
+            return None
+        section["assets"] = [{"original_src": src, "caption": caption or None}]
+        section["content"] = ""
+    elif btype == "list":
+        section["section_id"] = el.get("data-id") or f"list-{index}"
+        section["items"] = _list_items_tree(el, base_url or None)
+        section["content"] = ""
+    else:
+        content, links = _content_with_links(el, base_url or None)
+        section["content"] = content
+        if links:
+            section["annotations"] = {"links": links}
+    return section
+
+
+def _select_first(root, pattern):
+    selector = _css(pattern)
+    if selector is None:
+        return None
+    found = selector(root)
+    return found[0] if found else None
+
+
+def extract_meta(root, adapter: CompiledAdapter, source_uri: str) -> dict[str, Any]:
+    """lxml counterpart of parser._extract_meta."""
+    result: dict[str, Any] = {}
+    base_url = source_uri if source_uri.startswith("http") else None
+
+    for key, candidates in adapter.meta.items():
+        for pattern, attr in candidates:
+            el = _select_first(root, pattern)
+            if el is not None:
+                result[key] = el.get(attr) if attr else _text(el)
+                break
+
+    if adapter.authors is not None:
+        pattern, attr = adapter.authors
+        selector = _css(pattern)
+        nodes = selector(root) if selector is not None else []
+        values = [((n.get(attr) or "") if attr else _text(n)).strip() for n in nodes]
+        result["authors"] = [v for v in values if v]
+    if "authors" not in result:
+        result["authors"] = []
+
+    if base_url and result.get("url") and not result["url"].startswith("http"):
+        result["url"] = urljoin(base_url, result["url"])
+    return result
+
+
+def extract_blocks(root, container, compiled_blocks: list[BlockMatcher], base_url: str = "") -> list[dict]:
+    """
+    lxml counterpart of parser._extract_blocks. Selectors run against the whole document so
+    combinators see ancestors outside the content root, as soupsieve does; only the
+    container's descendants are walked. Elements are dict keys, which also keeps their lxml
+    proxies alive so identity holds during the walk.
+    """
+    if container is None or not compiled_blocks:
+        return []
+    matched: dict[Any, int] = {}
+    for i, (pattern, _, _) in enumerate(compiled_blocks):
+        selector = _css(pattern)
+        if selector is None:
+            continue
+        for el in selector(root):
+            matched.setdefault(el, i)
+    if not matched:
+        return []
+
+    sections = []
+    seen = set()
+    for el in container.iterdescendants():
+        if not _is_element(el) or el in seen:
+            continue
+        idx = matched.get(el)
+        if idx is None:
+            continue
+        _, btype, attrs_config = compiled_blocks[idx]
+        seen.add(el)
+        if btype == "list" or (btype == "paragraph" and el.tag == "blockquote"):
+            seen.update(d for d in el.iterdescendants() if _is_element(d))
+        section = _build_section(el, btype, attrs_config, base_url, len(sections))
+        if section is not None:
+            sections.append(section)
+    return sections
+
+
+def parse_tree(html: str, adapter: CompiledAdapter, source_uri: str) -> tuple[dict[str, Any], list[dict]]:
+    """Build the lxml tree and return (meta, sections)."""
+    root = build_tree(html)
+    container = _select_first(root, adapter.root)
+    if container is None:
+        container = root.find("body")
+        if container is None:
+            container = root
+    meta = extract_meta(root, adapter, source_uri)
+    base_url = source_uri if isinstance(source_uri, str) and source_uri.startswith("http") else ""
+    sections = extract_blocks(root, container, adapter.blocks, base_url)
+    return meta, sections
@@ -7,7 +7,14 @@ from urllib.parse import urljoin, urlparse
 
 from bs4 import BeautifulSoup
 
-from .adapter_loader import load_adapter, parse_meta_selector, get_meta_value
+from ..inline_data import spill_data_uris
+from .adapter_loader import BlockMatcher, CompiledAdapter, get_compiled_adapter
+
+# Tree backends for parse_html: BeautifulSoup with html.parser or lxml, or a native lxml.html
+# tree with cssselect (see lxml_tree.py). html.parser stays the default. The lxml backends match
+# it on well-formed pages; malformed markup is repaired differently (ingest/bench/backends.py).
+BACKENDS = ("html.parser", "lxml", "lxml.html")
+DEFAULT_BACKEND = "html.parser"
 
 
 def _select_one(soup: BeautifulSoup, selector: str):
@@ -111,42 +118,38 @@ def _attr(elem, name: str) -> str | None:
     return elem.get(name)
 
 
-def _extract_meta(soup: BeautifulSoup, adapter: dict, source_uri: str) -> dict[str, Any]:
-    """Extract metadata from document using adapter meta selectors."""
-    meta_config = adapter.get("meta") or {}
+def _select_compiled(soup, pattern):
+    """Return first match of a compiled selector or None."""
+    if pattern is None:
+        return None
+    try:
+        return pattern.select_one(soup)
+    except Exception:
+        return None
+
+
+def _extract_meta(soup: BeautifulSoup, adapter: CompiledAdapter, source_uri: str) -> dict[str, Any]:
+    """Extract metadata from document using the adapter's compiled meta selectors."""
     result = {}
     base_url = source_uri if source_uri.startswith("http") else None
 
-    for key in ("title", "url", "published_at", "updated_at"):
-        spec = get_meta_value(meta_config, key)
-        if spec is None:
-            continue
-        if key == "authors":
-            continue
-        if isinstance(spec, list):
-            for s in spec:
-                sel, attr = parse_meta_selector(s)
-                el = _select_one(soup, sel) if sel else None
-                if el:
-                    result[key] = _attr(el, attr) if attr else _text(el)
-                    break
-            continue
-        sel, attr = parse_meta_selector(spec)
-        el = _select_one(soup, sel) if sel else None
-        if el:
-            result[key] = _attr(el, attr) if attr else _text(el)
+    for key, candidates in adapter.meta.items():
+        # A list of specs means fallbacks: first selector that matches wins
+        for pattern, attr in candidates:
+            el = _select_compiled(soup, pattern)
+            if el:
+                result[key] = _attr(el, attr) if attr else _text(el)
+                break
 
     # Authors: single selector returning multiple nodes -> list of strings
-    authors_spec = get_meta_value(meta_config, "authors")
-    if authors_spec and isinstance(authors_spec, str):
-        sel, attr = parse_meta_selector(authors_spec)
-        if sel:
-            nodes = soup.select(sel)
-            result["authors"] = [
-                (_attr(n, attr) if attr else _text(n)).strip()
-                for n in nodes
-                if (_attr(n, attr) if attr else _text(n)).strip()
-            ]
+    if adapter.authors is not None:
+        pattern, attr = adapter.authors
+        nodes = pattern.select(soup)
+        result["authors"] = [
+            (_attr(n, attr) if attr else _text(n)).strip()
+            for n in nodes
+            if (_attr(n, attr) if attr else _text(n)).strip()
+        ]
     if "authors" not in result:
         result["authors"] = []
 
@@ -165,27 +168,76 @@ def _heading_level(tag) -> int:
     return 1
 
 
-def _extract_blocks(
-    container, blocks_config: list, content_root_selector: str, base_url: str = ""
-) -> list[dict]:
+def _build_section(el, btype: str, attrs_config: dict, base_url: str, index: int) -> dict | None:
+    """Build the section for a matched block element; index is the number of sections so far."""
+    section = {"type": btype}
+    if btype == "heading":
+        section["level"] = _heading_level(el)
+        section["content"] = _text(el)
+        section["section_id"] = el.get("data-id") or f"heading-{index}"
+    elif btype == "paragraph":
+        content, links = _content_with_links(el, base_url or None)
+        section["content"] = content
+        if links:
+            section["annotations"] = {"links": links}
+    elif btype == "code":
+        section["content"] = _text(el)
+        lang = el.get("lang") or (el.get("class") and next((c.replace("language-", "") for c in el.get("class", []) if "language-" in str(c)), None))
+        if lang:
+            section["annotations"] = {"language": str(lang)}
+    elif btype == "figure":
+        src = el.get("src") or _attr(el, attrs_config.get("src", "src"))
+        caption = el.get("alt") or _attr(el, attrs_config.get("caption", "alt")) or ""
+        if src:
+            section["assets"] = [{"original_src": src, "caption": caption or None}]
+            section["content"] = ""
+        else:
+            return None
+    elif btype == "list":
+        section["section_id"] = el.get("data-id") or f"list-{index}"
+        section["items"] = _list_items_tree(el, base_url or None)
+        section["content"] = ""
+    else:
+        content, links = _content_with_links(el, base_url or None)
+        section["content"] = content
+        if links:
+            section["annotations"] = {"links": links}
+    return section
+
+
+def _match_blocks(container, compiled_blocks: list[BlockMatcher]) -> dict[int, int]:
+    """
+    Evaluate each block selector once against container. Returns id(element) -> index into
+    compiled_blocks of the first block definition that matches (first match wins).
+    """
+    matched: dict[int, int] = {}
+    for i, (pattern, _, _) in enumerate(compiled_blocks):
+        try:
+            nodes = pattern.select(container)
+        except Exception:
+            continue
+        for el in nodes:
+            matched.setdefault(id(el), i)
+    return matched
+
+
+def _extract_blocks(container, compiled_blocks: list[BlockMatcher], base_url: str = "") -> list[dict]:
     """
-    Extract blocks in document order: walk container's descendants, for each element
-    check if it matches any block selector (first match wins), then emit section.
+    Extract blocks in document order: every block selector is evaluated once against the
+    container, then a single walk over the container's descendants assigns each element its
+    first matching block type (first match wins) and emits the section.
     """
-    if not container or not blocks_config:
+    if not container or not compiled_blocks:
         return []
 
-    selector_to_block: list[tuple[str, str, dict]] = []
-    for block_def in blocks_config:
-        btype = block_def.get("type", "paragraph")
-        sel = block_def.get("selector")
-        if sel:
-            selector_to_block.append((sel, btype, block_def))
+    matched = _match_blocks(container, compiled_blocks)
+    if not matched:
+        return []
 
     sections = []
     seen = set()
     try:
-        descendants = list(container.descendants)
+        descendants = container.descendants
     except Exception:
         return []
 
@@ -194,16 +246,10 @@ def _extract_blocks(
             continue
         if id(el) in seen:
             continue
-        btype, block_def = None, None
-        for sel, bt, bd in selector_to_block:
-            try:
-                if el in (container.select(sel) or []):
-                    btype, block_def = bt, bd
-                    break
-            except Exception:
-                continue
-        if not btype:
+        idx = matched.get(id(el))
+        if idx is None:
             continue
+        _, btype, attrs_config = compiled_blocks[idx]
         seen.add(id(el))
         # Only mark descendants as seen for opaque containers (blockquote, list) so we
         # don't emit inner blocks again. Do NOT mark descendants for p/div so that
@@ -212,40 +258,9 @@ def _extract_blocks(
             for desc in el.descendants:
                 if getattr(desc, "name", None):
                     seen.add(id(desc))
-        attrs_config = block_def.get("attrs") or {}
-        section = {"type": btype}
-        if btype == "heading":
-            section["level"] = _heading_level(el)
-            section["content"] = _text(el)
-            section["section_id"] = el.get("data-id") or f"heading-{len(sections)}"
-        elif btype == "paragraph":
-            content, links = _content_with_links(el, base_url or None)
-            section["content"] = content
-            if links:
-                section["annotations"] = {"links": links}
-        elif btype == "code":
-            section["content"] = _text(el)
-            lang = el.get("lang") or (el.get("class") and next((c.replace("language-", "") for c in el.get("class", []) if "language-" in str(c)), None))
-            if lang:
-                section["annotations"] = {"language": str(lang)}
-        elif btype == "figure":
-            src = el.get("src") or _attr(el, attrs_config.get("src", "src"))
-            caption = el.get("alt") or _attr(el, attrs_config.get("caption", "alt")) or ""
-            if src:
-                section["assets"] = [{"original_src": src, "caption": caption or None}]
-                section["content"] = ""
-            else:
-                continue
-        elif btype == "list":
-            section["section_id"] = el.get("data-id") or f"list-{len(sections)}"
-            section["items"] = _list_items_tree(el, base_url or None)
-            section["content"] = ""
-        else:
-            content, links = _content_with_links(el, base_url or None)
-            section["content"] = content
-            if links:
-                section["annotations"] = {"links": links}
-        sections.append(section)
+        section = _build_section(el, btype, attrs_config, base_url, len(sections))
+        if section is not None:
+            sections.append(section)
     return sections
 
 
@@ -253,29 +268,39 @@ def parse_html(
     html_path: Path | str,
     adapter_path: Path | str,
     source_uri: str = "",
+    backend: str = DEFAULT_BACKEND,
+    inline_store: Path | None = None,
 ) -> dict[str, Any]:
     """
-    Parse HTML file with the given adapter YAML path.
+    Parse HTML file with the given adapter YAML path using one of BACKENDS.
+    When inline_store is set, <img> data:image URIs are spilled there before parsing and figures
+    carry kc-inline handles as original_src (see ingest/inline_data.py).
     Returns parser output: { "meta": {...}, "sections": [...], "parser_version": "..." }.
     """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown HTML backend {backend!r}; expected one of {', '.join(BACKENDS)}")
     html_path = Path(html_path)
     adapter_path = Path(adapter_path)
-    with open(html_path, "r", encoding="utf-8", errors="replace") as f:
-        html = f.read()
-    soup = BeautifulSoup(html, "html.parser")
-    adapter = load_adapter(adapter_path)
-
-    content = adapter.get("content") or {}
-    root_sel = content.get("root") or "body"
-    if isinstance(root_sel, str) and root_sel.startswith("css:"):
-        root_sel = root_sel[4:].strip()
-    container = _select_one(soup, root_sel)
-    if not container:
-        container = soup.find("body") or soup
-
-    meta = _extract_meta(soup, adapter, source_uri)
-    base_url = source_uri if isinstance(source_uri, str) and source_uri.startswith("http") else ""
-    sections = _extract_blocks(container, content.get("blocks") or [], root_sel, base_url)
+    if inline_store is not None:
+        html = spill_data_uris(html_path, inline_store)
+    else:
+        with open(html_path, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+    adapter = get_compiled_adapter(adapter_path)
+
+    if backend == "lxml.html":
+        from .lxml_tree import parse_tree
+
+        meta, sections = parse_tree(html, adapter, source_uri)
+    else:
+        soup = BeautifulSoup(html, backend)
+        container = _select_compiled(soup, adapter.root)
+        if not container:
+            container = soup.find("body") or soup
+
+        meta = _extract_meta(soup, adapter, source_uri)
+        base_url = source_uri if isinstance(source_uri, str) and source_uri.startswith("http") else ""
+        sections = _extract_blocks(container, adapter.blocks, base_url)
 
     return {
         "meta": meta,
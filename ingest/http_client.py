@@ -0,0 +1,78 @@
+"""
+Process-wide HTTP session for asset fetches.
+
+get_session() returns one requests.Session per process with keep-alive connection pools
+(pool_maxsize connections kept per host, pool_connections hosts cached), so images from the
+same CDN reuse TCP/TLS connections across figures and documents. configure() replaces it with
+different pool sizes or headers. The session is rebuilt in a forked child, so pool workers
+never share sockets with their parent.
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+# Kept-alive connections per host; matches assets.DEFAULT_MAX_CONCURRENCY
+POOL_MAXSIZE = 8
+# Hosts whose pools are cached
+POOL_CONNECTIONS = 32
+
+_session: requests.Session | None = None
+_lock = threading.Lock()
+
+
+def make_session(
+    pool_connections: int = POOL_CONNECTIONS,
+    pool_maxsize: int = POOL_MAXSIZE,
+    headers: dict[str, str] | None = None,
+) -> requests.Session:
+    """New Session with sized keep-alive pools for http and https and default headers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS if headers is None else headers)
+    return session
+
+
+def get_session() -> requests.Session:
+    """The process-wide session, created on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def configure(
+    pool_connections: int = POOL_CONNECTIONS,
+    pool_maxsize: int = POOL_MAXSIZE,
+    headers: dict[str, str] | None = None,
+) -> requests.Session:
+    """Replace the process-wide session (closing the old one); returns the new session."""
+    global _session
+    with _lock:
+        old, _session = _session, make_session(pool_connections, pool_maxsize, headers)
+    if old is not None:
+        old.close()
+    return _session
+
+
+def _reset_after_fork() -> None:
+    global _session, _lock
+    _session = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
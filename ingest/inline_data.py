@@ -0,0 +1,148 @@
+"""
+Spill inline data:image/...;base64 URIs out of HTML before parsing.
+
+SingleFile captures embed every image as a base64 data URI. spill_data_uris() streams the raw
+HTML, decodes each such URI into a content-addressed side store (a directory of
+<sha256><ext> files) and leaves a short handle (kc-inline:<sha256><ext>) in its place, so the
+parser, normalizer and assets stage carry handles instead of multi-MB strings. The assets
+stage resolves handles with read_inline().
+
+Only the src / data-src attribute values of <img> tags (what figure blocks read) are spilled;
+data URIs anywhere else (text, <code>/<pre>, CSS url(...), links) are left byte-identical.
+"""
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from .data_uri import MAX_HEADER, image_ext, parse_header
+
+INLINE_SCHEME = "kc-inline:"
+# Handle left for a data URI whose payload did not decode; resolves to no asset, like the
+# failed base64 decode it replaces.
+INVALID_HANDLE = INLINE_SCHEME + "invalid"
+
+_MARKER = "data:image/"
+_PAYLOAD_RE = re.compile(r"[A-Za-z0-9+/=\r\n]*")
+# The tag text before a spilled URI: "<img ... src=" / "data-src=", optionally quoted
+_IMG_ATTR_RE = re.compile(r"<img\b[^>]*\s(?:data-)?src\s*=\s*[\"']?", re.IGNORECASE)
+# Output kept to look back for the enclosing tag (longer <img> prefixes are left alone)
+_LOOKBACK = 4096
+_CHUNK_SIZE = 1 << 20
+
+
+def _store_payload(store_dir: Path, payload: str, ext: str) -> str:
+    """Decode one base64 payload into store_dir; returns its handle (INVALID_HANDLE on error)."""
+    try:
+        data = binascii.a2b_base64(payload)
+    except binascii.Error:
+        return INVALID_HANDLE
+    if not data:
+        return INVALID_HANDLE
+    name = hashlib.sha256(data).hexdigest() + ext
+    final = store_dir / name
+    if not final.exists():
+        fd, tmp = tempfile.mkstemp(dir=store_dir, suffix=".part")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, final)
+    return INLINE_SCHEME + name
+
+
+def spill_data_uris(html_path: Path | str, store_dir: Path, chunk_size: int = _CHUNK_SIZE) -> str:
+    """
+    Read html_path in chunks and return its text with every data:image/<type>[;params];base64 URI
+    replaced by a kc-inline handle; decoded bytes are written to store_dir.
+    """
+    store_dir.mkdir(parents=True, exist_ok=True)
+    out = io.StringIO()
+    tail = ""
+
+    def emit(text: str) -> None:
+        nonlocal tail
+        out.write(text)
+        tail = (tail + text[-_LOOKBACK:])[-_LOOKBACK:]
+    with open(html_path, "r", encoding="utf-8", errors="replace") as f:
+        buf = ""
+        eof = False
+
+        def fill() -> None:
+            nonlocal buf, eof
+            chunk = f.read(chunk_size)
+            if chunk:
+                buf += chunk
+            else:
+                eof = True
+
+        fill()
+        while True:
+            i = buf.find(_MARKER)
+            if i < 0:
+                if eof:
+                    emit(buf)
+                    break
+                # Keep a possible partial marker at the end of the buffer
+                keep = min(len(buf), len(_MARKER) - 1)
+                emit(buf[: len(buf) - keep])
+                buf = buf[len(buf) - keep:]
+                fill()
+                continue
+            emit(buf[:i])
+            buf = buf[i:]
+            while buf.find(",", 0, MAX_HEADER) < 0 and len(buf) < MAX_HEADER and not eof:
+                fill()
+            comma = buf.find(",", 0, MAX_HEADER)
+            # Same headers the assets stage decodes (data_uri.parse_header), base64 payloads only
+            header = parse_header(buf[:comma]) if comma >= 0 else None
+            ext = image_ext(header[0]) if header is not None and header[2] else None
+            if ext is not None and not _in_img_src(tail):
+                ext = None
+            if ext is None:
+                emit(_MARKER)
+                buf = buf[len(_MARKER):]
+                continue
+            # Only one payload is held at a time; the rest of the page keeps streaming
+            pieces: list[str] = []
+            pos = comma + 1
+            while True:
+                end = _PAYLOAD_RE.match(buf, pos).end()
+                pieces.append(buf[pos:end])
+                if end < len(buf) or eof:
+                    buf = buf[end:]
+                    break
+                buf = ""
+                pos = 0
+                fill()
+            payload = "".join(pieces)
+            if "\n" in payload or "\r" in payload:
+                payload = payload.replace("\r", "").replace("\n", "")
+            emit(_store_payload(store_dir, payload, ext))
+    return out.getvalue()
+
+
+def _in_img_src(before: str) -> bool:
+    """Whether text ending in before continues an <img> src / data-src attribute value."""
+    lt = before.rfind("<")
+    return lt >= 0 and _IMG_ATTR_RE.fullmatch(before, lt) is not None
+
+
+def inline_path(handle: str, store_dir: Path | None) -> Path | None:
+    """Path of the stored bytes for a kc-inline handle, or None if unknown."""
+    if store_dir is None or not handle.startswith(INLINE_SCHEME) or handle == INVALID_HANDLE:
+        return None
+    name = handle[len(INLINE_SCHEME):]
+    if not name or "/" in name or "\\" in name:
+        return None
+    p = store_dir / name
+    return p if p.is_file() else None
+
+
+def read_inline(handle: str, store_dir: Path | None) -> tuple[bytes | None, str]:
+    """Resolve a kc-inline handle to (bytes, ext), or (None, "") if it cannot be resolved."""
+    p = inline_path(handle, store_dir)
+    if p is None:
+        return None, ""
+    return p.read_bytes(), p.suffix
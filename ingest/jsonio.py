@@ -0,0 +1,55 @@
+"""
+JSON serializer for the document sinks: orjson when it is installed, else the stdlib json module.
+
+Output matches json.dumps(obj, ensure_ascii=False, indent=2) (UTF-8, two-space indent), or
+separators=(",", ":") without indentation when compact; only floats in exponent form may be
+spelled differently (1e-7 vs 1e-07). write_json() writes straight to the
+file: orjson encodes to one UTF-8 bytes buffer (no intermediate str), and the stdlib path
+streams chunks with json.dump instead of building the whole string first. Objects orjson
+cannot encode (e.g. non-str keys, integers over 64 bits) fall back to the stdlib.
+"""
+import json
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Keep in sync with raw_ingest/common/jsonio.py and raw_epub_parse/common/jsonio.py
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any, compact: bool = False) -> bytes:
+    """obj as UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2)
+        except TypeError:
+            pass
+    if compact:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def write_json(obj: Any, path: Path, compact: bool = False) -> None:
+    """Write obj to path as UTF-8 JSON (pretty-printed unless compact)."""
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2)
+        except TypeError:
+            data = None
+        if data is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+    with open(path, "w", encoding="utf-8") as f:
+        if compact:
+            json.dump(obj, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Directory layout of data/assets and data/docs: flat (default) or sharded by name prefix.
+
+A sharded directory keeps <name> under depth levels of two-character subdirectories taken from
+the name (content hashes for assets, uuids for docs):
+
+  flat:     assets/3fa2c1d09be4a7e1.png
+  depth 2:  assets/3f/a2/3fa2c1d09be4a7e1.png
+
+The layout is opt-in and recorded in a marker file (<dir>/.layout.json), so every writer
+(run_ingest, the poller, the raw_ingest and raw_epub_parse sinks) follows it without flags.
+Documents keep logical asset paths ("assets/<asset_id>"); resolve_asset() maps them to the
+file, and generated Markdown links point at the physical file relative to the .md location.
+Lookups fall back to the other depths, so a tree half-way through a reshard still resolves.
+
+Usage:
+  python -m ingest.layout status  [--assets dir] [--docs dir]
+  python -m ingest.layout reshard [--assets dir] [--docs dir] --depth 2   # --depth 0 flattens
+Stop the poller and site routers while resharding.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Keep in sync with raw_ingest/common/layout.py and raw_epub_parse/common/layout.py
+LAYOUT_NAME = ".layout.json"
+SHARD_WIDTH = 2
+MAX_DEPTH = 3
+
+# ](../assets/<shards/>name) links written by document_to_markdown
+_MD_ASSET_LINK = re.compile(r"\]\((?:\.\./)+assets/(?:[^/()\s]+/)*([^/()\s]+)\)")
+
+# resolved dir -> (marker mtime_ns, depth); the marker is re-checked with one stat per call
+_DEPTHS: dict[Path, tuple[int, int]] = {}
+
+
+def shard_depth(root: Path) -> int:
+    """Shard depth recorded for root (0 = flat, also when there is no marker)."""
+    marker = Path(root) / LAYOUT_NAME
+    try:
+        mtime = marker.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    key = marker.resolve()
+    cached = _DEPTHS.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        depth = int(json.loads(marker.read_text(encoding="utf-8")).get("depth") or 0)
+    except (OSError, ValueError, AttributeError):
+        depth = 0
+    depth = max(0, min(depth, MAX_DEPTH))
+    _DEPTHS[key] = (mtime, depth)
+    return depth
+
+
+def set_shard_depth(root: Path, depth: int) -> None:
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    if depth:
+        tmp = root / f"{LAYOUT_NAME}.tmp"
+        tmp.write_text(json.dumps({"depth": depth, "width": SHARD_WIDTH}) + "\n", encoding="utf-8")
+        os.replace(tmp, root / LAYOUT_NAME)
+    else:
+        (root / LAYOUT_NAME).unlink(missing_ok=True)
+
+
+def shard_parts(name: str, depth: int) -> list[str]:
+    """Subdirectory names for name at depth (taken from the start of the file stem)."""
+    stem = name.split(".", 1)[0].lower().ljust(depth * SHARD_WIDTH, "_")
+    return [stem[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(depth)]
+
+
+def entry_path(root: Path, name: str, depth: int | None = None) -> Path:
+    """Where name is written under root in its current layout (or at depth)."""
+    if depth is None:
+        depth = shard_depth(root)
+    return Path(root).joinpath(*shard_parts(name, depth), name)
+
+
+def find_entry(root: Path, name: str) -> Path | None:
+    """Existing file for name under root: the current layout first, then the other depths."""
+    depth = shard_depth(root)
+    for d in (depth, *(d for d in range(MAX_DEPTH + 1) if d != depth)):
+        p = entry_path(root, name, d)
+        if p.exists():
+            return p
+    return None
+
+
+def resolve_asset(assets_dir: Path, path: str) -> Path | None:
+    """File for a Document asset path ("assets/<asset_id>" or a bare asset_id), in any layout."""
+    name = (path or "").rsplit("/", 1)[-1]
+    return find_entry(assets_dir, name) if name else None
+
+
+def doc_paths(docs_dir: Path, doc_id: str) -> tuple[Path, Path]:
+    """(json_path, md_path) for doc_id in docs_dir's current layout."""
+    return entry_path(docs_dir, f"{doc_id}.json"), entry_path(docs_dir, f"{doc_id}.md")
+
+
+def markdown_asset_link(path: str, docs_depth: int = 0, assets_depth: int = 0) -> str:
+    """Link from a .md in docs/ (at docs_depth) to an asset path in the sibling assets/ dir."""
+    rel = path[len("assets/"):] if path.startswith("assets/") else path
+    if "/" not in rel:
+        # A bare asset_id: point at its shard
+        rel = "/".join([*shard_parts(rel, assets_depth), rel])
+    return "../" * (1 + docs_depth) + "assets/" + rel
+
+
+def rewrite_markdown_links(text: str, docs_depth: int, assets_depth: int) -> str:
+    """Re-point generated asset links in Markdown after either tree was resharded."""
+    return _MD_ASSET_LINK.sub(lambda m: f"]({markdown_asset_link(m.group(1), docs_depth, assets_depth)})", text)
+
+
+def _entries(root: Path):
+    """Data files under root (shard subdirectories included; dotfiles such as the index skipped)."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in filenames:
+            if not name.startswith("."):
+                yield Path(dirpath) / name
+
+
+def reshard(root: Path, depth: int) -> int:
+    """Move every file under root to the layout at depth; returns the number of files moved."""
+    root = Path(root)
+    if not root.is_dir():
+        return 0
+    # Marker first: writers that start meanwhile use the new layout, readers fall back
+    set_shard_depth(root, depth)
+    moved = 0
+    for src in list(_entries(root)):
+        dest = entry_path(root, src.name, depth)
+        if src == dest:
+            continue
+        if dest.exists():
+            # Same asset (content addressed) or a doc rewritten in the new layout meanwhile
+            src.unlink()
+            continue
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+        moved += 1
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        # Only emptied shard directories (two-character names) are removed
+        if Path(dirpath) != root and len(Path(dirpath).name) == SHARD_WIDTH and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return moved
+
+
+def relink_markdown(docs_dir: Path, assets_dir: Path) -> int:
+    """Rewrite asset links in every .md under docs_dir for the current layouts; returns files changed."""
+    docs_depth, assets_depth = shard_depth(docs_dir), shard_depth(assets_dir)
+    changed = 0
+    for p in _entries(docs_dir):
+        if p.suffix != ".md":
+            continue
+        text = p.read_text(encoding="utf-8")
+        new = rewrite_markdown_links(text, docs_depth, assets_depth)
+        if new != text:
+            p.write_text(new, encoding="utf-8")
+            changed += 1
+    return changed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Show or change the sharded layout of data/assets and data/docs")
+    ap.add_argument("--assets", default=None, help="Assets directory (default: data/assets)")
+    ap.add_argument("--docs", default=None, help="Docs directory (default: data/docs)")
+    sub = ap.add_subparsers(dest="command")
+    sub.add_parser("status", help="Shard depth of each directory")
+    rs = sub.add_parser("reshard", help="Move existing files into a new layout and relink Markdown")
+    rs.add_argument("--depth", type=int, required=True, help=f"Shard levels, 0 (flat) to {MAX_DEPTH}")
+    rs.add_argument("--only", choices=("assets", "docs"), default=None, help="Reshard only one directory")
+    args = ap.parse_args()
+
+    assets_dir = Path(args.assets or REPO_ROOT / "data" / "assets")
+    docs_dir = Path(args.docs or REPO_ROOT / "data" / "docs")
+    if args.command == "reshard":
+        if not 0 <= args.depth <= MAX_DEPTH:
+            print(f"--depth must be between 0 and {MAX_DEPTH}", file=sys.stderr)
+            sys.exit(1)
+        for name, root in (("assets", assets_dir), ("docs", docs_dir)):
+            if args.only in (None, name):
+                print(f"{name}: moved {reshard(root, args.depth)}")
+        if docs_dir.is_dir():
+            print(f"markdown relinked: {relink_markdown(docs_dir, assets_dir)}")
+        return
+    for name, root in (("assets", assets_dir), ("docs", docs_dir)):
+        print(f"{name}: {root}  depth={shard_depth(root)}")
+
+
+if __name__ == "__main__":
+    main()
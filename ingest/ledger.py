@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+SQLite job ledger for RawDoc processing (replaces <rawdoc_id>.done marker files).
+
+One row per RawDoc in <rawdocs_dir>/ledger.sqlite3. The database runs in WAL mode so the
+poller, its worker processes, run_ingest and the raw_ingest site routers share it safely.
+
+  pending -> running -> done
+                     -> failed -> running -> ...   (retried after a backoff)
+                     -> dead                       (dead letter: not retried until requeued)
+
+A job is claimed with a single conditional UPDATE, so two processes never run the same RawDoc.
+Each row keeps the attempt count, the last error, per-stage durations (seconds) of the last
+attempt and the resulting doc_id. A failed job becomes due again after an exponential backoff
+with jitter (RetryPolicy); once it has used max_attempts it is dead-lettered. A running job whose
+claiming process has died is failed by reset_stale(), which the poller calls on every pass.
+
+Usage:
+  python -m ingest.ledger status [--rawdocs dir] [--state dead] [--limit 20]
+  python -m ingest.ledger requeue [--rawdocs dir] [--all-dead | --all-failed] [rawdoc_id ...]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+LEDGER_NAME = "ledger.sqlite3"
+STATES = ("pending", "running", "done", "failed", "dead")
+# A job left "running" this long (seconds) is assumed orphaned even when its claimant cannot be
+# checked (another host, reused pid); claims by exited processes on this host are released at once
+STALE_AFTER = 3600.0
+META_SUFFIX = ".meta.json"
+DONE_SUFFIX = ".done"
+
+# Keep in sync with raw_ingest/common/ledger_doc.py
+SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    rawdoc_id   TEXT PRIMARY KEY,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    doc_id      TEXT,
+    stages      TEXT,
+    worker      TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, updated_at);
+"""
+# user_version -> statements upgrading the previous version
+_MIGRATIONS = {
+    2: (
+        "ALTER TABLE jobs ADD COLUMN next_attempt_at REAL",
+        "CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, next_attempt_at)",
+    ),
+}
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """When a failed job is retried: backoff_base * 2^(attempts-1) seconds, capped, with jitter."""
+
+    max_attempts: int = 5  # attempts before a job is dead-lettered; <= 0 retries forever
+    backoff_base: float = 60.0
+    backoff_max: float = 6 * 3600.0
+
+    def delay(self, attempts: int) -> float:
+        """Seconds until the next attempt after `attempts` failures (equal jitter: 50-100%)."""
+        step = min(self.backoff_max, self.backoff_base * 2 ** max(0, attempts - 1))
+        return step / 2 + random.uniform(0, step / 2)
+
+    def exhausted(self, attempts: int) -> bool:
+        return self.max_attempts > 0 and attempts >= self.max_attempts
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+
+def ledger_path(rawdocs_dir: Path) -> Path:
+    return Path(rawdocs_dir) / LEDGER_NAME
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """Batch statements into one write transaction (the connection is in autocommit mode)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def open_ledger(rawdocs_dir: Path) -> sqlite3.Connection:
+    """Open (creating if needed) the ledger for rawdocs_dir. Autocommit; one per process."""
+    path = ledger_path(rawdocs_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        with _transaction(conn):
+            # Re-read under the write lock: another process may have migrated meanwhile
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                for stmt in _SCHEMA.split(";"):
+                    if stmt.strip():
+                        conn.execute(stmt)
+                version = 1
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                for stmt in _MIGRATIONS[v]:
+                    conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+def enqueue(conn: sqlite3.Connection, rawdoc_ids: list[str]) -> int:
+    """Add rawdoc_ids as pending; ids already in the ledger are left alone. Returns rows added."""
+    now = time.time()
+    before = conn.total_changes
+    with _transaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO jobs (rawdoc_id, state, created_at, updated_at) VALUES (?, 'pending', ?, ?)",
+            [(rid, now, now) for rid in rawdoc_ids],
+        )
+    return conn.total_changes - before
+
+
+def import_rawdocs(conn: sqlite3.Connection, rawdocs_dir: Path) -> int:
+    """
+    List rawdocs_dir once: enqueue every <id>.meta.json not yet in the ledger and record legacy
+    <id>.done markers as done. Returns the number of new pending jobs.
+    """
+    try:
+        with os.scandir(rawdocs_dir) as it:
+            names = [e.name for e in it]
+    except FileNotFoundError:
+        return 0
+    done = [n[: -len(DONE_SUFFIX)] for n in names if n.endswith(DONE_SUFFIX)]
+    ids = sorted(n[: -len(META_SUFFIX)] for n in names if n.endswith(META_SUFFIX))
+    if done:
+        now = time.time()
+        with _transaction(conn):
+            conn.executemany(
+                "INSERT INTO jobs (rawdoc_id, state, created_at, updated_at, finished_at) VALUES (?, 'done', ?, ?, ?) "
+                "ON CONFLICT (rawdoc_id) DO UPDATE SET state = 'done', updated_at = excluded.updated_at "
+                "WHERE state = 'pending'",
+                [(rid, now, now, now) for rid in done],
+            )
+    return enqueue(conn, ids)
+
+
+def claim(conn: sqlite3.Connection, rawdoc_id: str, worker: str | None = None) -> bool:
+    """
+    Atomically move a pending/failed job to running; False if it is missing, running, done or
+    dead. The backoff is not checked here: runnable_ids() only offers jobs that are due.
+    """
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE jobs SET state = 'running', attempts = attempts + 1, worker = ?, started_at = ?, updated_at = ? "
+        "WHERE rawdoc_id = ? AND state IN ('pending', 'failed')",
+        (worker or worker_name(), now, now, rawdoc_id),
+    )
+    return cur.rowcount == 1
+
+
+def finish(conn: sqlite3.Connection, rawdoc_id: str, doc_id: str, stages: dict[str, float] | None = None) -> None:
+    """Record a claimed job as done."""
+    now = time.time()
+    conn.execute(
+        "UPDATE jobs SET state = 'done', doc_id = ?, last_error = NULL, stages = ?, updated_at = ?, finished_at = ? "
+        "WHERE rawdoc_id = ?",
+        (doc_id, json.dumps(stages or {}), now, now, rawdoc_id),
+    )
+
+
+def fail(
+    conn: sqlite3.Connection,
+    rawdoc_id: str,
+    error: str,
+    stages: dict[str, float] | None = None,
+    policy: RetryPolicy = DEFAULT_RETRY,
+) -> str:
+    """
+    Record a failed attempt of a running job: dead once policy.max_attempts are used, otherwise
+    failed and due again after policy.delay(). Returns the new state.
+    """
+    row = conn.execute("SELECT attempts FROM jobs WHERE rawdoc_id = ?", (rawdoc_id,)).fetchone()
+    attempts = row["attempts"] if row else 0
+    now = time.time()
+    if policy.exhausted(attempts):
+        state, next_at = "dead", None
+    else:
+        state, next_at = "failed", now + policy.delay(attempts)
+    conn.execute(
+        "UPDATE jobs SET state = ?, last_error = ?, stages = ?, next_attempt_at = ?, updated_at = ?, finished_at = ? "
+        "WHERE rawdoc_id = ? AND state = 'running'",
+        (state, error, json.dumps(stages or {}), next_at, now, now, rawdoc_id),
+    )
+    return state
+
+
+def record_done(conn: sqlite3.Connection, rawdoc_id: str, doc_id: str, stages: dict[str, float] | None = None) -> None:
+    """Mark rawdoc_id done whatever its current state (documents ingested outside the poller)."""
+    now = time.time()
+    conn.execute(
+        "INSERT INTO jobs (rawdoc_id, state, attempts, doc_id, stages, created_at, updated_at, finished_at) "
+        "VALUES (?, 'done', 1, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (rawdoc_id) DO UPDATE SET state = 'done', doc_id = excluded.doc_id, last_error = NULL, "
+        "stages = excluded.stages, updated_at = excluded.updated_at, finished_at = excluded.finished_at",
+        (rawdoc_id, doc_id, json.dumps(stages or {}), now, now, now),
+    )
+
+
+def release(conn: sqlite3.Connection, rawdoc_ids: list[str], error: str, policy: RetryPolicy = DEFAULT_RETRY) -> int:
+    """
+    Fail still-running jobs among rawdoc_ids (their process died) under policy, so a document
+    that crashes its worker is dead-lettered like any other. Returns rows changed.
+    """
+    before = conn.total_changes
+    with _transaction(conn):
+        for rid in rawdoc_ids:
+            fail(conn, rid, error, policy=policy)
+    return conn.total_changes - before
+
+
+def _claimant_gone(worker: str | None) -> bool:
+    """True if worker names a process on this host ("host:pid") that no longer exists."""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # EPERM: the pid exists under another user
+        return False
+    return False
+
+
+def reset_stale(conn: sqlite3.Connection, older_than: float = STALE_AFTER, policy: RetryPolicy = DEFAULT_RETRY) -> int:
+    """
+    Fail running jobs whose claim is orphaned: claimed by a process on this host that has exited,
+    or running longer than older_than seconds (claims from other hosts, reused pids). Cheap enough
+    to call on every poll pass. Returns rows changed.
+    """
+    cutoff = time.time() - older_than
+    rows = conn.execute("SELECT rawdoc_id, worker, started_at FROM jobs WHERE state = 'running'").fetchall()
+    orphaned = [r for r in rows if (r["started_at"] or 0) < cutoff or _claimant_gone(r["worker"])]
+    if not orphaned:
+        return 0
+    before = conn.total_changes
+    with _transaction(conn):
+        for row in orphaned:
+            # Skip jobs finished or re-claimed since the SELECT above
+            if conn.execute(
+                "SELECT 1 FROM jobs WHERE rawdoc_id = ? AND state = 'running' AND worker IS ? AND started_at IS ?",
+                (row["rawdoc_id"], row["worker"], row["started_at"]),
+            ).fetchone():
+                fail(conn, row["rawdoc_id"], f"stale running claim ({row['worker'] or '?'})", policy=policy)
+    return conn.total_changes - before
+
+
+def requeue(conn: sqlite3.Connection, rawdoc_ids: list[str] | None = None, states: tuple[str, ...] = ("dead",)) -> int:
+    """
+    Make jobs pending again with a fresh attempt budget: the given ids (if dead or failed), or
+    every job in states. Returns rows changed.
+    """
+    now = time.time()
+    sql = "UPDATE jobs SET state = 'pending', attempts = 0, next_attempt_at = NULL, updated_at = ? WHERE "
+    if rawdoc_ids is not None:
+        before = conn.total_changes
+        with _transaction(conn):
+            conn.executemany(
+                sql + "rawdoc_id = ? AND state IN ('dead', 'failed')", [(now, rid) for rid in rawdoc_ids]
+            )
+        return conn.total_changes - before
+    marks = ", ".join("?" for _ in states)
+    return conn.execute(sql + f"state IN ({marks})", (now, *states)).rowcount
+
+
+def job_state(conn: sqlite3.Connection, rawdoc_id: str) -> str | None:
+    row = conn.execute("SELECT state FROM jobs WHERE rawdoc_id = ?", (rawdoc_id,)).fetchone()
+    return row["state"] if row else None
+
+
+def runnable_ids(conn: sqlite3.Connection, limit: int | None = None) -> list[str]:
+    """Pending jobs, then failed jobs whose backoff has elapsed (oldest first)."""
+    sql = (
+        "SELECT rawdoc_id FROM jobs WHERE state = 'pending' "
+        "UNION ALL SELECT rawdoc_id FROM jobs WHERE state = 'failed' AND COALESCE(next_attempt_at, 0) <= ?"
+    )
+    params: list = [time.time()]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [row["rawdoc_id"] for row in conn.execute(sql, params)]
+
+
+def next_due(conn: sqlite3.Connection) -> float | None:
+    """Earliest time.time() at which a failed job becomes due, or None if none is waiting."""
+    row = conn.execute("SELECT MIN(COALESCE(next_attempt_at, 0)) AS t FROM jobs WHERE state = 'failed'").fetchone()
+    return row["t"]
+
+
+def counts(conn: sqlite3.Connection) -> dict[str, int]:
+    out = dict.fromkeys(STATES, 0)
+    for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+        out[row["state"]] = row["n"]
+    return out
+
+
+def _print_jobs(conn: sqlite3.Connection, state: str, limit: int) -> None:
+    rows = conn.execute("SELECT * FROM jobs WHERE state = ? ORDER BY updated_at DESC LIMIT ?", (state, limit))
+    for row in rows:
+        error = (row["last_error"] or "").strip().splitlines()
+        due = ""
+        if row["state"] == "failed" and row["next_attempt_at"]:
+            due = f"retry_in={max(0, int(row['next_attempt_at'] - time.time()))}s"
+        print(
+            row["rawdoc_id"],
+            f"attempts={row['attempts']}",
+            f"doc_id={row['doc_id'] or '-'}",
+            f"stages={row['stages'] or '{}'}",
+            due,
+            error[-1] if error else "",
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect the RawDoc job ledger or requeue jobs")
+    ap.add_argument("--rawdocs", default=None, help="RawDocs directory (default: data/rawdocs)")
+    sub = ap.add_subparsers(dest="command")
+    st = sub.add_parser("status", help="Job counts per state, optionally listing one state")
+    st.add_argument("--state", default=None, choices=STATES, help="List jobs in this state")
+    st.add_argument("--limit", type=int, default=20, help="Max jobs listed with --state")
+    rq = sub.add_parser("requeue", help="Make dead (or failed) jobs pending with a fresh attempt budget")
+    rq.add_argument("rawdoc_ids", nargs="*", help="Jobs to requeue")
+    rq.add_argument("--all-dead", action="store_true", help="Requeue every dead job")
+    rq.add_argument("--all-failed", action="store_true", help="Requeue every failed job now, skipping backoff")
+    args = ap.parse_args()
+
+    rawdocs_dir = Path(args.rawdocs or REPO_ROOT / "data" / "rawdocs")
+    conn = open_ledger(rawdocs_dir)
+    if args.command == "requeue":
+        states = tuple(s for s, on in (("dead", args.all_dead), ("failed", args.all_failed)) if on)
+        if not args.rawdoc_ids and not states:
+            print("Provide rawdoc ids, --all-dead or --all-failed", file=sys.stderr)
+            sys.exit(1)
+        n = 0
+        if args.rawdoc_ids:
+            n += requeue(conn, args.rawdoc_ids)
+        if states:
+            n += requeue(conn, states=states)
+        print(f"requeued: {n}")
+        return
+    print("  ".join(f"{state}: {n}" for state, n in counts(conn).items()))
+    if getattr(args, "state", None):
+        _print_jobs(conn, args.state, args.limit)
+
+
+if __name__ == "__main__":
+    main()
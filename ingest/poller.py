@@ -1,17 +1,131 @@
 #!/usr/bin/env python3
 """
 Poll data/rawdocs for unprocessed RawDocs and run ingest. For Docker ingest service.
-Usage: python -m ingest.poller [--interval 30] [--rawdocs dir] [--assets dir] [--docs dir]
+Usage: python -m ingest.poller [--interval 30] [--rawdocs dir] [--assets dir] [--docs dir] [--html-backend lxml.html] [--once] [--workers N] [--watch]
+                               [--max-attempts 5] [--backoff 60] [--backoff-max 21600] [--derivatives webp] [--compact]
+                               [--corpus data/corpus [--corpus-format jsonl] [--segment-mb 256] [--no-docs]]
+
+Processing state lives in the job ledger (ingest/ledger.py, <rawdocs>/ledger.sqlite3): new
+RawDocs are enqueued as pending, each document is claimed atomically before it runs, and its
+outcome (doc_id and stage durations, or the traceback) is recorded. Every pass first fails
+running jobs whose claiming process has died (ledger.reset_stale). The backlog is processed
+in-process with one IngestContext (routes, compiled adapters, HTTP session), so documents do
+not pay interpreter startup and imports. Each document is isolated: an exception is logged and
+the job is left failed. A failed job is retried after an exponential backoff with jitter
+(--backoff doubling per attempt, capped at --backoff-max); after --max-attempts it is
+dead-lettered until `python -m ingest.ledger requeue` puts it back.
+
+With --workers N (N > 1) documents fan out to a pool of long-lived worker processes, each with
+its own IngestContext and ledger connection.
+
+With --watch, new RawDocs are discovered through ingest.watch.RawdocWatcher (inotify, polling
+fallback) instead of listing the whole directory every --interval seconds; the poller also
+wakes when a failed job's backoff ends.
+
+With --derivatives webp|jpeg, figure images also get bounded-size display and thumbnail copies
+(ingest/derivatives.py, Pillow) encoded in a process pool.
+
+With --corpus DIR, Documents are also appended to rolling segment files with a manifest
+(ingest/corpus.py); each worker process writes its own segment and seals it on exit.
 """
 import argparse
-import subprocess
+import sqlite3
 import sys
 import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(REPO_ROOT))
 
+from ingest import ledger
+from ingest.corpus import FORMATS as CORPUS_FORMATS
+from ingest.derivatives import DEFAULT_POLICY as DEFAULT_DERIVATIVES
+from ingest.html.parser import BACKENDS, DEFAULT_BACKEND
+from ingest.run_ingest import (
+    IngestContext,
+    corpus_policy_from_args,
+    derivative_policy_from_args,
+    ingest_rawdoc,
+    load_rawdoc_meta,
+    make_context,
+)
+from ingest.watch import RawdocWatcher
+
+
+def process_one(
+    rawdoc_id: str,
+    ctx: IngestContext,
+    conn: sqlite3.Connection,
+    policy: ledger.RetryPolicy = ledger.DEFAULT_RETRY,
+) -> str:
+    """
+    Claim, ingest and record one RawDoc. Returns the job's new state ("done", "failed" or
+    "dead"), or "" when the job was not claimable (another process holds it or it is finished).
+    """
+    if not ledger.claim(conn, rawdoc_id):
+        return ""
+    timings: dict[str, float] = {}
+    try:
+        rawdoc = load_rawdoc_meta(ctx.rawdocs_dir, rawdoc_id)
+        if not rawdoc:
+            raise FileNotFoundError(f"RawDoc not found: {rawdoc_id}")
+        doc, _, _ = ingest_rawdoc(rawdoc, ctx, timings=timings)
+    except Exception:
+        error = traceback.format_exc()
+        print(f"ingest failed: {rawdoc_id}", file=sys.stderr)
+        print(error, file=sys.stderr, end="")
+        return ledger.fail(conn, rawdoc_id, error, timings, policy)
+    ledger.finish(conn, rawdoc_id, doc["doc_id"], timings)
+    print("rawdoc_id:", rawdoc_id, "doc_id:", doc["doc_id"], "sections:", len(doc["sections"]))
+    return "done"
+
+
+# Per-worker context, ledger connection and retry policy, set once by _init_worker in each pool process
+_WORKER_CTX: IngestContext | None = None
+_WORKER_LEDGER: sqlite3.Connection | None = None
+_WORKER_POLICY = ledger.DEFAULT_RETRY
+
+
+def _init_worker(ctx_args: tuple, policy: ledger.RetryPolicy) -> None:
+    global _WORKER_CTX, _WORKER_LEDGER, _WORKER_POLICY
+    _WORKER_CTX = make_context(*ctx_args)
+    _WORKER_LEDGER = ledger.open_ledger(_WORKER_CTX.rawdocs_dir)
+    _WORKER_POLICY = policy
+
+
+def _worker_process(rawdoc_id: str) -> str:
+    return process_one(rawdoc_id, _WORKER_CTX, _WORKER_LEDGER, _WORKER_POLICY)
+
+
+def process_parallel(
+    rawdoc_ids: list[str],
+    pool: ProcessPoolExecutor,
+    conn: sqlite3.Connection,
+    policy: ledger.RetryPolicy = ledger.DEFAULT_RETRY,
+) -> list[str]:
+    """Fan rawdoc_ids out to pool; workers claim and record their jobs. Returns the ids that failed."""
+    failed: list[str] = []
+    futures = {pool.submit(_worker_process, rid): rid for rid in rawdoc_ids}
+    for fut in as_completed(futures):
+        rawdoc_id = futures[fut]
+        try:
+            state = fut.result()
+        except BrokenProcessPool:
+            raise
+        except Exception:
+            # The task itself broke (e.g. ledger locked); the job is retried on a later pass
+            error = traceback.format_exc()
+            print(f"ingest failed: {rawdoc_id}", file=sys.stderr)
+            print(error, file=sys.stderr, end="")
+            ledger.release(conn, [rawdoc_id], error, policy)
+            state = "failed"
+        if state and state != "done":
+            failed.append(rawdoc_id)
+    return failed
+
 
 def main():
     ap = argparse.ArgumentParser(description="Poll rawdocs and ingest unprocessed")
@@ -20,35 +134,91 @@ def main():
     ap.add_argument("--assets", default=None, help="Assets directory")
     ap.add_argument("--docs", default=None, help="Output docs directory")
     ap.add_argument("--config", default=None, help="Routes config")
+    ap.add_argument("--html-backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="HTML tree backend")
+    ap.add_argument("--once", action="store_true", help="Process the current backlog and exit")
+    ap.add_argument("--workers", type=int, default=1, help="Worker processes (1 = in this process)")
+    ap.add_argument("--watch", action="store_true", help="React to new RawDocs via inotify (polling fallback)")
+    ap.add_argument("--max-attempts", type=int, default=ledger.DEFAULT_RETRY.max_attempts, help="Attempts before a RawDoc is dead-lettered (0 = never)")
+    ap.add_argument("--backoff", type=float, default=ledger.DEFAULT_RETRY.backoff_base, help="First retry delay in seconds (doubles per attempt)")
+    ap.add_argument("--backoff-max", type=float, default=ledger.DEFAULT_RETRY.backoff_max, help="Retry delay cap in seconds")
+    ap.add_argument("--derivatives", default=None, choices=("webp", "jpeg"), help="Also write display/thumbnail derivatives of figure images in this format (needs Pillow)")
+    ap.add_argument("--derive-workers", type=int, default=DEFAULT_DERIVATIVES.workers, help="Processes encoding derivatives (per ingest worker)")
+    ap.add_argument("--compact", action="store_true", help="Write document JSON without indentation (smaller, faster)")
+    ap.add_argument("--corpus", default=None, help="Also append Documents to rolling segment files in this directory (e.g. data/corpus)")
+    ap.add_argument("--corpus-format", default="jsonl", choices=tuple(CORPUS_FORMATS), help="Corpus segment format (jsonl.zst needs zstandard, parquet needs pyarrow)")
+    ap.add_argument("--segment-mb", type=int, default=256, help="Roll corpus segments at this size")
+    ap.add_argument("--no-docs", action="store_true", help="With a jsonl/jsonl.zst --corpus: skip the per-document .json/.md files")
     args = ap.parse_args()
 
-    rawdocs_dir = Path(args.rawdocs or REPO_ROOT / "data" / "rawdocs")
-    assets_dir = Path(args.assets or REPO_ROOT / "data" / "assets")
-    docs_dir = Path(args.docs or REPO_ROOT / "data" / "docs")
-    config = args.config or str(REPO_ROOT / "configs" / "routes.yaml")
+    ctx = make_context(
+        args.rawdocs,
+        args.assets,
+        args.docs,
+        args.config,
+        args.html_backend,
+        derivative_policy_from_args(args),
+        args.compact,
+        corpus_policy_from_args(args),
+    )
+    ctx.rawdocs_dir.mkdir(parents=True, exist_ok=True)
+    ctx_args = (ctx.rawdocs_dir, ctx.assets_dir, ctx.docs_dir, ctx.config_path, ctx.html_backend, ctx.derivatives, ctx.compact_json, ctx.corpus)
+    policy = ledger.RetryPolicy(args.max_attempts, args.backoff, args.backoff_max)
+    conn = ledger.open_ledger(ctx.rawdocs_dir)
+
+    def release_stale() -> None:
+        """Fail running jobs left by dead processes (killed pollers, site-router runs)."""
+        stale = ledger.reset_stale(conn, policy=policy)
+        if stale:
+            print(f"released {stale} stale running jobs", file=sys.stderr)
+
+    pool = None
+
+    def run_batch(rawdoc_ids: list[str]) -> list[str]:
+        """Ingest rawdoc_ids serially or on the pool; returns the ids that failed."""
+        nonlocal pool
+        if not rawdoc_ids:
+            return []
+        if args.workers <= 1:
+            return [rid for rid in rawdoc_ids if process_one(rid, ctx, conn, policy) not in ("", "done")]
+        if pool is None:
+            pool = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(ctx_args, policy))
+        try:
+            return process_parallel(rawdoc_ids, pool, conn, policy)
+        except BrokenProcessPool:
+            # A worker died hard (e.g. segfault in a parser); its claimed jobs go back to failed
+            print("worker pool broke; restarting on next pass", file=sys.stderr)
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = None
+            ledger.release(conn, rawdoc_ids, "worker process died", policy)
+            return [rid for rid in rawdoc_ids if ledger.job_state(conn, rid) != "done"]
 
-    rawdocs_dir.mkdir(parents=True, exist_ok=True)
+    if args.watch and not args.once:
+        ledger.import_rawdocs(conn, ctx.rawdocs_dir)
+        watcher = RawdocWatcher(ctx.rawdocs_dir)
+        print(f"watching {ctx.rawdocs_dir} ({watcher.mode})", file=sys.stderr)
+        while True:
+            release_stale()
+            ledger.enqueue(conn, watcher.take())
+            failed = run_batch(ledger.runnable_ids(conn))
+            if failed:
+                print(f"batch finished: {len(failed)} failed", file=sys.stderr)
+            # Sleep until new RawDocs arrive, the next backoff ends, or --interval (jobs added by others)
+            timeout = args.interval
+            due = ledger.next_due(conn)
+            if due is not None:
+                timeout = min(timeout, max(0.0, due - time.time()))
+            watcher.wait(timeout)
 
     while True:
-        metas = list(rawdocs_dir.glob("*.meta.json"))
-        for meta_path in metas:
-            # stem of "abc123.meta.json" is "abc123.meta" -> rawdoc_id = "abc123"
-            rawdoc_id = meta_path.stem.removesuffix(".meta") if meta_path.stem.endswith(".meta") else meta_path.stem
-            # Skip if already processed (.done marker)
-            done_path = rawdocs_dir / f"{rawdoc_id}.done"
-            if done_path.exists():
-                continue
-            cmd = [
-                sys.executable, "-m", "ingest.run_ingest",
-                "--rawdoc-id", rawdoc_id,
-                "--rawdocs", str(rawdocs_dir),
-                "--assets", str(assets_dir),
-                "--docs", str(docs_dir),
-                "--config", config,
-            ]
-            result = subprocess.run(cmd, cwd=REPO_ROOT)
-            if result.returncode == 0:
-                done_path.write_text("")
+        release_stale()
+        ledger.import_rawdocs(conn, ctx.rawdocs_dir)
+        failed = run_batch(ledger.runnable_ids(conn))
+        if failed:
+            print(f"pass finished: {len(failed)} failed", file=sys.stderr)
+        if args.once:
+            if pool is not None:
+                pool.shutdown()
+            sys.exit(1 if failed else 0)
         time.sleep(args.interval)
 
 
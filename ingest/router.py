@@ -1,6 +1,12 @@
 """
 Resolve which HTML adapter to use for a given source_uri (URL or path).
+
+Routes are compiled once per load (compile_routes): rules are indexed by exact domain, each
+domain (and the "*" wildcard) holding a character trie of path prefixes, and adapter paths are
+resolved and checked when compiling. A lookup walks the request path through at most two
+tries, and the lowest rule index found wins, which preserves first-match-wins order.
 """
+from dataclasses import dataclass, field
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -14,13 +20,86 @@ def load_routes(routes_path: Path) -> list[dict]:
     return (data or {}).get("routes") or []
 
 
-def select_adapter(source_uri: str, routes: list[dict], repo_root: Path) -> Path | None:
+class _PrefixTrie:
+    """Path prefixes -> lowest rule index; best_match() returns the first rule matching a path."""
+
+    __slots__ = ("root",)
+
+    def __init__(self):
+        # node: [rule index or None, {char: node}]
+        self.root: list = [None, {}]
+
+    def insert(self, prefix: str, index: int) -> None:
+        node = self.root
+        for ch in prefix:
+            node = node[1].setdefault(ch, [None, {}])
+        if node[0] is None or index < node[0]:
+            node[0] = index
+
+    def best_match(self, path: str) -> int | None:
+        node = self.root
+        best = node[0]
+        for ch in path:
+            node = node[1].get(ch)
+            if node is None:
+                break
+            if node[0] is not None and (best is None or node[0] < best):
+                best = node[0]
+        return best
+
+
+@dataclass
+class RouteIndex:
+    """Compiled routes: exact-domain tries, a wildcard trie and pre-resolved adapter paths."""
+
+    adapters: list[Path] = field(default_factory=list)  # rule index -> resolved adapter path
+    domains: dict[str, _PrefixTrie] = field(default_factory=dict)
+    wildcard: _PrefixTrie = field(default_factory=_PrefixTrie)
+
+
+def _resolve_adapter_ref(adapter_ref: str, repo_root: Path) -> Path | None:
+    adapter_path = repo_root / adapter_ref
+    if adapter_path.exists():
+        return adapter_path.resolve()
+    if Path(adapter_ref).exists():
+        return Path(adapter_ref).resolve()
+    return None
+
+
+def compile_routes(routes: list[dict], repo_root: Path) -> RouteIndex:
+    """
+    Index routes for select_adapter. Rules without an adapter, or whose adapter file does not
+    exist at compile time, are dropped (they could never match).
+    """
+    index = RouteIndex()
+    resolved: dict[str, Path | None] = {}
+    for rule in routes:
+        adapter_ref = rule.get("adapter")
+        if not adapter_ref:
+            continue
+        if adapter_ref not in resolved:
+            resolved[adapter_ref] = _resolve_adapter_ref(adapter_ref, repo_root)
+        adapter_path = resolved[adapter_ref]
+        if adapter_path is None:
+            continue
+        rule_domain = (rule.get("domain") or "*").lower()
+        prefix = (rule.get("path_prefix") or "").strip()
+        trie = index.wildcard if rule_domain == "*" else index.domains.setdefault(rule_domain, _PrefixTrie())
+        trie.insert(prefix, len(index.adapters))
+        index.adapters.append(adapter_path)
+    return index
+
+
+def select_adapter(source_uri: str, routes: "RouteIndex | list[dict]", repo_root: Path) -> Path | None:
     """
     First match wins. domain and path_prefix are matched against source_uri (URL or path).
-    Returns absolute path to adapter YAML file.
+    Returns absolute path to adapter YAML file. Pass a RouteIndex from compile_routes to avoid
+    recompiling a routes list on every call.
     """
     if not source_uri.strip():
         return None
+    if not isinstance(routes, RouteIndex):
+        routes = compile_routes(routes, repo_root)
     parsed = urlparse(source_uri)
     if parsed.scheme and parsed.netloc:
         domain = parsed.netloc.lower()
@@ -31,19 +110,10 @@ def select_adapter(source_uri: str, routes: list[dict], repo_root: Path) -> Path
         path = source_uri
     path = path or "/"
 
-    for rule in routes:
-        rule_domain = (rule.get("domain") or "*").lower()
-        prefix = (rule.get("path_prefix") or "").strip()
-        if rule_domain != "*" and rule_domain != domain:
-            continue
-        if prefix and not path.startswith(prefix):
-            continue
-        adapter_ref = rule.get("adapter")
-        if not adapter_ref:
-            continue
-        adapter_path = repo_root / adapter_ref
-        if adapter_path.exists():
-            return adapter_path.resolve()
-        if Path(adapter_ref).exists():
-            return Path(adapter_ref).resolve()
-    return None
+    best = routes.wildcard.best_match(path)
+    trie = routes.domains.get(domain)
+    if trie is not None:
+        hit = trie.best_match(path)
+        if hit is not None and (best is None or hit < best):
+            best = hit
+    return routes.adapters[best] if best is not None else None
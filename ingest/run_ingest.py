@@ -7,21 +7,41 @@ Usage:
   python -m ingest.run_ingest --file path/to/local.html --url https://...
   python -m ingest.run_ingest --rawdoc-id <id>   # ingest only, from existing RawDoc
 Requires: Go binary bin/acquire (make build).
+
+ingest_rawdoc(rawdoc, ctx) is the reusable pipeline (route -> parse -> normalize -> assets ->
+sink); the poller calls it in-process with one IngestContext for its whole backlog. Every run
+is recorded in the job ledger (ingest/ledger.py): state, attempts, stage durations and doc_id.
 """
 import argparse
 import json
 import subprocess
 import sys
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
+
+import requests
 
 # Repo root (parent of ingest/)
 REPO_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(REPO_ROOT))
 
+from ingest import ledger
 from ingest.assets import process_assets
+from ingest.corpus import FORMATS as CORPUS_FORMATS, CorpusPolicy, get_writer as get_corpus_writer
+from ingest.corpus import available as corpus_available
+from ingest.derivatives import DEFAULT_POLICY as DEFAULT_DERIVATIVES, DerivativePolicy, derive_assets
+from ingest.derivatives import available as derivatives_available
+from ingest.http_client import get_session
+from ingest.jsonio import write_json
 from ingest.normalize import normalize
-from ingest.html.parser import parse_html
-from ingest.router import load_routes, select_adapter
+from ingest.html.parser import BACKENDS, DEFAULT_BACKEND, parse_html
+from ingest.layout import doc_paths, markdown_asset_link, shard_depth
+from ingest.router import RouteIndex, compile_routes, load_routes, select_adapter
 
 
 def run_acquire(args, rawdocs_dir: Path) -> dict:
@@ -61,79 +81,65 @@ def load_rawdoc_meta(rawdocs_dir: Path, rawdoc_id: str) -> dict | None:
         return json.load(f)
 
 
-def main():
-    ap = argparse.ArgumentParser(description="Ingest URL or local HTML into normalized docs")
-    ap.add_argument("--url", default="", help="Source URL (for routing and asset base URL)")
-    ap.add_argument("--file", default="", help="Local HTML file (if set, use instead of fetching URL)")
-    ap.add_argument("--rawdoc-id", default="", help="Ingest only: process this existing RawDoc")
-    ap.add_argument("--rawdocs", default=None, help="RawDocs directory (default: data/rawdocs)")
-    ap.add_argument("--assets", default=None, help="Assets directory (default: data/assets)")
-    ap.add_argument("--docs", default=None, help="Output docs directory (default: data/docs)")
-    ap.add_argument("--config", default=None, help="Routes config (default: configs/routes.yaml)")
-    args = ap.parse_args()
+@dataclass
+class IngestContext:
+    """State shared across documents: output dirs, routes, HTTP session, parser options."""
 
-    rawdocs_dir = Path(args.rawdocs or REPO_ROOT / "data" / "rawdocs")
-    assets_dir = Path(args.assets or REPO_ROOT / "data" / "assets")
-    docs_dir = Path(args.docs or REPO_ROOT / "data" / "docs")
-    config_path = Path(args.config or REPO_ROOT / "configs" / "routes.yaml")
+    rawdocs_dir: Path
+    assets_dir: Path
+    docs_dir: Path
+    config_path: Path
+    html_backend: str = DEFAULT_BACKEND
+    session: requests.Session = field(default_factory=get_session)
+    routes: RouteIndex = field(default_factory=RouteIndex)
+    routes_mtime: int = -1
+    # Optional asset policy stage (bounded-size derivatives); None = keep originals only
+    derivatives: DerivativePolicy | None = None
+    # Sink: write document JSON without indentation
+    compact_json: bool = False
+    # Also append Documents to rolling corpus segments (corpus.py); None = per-document files only
+    corpus: CorpusPolicy | None = None
 
-    if args.rawdoc_id:
-        # Skip if already processed (poller / ingest-all)
-        if (rawdocs_dir / f"{args.rawdoc_id}.done").exists():
-            print("Already processed:", args.rawdoc_id)
-            sys.exit(0)
-        # Ingest only: load existing RawDoc meta
-        rawdoc = load_rawdoc_meta(rawdocs_dir, args.rawdoc_id)
-        if not rawdoc:
-            print(f"RawDoc not found: {args.rawdoc_id}", file=sys.stderr)
-            sys.exit(1)
-    elif args.file or args.url:
-        # Full pipeline: acquire then ingest
-        rawdoc = run_acquire(args, rawdocs_dir)
-    else:
-        print("Provide --url, --file, or --rawdoc-id", file=sys.stderr)
-        sys.exit(1)
 
-    rawdoc_id = rawdoc["rawdoc_id"]
-    storage_path = rawdoc["storage_path"]
-    source_uri = rawdoc["source_uri"]
-    source_type = rawdoc["source_type"]
-
-    # Router: select adapter for HTML
-    if source_type not in ("url", "singlefile_html"):
-        print(f"Unsupported source_type: {source_type}", file=sys.stderr)
-        sys.exit(1)
-    routes = load_routes(config_path)
-    adapter_path = select_adapter(source_uri, routes, REPO_ROOT)
-    if not adapter_path:
-        adapter_path = REPO_ROOT / "ingest" / "html" / "adapters" / "generic.yaml"
-        if not adapter_path.exists():
-            print("No adapter selected and generic not found", file=sys.stderr)
-            sys.exit(1)
-
-    # Parse
-    parser_output = parse_html(storage_path, adapter_path, source_uri=source_uri)
-
-    # Normalize
-    doc = normalize(
-        parser_output,
-        rawdoc_id=rawdoc_id,
-        storage_path=storage_path,
-        source_uri=source_uri,
-        source_type="html",
+def make_context(
+    rawdocs_dir: Path | None = None,
+    assets_dir: Path | None = None,
+    docs_dir: Path | None = None,
+    config_path: Path | None = None,
+    html_backend: str = DEFAULT_BACKEND,
+    derivative_policy: DerivativePolicy | None = None,
+    compact_json: bool = False,
+    corpus_policy: CorpusPolicy | None = None,
+) -> IngestContext:
+    """Build an IngestContext with repo defaults (data/*, configs/routes.yaml)."""
+    ctx = IngestContext(
+        rawdocs_dir=Path(rawdocs_dir or REPO_ROOT / "data" / "rawdocs"),
+        assets_dir=Path(assets_dir or REPO_ROOT / "data" / "assets"),
+        docs_dir=Path(docs_dir or REPO_ROOT / "data" / "docs"),
+        config_path=Path(config_path or REPO_ROOT / "configs" / "routes.yaml"),
+        html_backend=html_backend,
+        derivatives=derivative_policy,
+        compact_json=compact_json,
+        corpus=corpus_policy,
     )
+    current_routes(ctx)
+    return ctx
 
-    # Assets
-    docs_dir.mkdir(parents=True, exist_ok=True)
-    doc = process_assets(doc, assets_dir, base_url=args.url or source_uri if source_uri.startswith("http") else None)
 
-    # Sink
-    doc_id = doc["doc_id"]
-    json_path = docs_dir / f"{doc_id}.json"
-    json_path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+def current_routes(ctx: IngestContext) -> RouteIndex:
+    """Compiled routes from ctx.config_path, reloaded only when the file changes."""
+    mtime = ctx.config_path.stat().st_mtime_ns
+    if mtime != ctx.routes_mtime:
+        ctx.routes = compile_routes(load_routes(ctx.config_path), REPO_ROOT)
+        ctx.routes_mtime = mtime
+    return ctx.routes
 
-    # Optional: write Markdown (images use ../assets/ so they resolve when viewing docs/*.md)
-    md_path = docs_dir / f"{doc_id}.md"
+
+def document_to_markdown(doc: dict[str, Any], docs_depth: int = 0, assets_depth: int = 0) -> str:
+    """
+    Markdown view of a Document (images use ../assets/ so they resolve from docs/*.md; with
+    sharded layouts, one more ../ per docs shard level and the asset's shard directories).
+    """
     lines = [f"# {doc['meta']['title']}\n", f"Source: {doc['meta']['source'].get('url') or doc['meta']['source']['path']}\n"]
 
     def append_list_items(items, indent: str = ""):
@@ -159,22 +165,220 @@ def main():
             for a in s["assets"]:
                 path = a.get("path")
                 if path:
-                    rel = path if path.startswith("assets/") else f"assets/{path}"
-                    if not rel.startswith("../"):
-                        rel = "../" + rel
+                    rel = markdown_asset_link(path, docs_depth, assets_depth)
                     cap = (a.get("caption") or "").replace("]", "\\]")
                     lines.append(f"![{cap}]({rel})\n")
-    md_path.write_text("\n".join(lines), encoding="utf-8")
+    return "\n".join(lines)
+
+
+def write_document(doc: dict[str, Any], docs_dir: Path, compact: bool = False) -> tuple[Path, Path]:
+    """
+    Sink: write <doc_id>.json (orjson when installed, see jsonio.py; no indentation if compact)
+    and <doc_id>.md under docs_dir (or their shard, see layout.py).
+    """
+    doc_id = doc["doc_id"]
+    json_path, md_path = doc_paths(docs_dir, doc_id)
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    write_json(doc, json_path, compact)
+    # Links point at the sibling assets/ dir, in whichever layout each tree uses
+    md = document_to_markdown(doc, shard_depth(docs_dir), shard_depth(docs_dir.parent / "assets"))
+    md_path.write_text(md, encoding="utf-8")
+    return json_path, md_path
+
+
+@contextmanager
+def _stage(timings: dict[str, float] | None, name: str):
+    """Record the wall time of one pipeline stage in timings[name] (seconds), even on error."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = round(time.perf_counter() - t0, 4)
+
+
+def ingest_rawdoc(
+    rawdoc: dict[str, Any],
+    ctx: IngestContext,
+    base_url: str | None = None,
+    timings: dict[str, float] | None = None,
+) -> tuple[dict[str, Any], Path | None, Path | None]:
+    """
+    Run route -> parse -> normalize -> assets [-> derivatives] -> sink for one RawDoc.
+    Returns (doc, json_path, md_path); the paths are None when ctx.corpus does not keep
+    per-document files. Raises ValueError for RawDocs that cannot be routed;
+    parser/asset errors propagate so callers decide how to isolate them. Stage durations are
+    added to timings when given.
+    """
+    rawdoc_id = rawdoc["rawdoc_id"]
+    storage_path = rawdoc["storage_path"]
+    source_uri = rawdoc["source_uri"]
+    source_type = rawdoc["source_type"]
+
+    # Router: select adapter for HTML
+    if source_type not in ("url", "singlefile_html"):
+        raise ValueError(f"Unsupported source_type: {source_type}")
+    with _stage(timings, "route"):
+        adapter_path = select_adapter(source_uri, current_routes(ctx), REPO_ROOT)
+    if not adapter_path:
+        adapter_path = REPO_ROOT / "ingest" / "html" / "adapters" / "generic.yaml"
+        if not adapter_path.exists():
+            raise ValueError("No adapter selected and generic not found")
+
+    # Inline data: URIs are spilled to a per-document store; parse/normalize carry handles only
+    with tempfile.TemporaryDirectory(prefix="kc-inline-") as inline_dir:
+        inline_store = Path(inline_dir)
+
+        # Parse
+        with _stage(timings, "parse"):
+            parser_output = parse_html(
+                storage_path,
+                adapter_path,
+                source_uri=source_uri,
+                backend=ctx.html_backend,
+                inline_store=inline_store,
+            )
+
+        # Normalize
+        with _stage(timings, "normalize"):
+            doc = normalize(
+                parser_output,
+                rawdoc_id=rawdoc_id,
+                storage_path=storage_path,
+                source_uri=source_uri,
+                source_type="html",
+            )
+
+        # Assets
+        ctx.docs_dir.mkdir(parents=True, exist_ok=True)
+        with _stage(timings, "assets"):
+            doc = process_assets(
+                doc,
+                ctx.assets_dir,
+                base_url=base_url or source_uri if source_uri.startswith("http") else None,
+                inline_store=inline_store,
+                session=ctx.session,
+            )
+
+    if ctx.derivatives is not None:
+        with _stage(timings, "derivatives"):
+            doc = derive_assets(doc, ctx.assets_dir, ctx.derivatives)
+
+    # Sink
+    with _stage(timings, "sink"):
+        json_path = md_path = None
+        if ctx.corpus is None or ctx.corpus.keep_docs:
+            json_path, md_path = write_document(doc, ctx.docs_dir, ctx.compact_json)
+        if ctx.corpus is not None:
+            get_corpus_writer(ctx.corpus).append(doc)
+    return doc, json_path, md_path
+
+
+def derivative_policy_from_args(args: argparse.Namespace) -> DerivativePolicy | None:
+    """DerivativePolicy for --derivatives/--derive-workers, or None; exits if Pillow is missing."""
+    if not args.derivatives:
+        return None
+    if not derivatives_available():
+        print("--derivatives needs Pillow: pip install Pillow", file=sys.stderr)
+        sys.exit(1)
+    return DerivativePolicy(format=args.derivatives, workers=args.derive_workers)
+
+
+def corpus_policy_from_args(args: argparse.Namespace) -> CorpusPolicy | None:
+    """CorpusPolicy for --corpus/--corpus-format/--segment-mb/--no-docs, or None; exits if unusable."""
+    if not args.corpus:
+        if args.no_docs:
+            print("--no-docs needs --corpus", file=sys.stderr)
+            sys.exit(1)
+        return None
+    if not corpus_available(args.corpus_format):
+        need = "zstandard" if args.corpus_format == "jsonl.zst" else "pyarrow"
+        print(f"--corpus-format {args.corpus_format} needs {need}: pip install {need}", file=sys.stderr)
+        sys.exit(1)
+    if args.no_docs and args.corpus_format == "parquet":
+        # Buffered Parquet rows are lost with the process, and the ledger already marked them done
+        print("--no-docs needs a line-flushed --corpus-format (jsonl or jsonl.zst), not parquet", file=sys.stderr)
+        sys.exit(1)
+    return CorpusPolicy(Path(args.corpus), args.corpus_format, args.segment_mb * 1024 * 1024, keep_docs=not args.no_docs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest URL or local HTML into normalized docs")
+    ap.add_argument("--url", default="", help="Source URL (for routing and asset base URL)")
+    ap.add_argument("--file", default="", help="Local HTML file (if set, use instead of fetching URL)")
+    ap.add_argument("--rawdoc-id", default="", help="Ingest only: process this existing RawDoc")
+    ap.add_argument("--rawdocs", default=None, help="RawDocs directory (default: data/rawdocs)")
+    ap.add_argument("--assets", default=None, help="Assets directory (default: data/assets)")
+    ap.add_argument("--docs", default=None, help="Output docs directory (default: data/docs)")
+    ap.add_argument("--config", default=None, help="Routes config (default: configs/routes.yaml)")
+    ap.add_argument("--html-backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="HTML tree backend")
+    ap.add_argument("--derivatives", default=None, choices=("webp", "jpeg"), help="Also write display/thumbnail derivatives of figure images in this format (needs Pillow)")
+    ap.add_argument("--derive-workers", type=int, default=DEFAULT_DERIVATIVES.workers, help="Processes encoding derivatives")
+    ap.add_argument("--compact", action="store_true", help="Write document JSON without indentation (smaller, faster)")
+    ap.add_argument("--corpus", default=None, help="Also append Documents to rolling segment files in this directory (e.g. data/corpus)")
+    ap.add_argument("--corpus-format", default="jsonl", choices=tuple(CORPUS_FORMATS), help="Corpus segment format (jsonl.zst needs zstandard, parquet needs pyarrow)")
+    ap.add_argument("--segment-mb", type=int, default=256, help="Roll corpus segments at this size")
+    ap.add_argument("--no-docs", action="store_true", help="With a jsonl/jsonl.zst --corpus: skip the per-document .json/.md files")
+    args = ap.parse_args()
+
+    ctx = make_context(
+        args.rawdocs,
+        args.assets,
+        args.docs,
+        args.config,
+        args.html_backend,
+        derivative_policy_from_args(args),
+        args.compact,
+        corpus_policy_from_args(args),
+    )
+    rawdocs_dir = ctx.rawdocs_dir
+    conn = ledger.open_ledger(rawdocs_dir)
 
-    # Mark RawDoc as processed (for poller / ingest-all)
     if args.rawdoc_id:
-        (rawdocs_dir / f"{rawdoc_id}.done").write_text("")
+        # Skip if already processed (poller / ingest-all)
+        if ledger.job_state(conn, args.rawdoc_id) == "done":
+            print("Already processed:", args.rawdoc_id)
+            sys.exit(0)
+        # Ingest only: load existing RawDoc meta
+        rawdoc = load_rawdoc_meta(rawdocs_dir, args.rawdoc_id)
+        if not rawdoc:
+            print(f"RawDoc not found: {args.rawdoc_id}", file=sys.stderr)
+            sys.exit(1)
+    elif args.file or args.url:
+        # Full pipeline: acquire then ingest
+        rawdoc = run_acquire(args, rawdocs_dir)
+    else:
+        print("Provide --url, --file, or --rawdoc-id", file=sys.stderr)
+        sys.exit(1)
+
+    rawdoc_id = rawdoc["rawdoc_id"]
+    ledger.enqueue(conn, [rawdoc_id])
+    if not ledger.claim(conn, rawdoc_id):
+        state = ledger.job_state(conn, rawdoc_id)
+        hint = " (python -m ingest.ledger requeue <id> to retry)" if state == "dead" else ""
+        print(f"RawDoc is {state} in the job ledger: {rawdoc_id}{hint}", file=sys.stderr)
+        sys.exit(1)
+    timings: dict[str, float] = {}
+    try:
+        doc, json_path, md_path = ingest_rawdoc(rawdoc, ctx, base_url=args.url or None, timings=timings)
+    except Exception as e:
+        ledger.fail(conn, rawdoc_id, traceback.format_exc(), timings)
+        if not isinstance(e, ValueError):
+            raise
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    # Mark RawDoc as processed (for poller / ingest-all)
+    ledger.finish(conn, rawdoc_id, doc["doc_id"], timings)
 
     print("rawdoc_id:", rawdoc_id)
-    print("doc_id:", doc_id)
+    print("doc_id:", doc["doc_id"])
     print("title:", doc["meta"]["title"])
     print("sections:", len(doc["sections"]))
-    print("wrote:", json_path, md_path)
+    if json_path is not None:
+        print("wrote:", json_path, md_path)
+    if ctx.corpus is not None:
+        print("corpus:", ctx.corpus.root)
 
 
 if __name__ == "__main__":
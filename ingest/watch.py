@@ -0,0 +1,146 @@
+"""
+Event-driven discovery of new RawDocs for the poller.
+
+RawdocWatcher reports RawDoc ids it has not seen before. It does one directory scan at startup
+and then learns about new <rawdoc_id>.meta.json files from inotify (IN_CLOSE_WRITE /
+IN_MOVED_TO), so new documents are picked up within milliseconds and idle ticks do no work
+proportional to the archive size. Where inotify is unavailable (non-Linux, some network
+filesystems) it falls back to polling: the directory is re-listed only when its mtime changes.
+Whether an id still needs processing is decided by the job ledger (ingest/ledger.py).
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+META_SUFFIX = ".meta.json"
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+# Fallback mode: seconds between directory mtime checks
+_POLL_STEP = 1.0
+
+
+def _rawdoc_id(name: str) -> str | None:
+    if not name.endswith(META_SUFFIX):
+        return None
+    return name[: -len(META_SUFFIX)] or None
+
+
+def _inotify_fd(path: Path) -> int | None:
+    """inotify fd watching path for completed files, or None if inotify is unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    wd = libc.inotify_add_watch(fd, os.fsencode(str(path)), _IN_CLOSE_WRITE | _IN_MOVED_TO)
+    if wd < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class RawdocWatcher:
+    """New RawDoc ids for one rawdocs directory, fed by inotify or mtime polling."""
+
+    def __init__(self, rawdocs_dir: Path, use_inotify: bool = True):
+        self.rawdocs_dir = rawdocs_dir
+        self.pending: dict[str, None] = {}  # insertion-ordered set
+        self.known: set[str] = set()
+        self.dir_mtime = -1
+        self.fd = _inotify_fd(rawdocs_dir) if use_inotify else None
+        self._rescan()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.fd is not None else "poll"
+
+    def _add(self, rawdoc_id: str) -> None:
+        if rawdoc_id in self.known:
+            return
+        self.known.add(rawdoc_id)
+        self.pending[rawdoc_id] = None
+
+    def _rescan(self) -> None:
+        """List the directory (startup, inotify overflow, or poll mode after an mtime change)."""
+        try:
+            self.dir_mtime = self.rawdocs_dir.stat().st_mtime_ns
+            with os.scandir(self.rawdocs_dir) as it:
+                names = [e.name for e in it]
+        except FileNotFoundError:
+            return
+        for name in sorted(names):
+            rawdoc_id = _rawdoc_id(name)
+            if rawdoc_id:
+                self._add(rawdoc_id)
+
+    def _read_events(self) -> None:
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            if not buf:
+                return
+            off = 0
+            while off + _EVENT_HEADER.size <= len(buf):
+                _, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, off)
+                off += _EVENT_HEADER.size
+                name = buf[off:off + name_len].split(b"\0", 1)[0].decode("utf-8", "replace")
+                off += name_len
+                if mask & _IN_Q_OVERFLOW:
+                    self._rescan()
+                    continue
+                rawdoc_id = _rawdoc_id(name)
+                if rawdoc_id:
+                    self._add(rawdoc_id)
+
+    def wait(self, timeout: float) -> None:
+        """Block up to timeout seconds for new RawDocs; returns early when one arrives."""
+        if self.pending:
+            return
+        if self.fd is not None:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if ready:
+                self._read_events()
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                mtime = self.rawdocs_dir.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime = -1
+            if mtime != self.dir_mtime:
+                self._rescan()
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(_POLL_STEP, remaining))
+
+    def take(self) -> list[str]:
+        """Return and clear pending ids, oldest first."""
+        ids = list(self.pending)
+        self.pending.clear()
+        return ids
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
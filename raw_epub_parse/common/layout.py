@@ -0,0 +1,76 @@
+"""
+Flat or sharded layout of data/assets and data/docs (subset of ingest/layout.py, which also has the
+reshard command). A directory is sharded when it holds a .layout.json marker.
+"""
+import json
+from pathlib import Path
+
+LAYOUT_NAME = ".layout.json"
+SHARD_WIDTH = 2
+MAX_DEPTH = 3
+
+# resolved dir -> (marker mtime_ns, depth); the marker is re-checked with one stat per call
+_DEPTHS: dict[Path, tuple[int, int]] = {}
+
+
+def shard_depth(root: Path) -> int:
+    """Shard depth recorded for root (0 = flat, also when there is no marker)."""
+    marker = Path(root) / LAYOUT_NAME
+    try:
+        mtime = marker.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    key = marker.resolve()
+    cached = _DEPTHS.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        depth = int(json.loads(marker.read_text(encoding="utf-8")).get("depth") or 0)
+    except (OSError, ValueError, AttributeError):
+        depth = 0
+    depth = max(0, min(depth, MAX_DEPTH))
+    _DEPTHS[key] = (mtime, depth)
+    return depth
+
+
+def shard_parts(name: str, depth: int) -> list[str]:
+    """Subdirectory names for name at depth (taken from the start of the file stem)."""
+    stem = name.split(".", 1)[0].lower().ljust(depth * SHARD_WIDTH, "_")
+    return [stem[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(depth)]
+
+
+def entry_path(root: Path, name: str, depth: int | None = None) -> Path:
+    """Where name is written under root in its current layout (or at depth)."""
+    if depth is None:
+        depth = shard_depth(root)
+    return Path(root).joinpath(*shard_parts(name, depth), name)
+
+
+def find_entry(root: Path, name: str) -> Path | None:
+    """Existing file for name under root: the current layout first, then the other depths."""
+    depth = shard_depth(root)
+    for d in (depth, *(d for d in range(MAX_DEPTH + 1) if d != depth)):
+        p = entry_path(root, name, d)
+        if p.exists():
+            return p
+    return None
+
+
+def resolve_asset(assets_dir: Path, path: str) -> Path | None:
+    """File for a Document asset path ("assets/<asset_id>" or a bare asset_id), in any layout."""
+    name = (path or "").rsplit("/", 1)[-1]
+    return find_entry(assets_dir, name) if name else None
+
+
+def doc_paths(docs_dir: Path, doc_id: str) -> tuple[Path, Path]:
+    """(json_path, md_path) for doc_id in docs_dir's current layout."""
+    return entry_path(docs_dir, f"{doc_id}.json"), entry_path(docs_dir, f"{doc_id}.md")
+
+
+def markdown_asset_link(path: str, docs_depth: int = 0, assets_depth: int = 0) -> str:
+    """Link from a .md in docs/ (at docs_depth) to an asset path in the sibling assets/ dir."""
+    rel = path[len("assets/"):] if path.startswith("assets/") else path
+    if "/" not in rel:
+        # A bare asset_id: point at its shard
+        rel = "/".join([*shard_parts(rel, assets_depth), rel])
+    return "../" * (1 + docs_depth) + "assets/" + rel
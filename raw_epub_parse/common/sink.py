@@ -1,10 +1,12 @@
 """
 Write Document JSON and Markdown.
 """
-import json
 from pathlib import Path
 from typing import Any
 
+from common.jsonio import write_json
+from common.layout import doc_paths, markdown_asset_link, shard_depth
+
 
 def _list_item_math_to_md(item: dict[str, Any]) -> str:
     tex = (item.get("math") or "").strip()
@@ -78,7 +80,7 @@ def _paragraph_items_to_markdown(items: list[Any]) -> str:
     return "".join(out).strip()
 
 
-def document_to_markdown(doc: dict[str, Any]) -> str:
+def document_to_markdown(doc: dict[str, Any], docs_depth: int = 0, assets_depth: int = 0) -> str:
     lines = [
         f"# {doc['meta']['title']}\n",
         f"Source: {doc['meta']['source'].get('url') or doc['meta']['source']['path']}\n",
@@ -124,9 +126,7 @@ def document_to_markdown(doc: dict[str, Any]) -> str:
             for a in s["assets"]:
                 path = a.get("path")
                 if path:
-                    rel = path if path.startswith("assets/") else f"assets/{path}"
-                    if not rel.startswith("../"):
-                        rel = "../" + rel
+                    rel = markdown_asset_link(path, docs_depth, assets_depth)
                     cap = (a.get("caption") or "").replace("]", "\\]")
                     lines.append(f"![{cap}]({rel})\n")
     return "\n".join(lines)
@@ -139,10 +139,12 @@ def write_document_outputs(
     rawdoc_id: str,
     write_done: bool = False,
 ) -> tuple[Path, Path]:
-    docs_dir.mkdir(parents=True, exist_ok=True)
     doc_id = doc["doc_id"]
-    json_path = docs_dir / f"{doc_id}.json"
-    json_path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
-    md_path = docs_dir / f"{doc_id}.md"
-    md_path.write_text(document_to_markdown(doc), encoding="utf-8")
+    json_path, md_path = doc_paths(docs_dir, doc_id)
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    # Indentation per jsonio.configure (the routers' --compact)
+    write_json(doc, json_path)
+    # Links point at the sibling assets/ dir, in whichever layout each tree uses
+    md = document_to_markdown(doc, shard_depth(docs_dir), shard_depth(docs_dir.parent / "assets"))
+    md_path.write_text(md, encoding="utf-8")
     return json_path, md_path
@@ -26,6 +26,7 @@ from bs4 import BeautifulSoup, NavigableString, Tag, XMLParsedAsHTMLWarning
 
 warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
+from common.layout import entry_path
 from common.normalize import normalize
 from common.paths import REPO_ROOT
 from common.sink import write_document_outputs
@@ -659,7 +660,9 @@ def _process_assets(
                 continue
             h = hashlib.sha256(data[:65536]).hexdigest()[:16]
             asset_id = f"{h}{ext}"
-            (assets_dir / asset_id).write_bytes(data)
+            asset_path = entry_path(assets_dir, asset_id)
+            asset_path.parent.mkdir(parents=True, exist_ok=True)
+            asset_path.write_bytes(data)
             new_assets.append({
                 "asset_id": asset_id,
                 "path": f"assets/{asset_id}",
@@ -672,7 +675,9 @@ def _process_assets(
         ext = os.path.splitext(str(calibre_dir.cover_path))[1].lower() or ".jpg"
         h = hashlib.sha256(cover_data[:65536]).hexdigest()[:16]
         asset_id = f"{h}{ext}"
-        (assets_dir / asset_id).write_bytes(cover_data)
+        asset_path = entry_path(assets_dir, asset_id)
+        asset_path.parent.mkdir(parents=True, exist_ok=True)
+        asset_path.write_bytes(cover_data)
 
         cover_section = {
             "section_id": "cover",
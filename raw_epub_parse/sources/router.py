@@ -31,6 +31,7 @@ if str(_EPUB_PARSE_ROOT) not in sys.path:
 
 import epub_file
 
+from common import jsonio
 from common.paths import REPO_ROOT
 
 RunOne = Callable[..., None]
@@ -94,7 +95,9 @@ def main() -> None:
     ap.add_argument("--docs", default=None, help="Docs dir")
     ap.add_argument("--timeout", type=int, default=60, help="Reserved")
     ap.add_argument("--no-validate", action="store_true", help="Skip schema validation")
+    ap.add_argument("--compact", action="store_true", help="Write document JSON without indentation (smaller, faster)")
     args = ap.parse_args()
+    jsonio.configure(compact=args.compact)
 
     rawdocs_dir = Path(args.rawdocs or REPO_ROOT / "data" / "rawdocs")
     assets_dir = Path(args.assets or REPO_ROOT / "data" / "assets")
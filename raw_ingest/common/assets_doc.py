@@ -1,15 +1,37 @@
 """
 Resolve figure refs: download or decode images, save to assets/, rewrite Document.
 Vendored from ingest/assets.py (no imports from repo ingest package).
+Remote images are fetched concurrently (max_concurrency threads, per_host per host) and applied
+in document order. Downloads stream to a temp file while the full SHA-256 is computed, abort
+past max_bytes, and are renamed into place through asset_store.AssetStore (existing assets are
+not rewritten; document references are recorded). Downloaded URLs are cached in the store and
+reused while fresh, then revalidated with a conditional GET; failing URLs are skipped until
+their negative cache TTL (by failure kind) runs out. In cache-only mode (fetch.cache_only(), the
+routers' --cache-only) no asset is downloaded: cached URLs reuse their stored asset, fresh or
+not, and other remote images are skipped.
 """
-import base64
 import hashlib
-import re
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
-from urllib.parse import urljoin
+from urllib.parse import urldefrag, urljoin, urlparse
 
 import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from asset_store import AssetStore, get_store
+from data_uri import decode_data_uri
+from fetch import cache_only
+from http_client import get_session
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_PER_HOST = 4
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+_TIMEOUT = 15
 
 
 def ensure_dir(p: Path) -> None:
@@ -28,91 +50,282 @@ def _ext_from_content_type(ct: str) -> str:
     return ".png"
 
 
+def _asset_id(digest: str, ext: str) -> str:
+    return f"{digest[:16]}{ext}"
+
+
 def _asset_id_from_bytes(data: bytes, ext: str) -> str:
-    h = hashlib.sha256(data[:65536]).hexdigest()[:16]
-    return f"{h}{ext}"
+    return _asset_id(hashlib.sha256(data).hexdigest(), ext)
+
+
+class _Rejected(ValueError):
+    """A response we refuse to store (too large or empty)."""
+
+
+def _failure_kind(exc: Exception) -> str | None:
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status in (404, 410):
+            return "not_found"
+        return "client_error" if status < 500 else "server_error"
+    if isinstance(exc, _Rejected):
+        return "too_large"
+    if isinstance(exc, requests.ConnectionError):
+        if exc.args and isinstance(exc.args[0], ReadTimeoutError):
+            return "timeout"
+        return "network"
+    if isinstance(exc, requests.RequestException):
+        return "network"
+    return None
+
+
+def _fresh_for(headers, default: float) -> float:
+    cc = headers.get("Cache-Control", "").lower()
+    if "no-store" in cc or "no-cache" in cc:
+        return 0.0
+    for part in cc.split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "max-age" and value.strip().isdigit():
+            return float(value.strip())
+    return default
 
 
-def resolve_src(src: str, base_url: str | None) -> tuple[bytes | None, str]:
+def download_to_temp(url: str, store: AssetStore, max_bytes: int = DEFAULT_MAX_BYTES) -> tuple[Path | None, str] | None:
+    """
+    Stream url into a temp file in the store, hashing as it goes; (temp_path, asset_id),
+    (None, asset_id) when the URL cache answers (fresh or 304, or stale when revalidation
+    fails or in cache-only mode), or None (failures are negative-cached; only URLs without a
+    cached asset are skipped, and in cache-only mode they are never requested).
+    """
+    cached = store.lookup_url(url)
+    offline = cache_only()
+    headers = {}
+    if cached is not None:
+        if offline or cached["fresh_until"] > time.time():
+            return None, cached["asset_id"]
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    elif offline or store.lookup_failure(url) is not None:
+        return None
+    started = time.monotonic()
+    fd, tmp = store.temp_file()
+    try:
+        with os.fdopen(fd, "wb") as out, get_session().get(url, headers=headers, timeout=_TIMEOUT, stream=True) as r:
+            if r.status_code == 304 and cached is not None:
+                tmp.unlink()
+                store.record_url(
+                    url,
+                    cached["asset_id"],
+                    r.headers.get("ETag", cached["etag"]),
+                    r.headers.get("Last-Modified", cached["last_modified"]),
+                    _fresh_for(r.headers, cached["fresh_until"] - cached["fetched_at"]),
+                )
+                return None, cached["asset_id"]
+            r.raise_for_status()
+            declared = r.headers.get("Content-Length", "")
+            if declared.isdigit() and int(declared) > max_bytes:
+                raise _Rejected(f"asset too large: {declared} bytes")
+            h = hashlib.sha256()
+            size = 0
+            for chunk in r.iter_content(_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _Rejected(f"asset too large: over {max_bytes} bytes")
+                h.update(chunk)
+                out.write(chunk)
+            if not size:
+                raise _Rejected("empty asset")
+            ext = _ext_from_content_type(r.headers.get("Content-Type", ""))
+            asset_id = _asset_id(h.hexdigest(), ext)
+            fresh_for = _fresh_for(r.headers, store.url_ttl)
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        store.record_url(url, asset_id, etag, last_modified, fresh_for)
+        return tmp, asset_id
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        kind = _failure_kind(e)
+        if kind is not None:
+            store.record_failure(url, urlparse(url).netloc.lower(), kind, str(e), time.monotonic() - started)
+        # Stale-if-error: the asset the URL last returned is still stored
+        return (None, cached["asset_id"]) if cached is not None else None
+
+
+def stage_src(
+    src: str,
+    base_url: str | None,
+    store: AssetStore,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> tuple[Path | None, str] | None:
+    """Resolve image src for the store; (temp_path or None if already stored, asset_id) or None."""
     src = (src or "").strip()
-    if not src:
-        return None, ""
+    url = None
+    if src.startswith("http://") or src.startswith("https://"):
+        url = src
+    elif src and base_url and not src.startswith("data:"):
+        url = urljoin(base_url, src)
+    if url is not None:
+        return download_to_temp(url, store, max_bytes)
+    data, ext = resolve_src(src)
+    if not data or len(data) > max_bytes:
+        return None
+    asset_id = _asset_id_from_bytes(data, ext)
+    store.put_bytes(data, asset_id)
+    return None, asset_id
 
+
+def resolve_src(src: str) -> tuple[bytes | None, str]:
+    """Decode a data: URL; remote sources are streamed by download_to_temp, never fetched here."""
+    src = (src or "").strip()
     if src.startswith("data:"):
-        m = re.match(r"data:image/(\w+);base64,(.+)", src)
-        if m:
-            try:
-                data = base64.b64decode(m.group(2))
-                ext = "." + (m.group(1).lower() or "png")
-                if ext == ".jpeg":
-                    ext = ".jpg"
-                return data, ext
-            except Exception:
-                return None, ""
-        return None, ""
+        return decode_data_uri(src)
+    return None, ""
 
+
+def _fetch_host(src: str, base_url: str | None) -> str | None:
+    src = (src or "").strip()
+    if not src or src.startswith("data:"):
+        return None
     if src.startswith("http://") or src.startswith("https://"):
-        try:
-            r = requests.get(src, timeout=15)
-            r.raise_for_status()
-            ct = r.headers.get("Content-Type", "")
-            ext = _ext_from_content_type(ct) or ".png"
-            return r.content, ext
-        except Exception:
-            return None, ""
+        return urlparse(src).netloc.lower()
     if base_url:
-        url = urljoin(base_url, src)
-        try:
-            r = requests.get(url, timeout=15)
-            r.raise_for_status()
-            ct = r.headers.get("Content-Type", "")
-            ext = _ext_from_content_type(ct) or ".png"
-            return r.content, ext
-        except Exception:
-            return None, ""
-    return None, ""
+        return urlparse(urljoin(base_url, src)).netloc.lower()
+    return None
+
+
+def _source_key(src: str, base_url: str | None) -> str:
+    """The source stage_src fetches or decodes for src (relative URLs resolved, fragments dropped)."""
+    src = (src or "").strip()
+    if src.startswith("http://") or src.startswith("https://"):
+        return urldefrag(src)[0]
+    if src and base_url and not src.startswith("data:"):
+        return urldefrag(urljoin(base_url, src))[0]
+    return src
+
+
+def resolve_all(
+    srcs: list[str],
+    base_url: str | None,
+    store: AssetStore,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> list[tuple[Path | None, str] | None]:
+    """stage_src for each of srcs, in order; network fetches run concurrently."""
+    results: list[tuple[Path | None, str] | None] = [None] * len(srcs)
+    by_host: dict[str, list[int]] = {}
+
+    def stage(i: int) -> tuple[Path | None, str] | None:
+        return stage_src(srcs[i], base_url, store, max_bytes)
+
+    for i, src in enumerate(srcs):
+        host = _fetch_host(src, base_url)
+        if host is None:
+            results[i] = stage(i)
+        else:
+            by_host.setdefault(host, []).append(i)
+    n_remote = sum(len(v) for v in by_host.values())
+    if n_remote <= 1 or max_concurrency <= 1:
+        for idxs in by_host.values():
+            for i in idxs:
+                results[i] = stage(i)
+        return results
+
+    limits = {host: threading.BoundedSemaphore(max(1, per_host)) for host in by_host}
+
+    def fetch(i: int, host: str) -> tuple[Path | None, str] | None:
+        with limits[host]:
+            return stage(i)
+
+    # Round-robin across hosts so one slow host does not hold every worker thread
+    order: list[tuple[int, str]] = []
+    queues = [(host, iter(idxs)) for host, idxs in by_host.items()]
+    while queues:
+        remaining = []
+        for host, it in queues:
+            i = next(it, None)
+            if i is not None:
+                order.append((i, host))
+                remaining.append((host, it))
+        queues = remaining
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, n_remote)) as pool:
+        futures = [(i, pool.submit(fetch, i, host)) for i, host in order]
+        for i, fut in futures:
+            results[i] = fut.result()
+    return results
 
 
 def process_assets(
     doc: dict[str, Any],
     assets_dir: Path,
     base_url: str | None = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    max_bytes: int = DEFAULT_MAX_BYTES,
 ) -> dict[str, Any]:
     doc = dict(doc)
     sections = list(doc.get("sections") or [])
     ensure_dir(assets_dir)
     base_url = base_url or (doc.get("meta") or {}).get("source", {}).get("url")
 
-    for sec in sections:
-        if sec.get("type") != "figure" or not sec.get("assets"):
-            continue
-        new_assets = []
-        for a in sec["assets"]:
-            orig = a.get("_original_src")
-            if not orig:
-                new_assets.append({
-                    "asset_id": a.get("asset_id") or "",
-                    "path": a.get("path") or "",
-                    "caption": a.get("caption"),
-                })
+    srcs = [
+        a["_original_src"]
+        for sec in sections
+        if sec.get("type") == "figure" and sec.get("assets")
+        for a in sec["assets"]
+        if a.get("_original_src")
+    ]
+    # Repeated sources (icons, dividers, avatars) are fetched once and fanned out to every figure
+    keys = [_source_key(src, base_url) for src in srcs]
+    unique = list(dict.fromkeys(keys))
+    store = get_store(assets_dir)
+    staged = resolve_all(unique, base_url, store, max_concurrency, per_host, max_bytes)
+    by_key = dict(zip(unique, staged))
+    pending = iter(keys)
+    try:
+        for sec in sections:
+            if sec.get("type") != "figure" or not sec.get("assets"):
                 continue
-            data, ext = resolve_src(orig, base_url)
-            if not data:
+            new_assets = []
+            for a in sec["assets"]:
+                orig = a.get("_original_src")
+                if not orig:
+                    new_assets.append({
+                        "asset_id": a.get("asset_id") or "",
+                        "path": a.get("path") or "",
+                        "caption": a.get("caption"),
+                    })
+                    continue
+                key = next(pending)
+                item = by_key[key]
+                if item is None:
+                    new_assets.append({
+                        "asset_id": "",
+                        "path": "",
+                        "caption": a.get("caption"),
+                    })
+                    continue
+                tmp, asset_id = item
+                if tmp is not None:
+                    store.put_file(tmp, asset_id)
+                    # Later references to the same source reuse the stored file
+                    by_key[key] = (None, asset_id)
+                rel_path = f"assets/{asset_id}"
                 new_assets.append({
-                    "asset_id": "",
-                    "path": "",
+                    "asset_id": asset_id,
+                    "path": rel_path,
                     "caption": a.get("caption"),
                 })
-                continue
-            asset_id = _asset_id_from_bytes(data, ext)
-            out_path = assets_dir / asset_id
-            out_path.write_bytes(data)
-            rel_path = f"assets/{asset_id}"
-            new_assets.append({
-                "asset_id": asset_id,
-                "path": rel_path,
-                "caption": a.get("caption"),
-            })
-        sec["assets"] = new_assets
+            sec["assets"] = new_assets
+    finally:
+        for item in staged:
+            if item is not None and item[0] is not None:
+                item[0].unlink(missing_ok=True)
+    if doc.get("doc_id"):
+        asset_ids = [a["asset_id"] for sec in sections for a in sec.get("assets") or [] if a.get("asset_id")]
+        store.set_refs(doc["doc_id"], asset_ids)
     doc["sections"] = sections
     return doc
@@ -0,0 +1,147 @@
+"""
+Decode data: URIs (RFC 2397) for the assets stage without regexes over the payload.
+Vendored from ingest/data_uri.py.
+
+The header (everything before the first comma) is parsed by slicing: media type, ;name=value
+parameters (charset etc.) and the ;base64 flag, so forms like data:image/svg+xml;base64 or
+data:image/png;name=a.png;base64 are accepted. Base64 payloads are decoded by
+binascii.a2b_base64 straight from the URI: a str is decoded in B64_CHUNK slices (each slice is
+encoded and stripped on its own) and bytes through a memoryview, so the payload is not copied
+whole into a regex group or an encoded copy; only the decoded slices are joined.
+Other payloads are percent-decoded, using the charset parameter for any raw non-ASCII text.
+
+This is a parsing-correctness and memory change, not a speedup: both this and the old regex +
+base64.b64decode path spend their time in binascii, and ingest/bench/data_uri.py measures
+them within noise of each other (1.0-1.1x on a 5 MB image). Peak memory for that image drops
+from 13.3 MB to 10.1 MB (the decoded slices plus the joined result).
+"""
+import binascii
+from urllib.parse import unquote_to_bytes
+
+DATA_SCHEME = "data:"
+# Longest header (media type + parameters) we look for a comma in
+MAX_HEADER = 256
+
+# Base64 characters decoded per slice of a str payload (a multiple of 4)
+B64_CHUNK = 64 * 1024
+# Bytes a2b_base64 skips (whitespace and anything else outside the base64 alphabet)
+_NON_B64 = bytes(c for c in range(256) if not (chr(c).isascii() and (chr(c).isalnum() or chr(c) in "+/=")))
+
+# Image subtypes whose file extension differs from the subtype
+_SUBTYPE_EXT = {
+    "jpeg": ".jpg",
+    "pjpeg": ".jpg",
+    "svg+xml": ".svg",
+    "x-icon": ".ico",
+    "vnd.microsoft.icon": ".ico",
+    "tiff": ".tif",
+}
+
+
+def parse_header(header: str) -> tuple[str, dict[str, str], bool] | None:
+    """
+    "data:<type>/<subtype>[;name=value]*[;base64]" (without the comma) -> (mime, params, base64),
+    or None if header is not a data: URI header. mime and parameter names are lowercased.
+    """
+    if header[: len(DATA_SCHEME)].lower() != DATA_SCHEME:
+        return None
+    parts = header[len(DATA_SCHEME):].split(";")
+    mime = parts[0].strip().lower() or "text/plain"
+    params: dict[str, str] = {}
+    is_base64 = False
+    for part in parts[1:]:
+        part = part.strip()
+        if part.lower() == "base64":
+            is_base64 = True
+            continue
+        name, eq, value = part.partition("=")
+        if eq:
+            params[name.strip().lower()] = value.strip().strip('"')
+    return mime, params, is_base64
+
+
+def image_ext(mime: str) -> str | None:
+    """File extension for an image/* media type (".png", ".svg", ...), or None if not an image."""
+    kind, _, subtype = mime.partition("/")
+    if kind != "image":
+        return None
+    if not subtype:
+        return ".png"
+    ext = _SUBTYPE_EXT.get(subtype)
+    if ext is not None:
+        return ext
+    subtype = subtype.split("+", 1)[0]
+    if subtype.startswith("x-"):
+        subtype = subtype[2:]
+    return "." + subtype if subtype.isalnum() else None
+
+
+def decode_data_uri(src: str | bytes) -> tuple[bytes | None, str]:
+    """
+    Decode an image data: URI to (bytes, ext), or (None, "") if it is not an image data URI or
+    its payload does not decode. Whitespace inside a base64 payload is ignored.
+    """
+    if isinstance(src, str):
+        return _decode_str_uri(src)
+    raw = bytes(src)
+    comma = raw.find(b",", 0, MAX_HEADER)
+    if comma < 0:
+        return None, ""
+    parsed = parse_header(raw[:comma].decode("ascii"))
+    if parsed is None:
+        return None, ""
+    mime, params, is_base64 = parsed
+    ext = image_ext(mime)
+    if ext is None:
+        return None, ""
+    payload = memoryview(raw)[comma + 1:]
+    try:
+        data = binascii.a2b_base64(payload) if is_base64 else unquote_to_bytes(payload.tobytes())
+    except (binascii.Error, ValueError):
+        return None, ""
+    finally:
+        payload.release()
+    return (data, ext) if data else (None, "")
+
+
+def _decode_str_uri(src: str) -> tuple[bytes | None, str]:
+    comma = src.find(",", 0, MAX_HEADER)
+    parsed = parse_header(src[:comma]) if comma >= 0 else None
+    if parsed is None:
+        return None, ""
+    mime, params, is_base64 = parsed
+    ext = image_ext(mime)
+    if ext is None:
+        return None, ""
+    try:
+        if is_base64:
+            # isascii() scans without copying; a non-ASCII base64 payload does not decode
+            data = _a2b_base64_str(src, comma + 1) if src.isascii() else None
+        else:
+            # Raw non-ASCII text (such as an unescaped SVG) is encoded with the URI's charset
+            payload = src[comma + 1:]
+            data = unquote_to_bytes(payload if payload.isascii() else payload.encode(params.get("charset") or "utf-8"))
+    except (binascii.Error, ValueError, LookupError):
+        return None, ""
+    return (data, ext) if data else (None, "")
+
+
+def _a2b_base64_str(src: str, start: int) -> bytes:
+    """a2b_base64 of the ASCII str src[start:], one B64_CHUNK slice at a time."""
+    parts = []
+    carry = b""
+    for i in range(start, len(src), B64_CHUNK):
+        piece = carry + src[i : i + B64_CHUNK].encode("ascii")
+        if b"=" in piece:
+            # Padding ends the data (a2b_base64 ignores what follows it); the rest of the
+            # payload, normally just this slice, is decoded at once so split padding stays whole
+            parts.append(binascii.a2b_base64(carry + src[i:].encode("ascii")))
+            return b"".join(parts)
+        # Decode whole 4-character groups; the remainder starts the next slice
+        piece = piece.translate(None, _NON_B64)
+        cut = len(piece) - len(piece) % 4
+        parts.append(binascii.a2b_base64(piece[:cut]))
+        carry = piece[cut:]
+    if carry:
+        parts.append(binascii.a2b_base64(carry))
+    return b"".join(parts)
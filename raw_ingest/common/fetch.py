@@ -0,0 +1,218 @@
+"""
+Shared page fetch client for the site modules (run_one) and the paper router.
+
+fetch() issues GETs through the process-wide pooled session (http_client.get_session), so
+article pages and their images reuse keep-alive connections, and adds:
+
+  rate limit  a token bucket per host (rate requests/s, up to burst at once), shared by all
+              threads, so a concurrent batch never exceeds a host's budget
+  retries     429, 5xx, connection errors and timeouts are retried up to max_retries times
+              with exponential backoff and full jitter; a Retry-After header (seconds or an
+              HTTP date, capped at backoff_max) is honoured and also holds back the host's
+              other requests
+  cache       with an HttpCache (http_cache.py), fresh pages are served from disk and stale
+              ones revalidated with a conditional GET; cache_only never touches the network
+              (assets_doc asks cache_only() too, and then only uses assets already stored)
+  metrics     per host: requests, retries, errors, bytes, cache hits, 304s, time in requests
+              and time spent waiting for the bucket (stats() / format_stats())
+
+The last response is returned even when it is still an error, so callers keep using
+raise_for_status(). configure() sets the limits and the cache (the routers' --rate / --burst /
+--retries / --http-cache / --cache-only).
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import requests
+
+from http_cache import CacheMiss, HttpCache
+from http_client import get_session
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class FetchPolicy:
+    rate: float = 1.0  # requests per second per host (0 = unlimited)
+    burst: int = 2
+    max_retries: int = 3
+    backoff: float = 1.0  # first retry delay, doubled per attempt
+    backoff_max: float = 60.0
+
+
+DEFAULT_POLICY = FetchPolicy()
+
+
+class _Bucket:
+    """Token bucket for one host; hold() pushes every request back (Retry-After)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens: float | None = None
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+
+    def take(self, rate: float, burst: int) -> float:
+        """Reserve one request; returns the seconds to wait before sending it."""
+        with self.lock:
+            now = time.monotonic()
+            if self.tokens is None:
+                self.tokens = float(burst)
+            if rate > 0:
+                self.tokens = min(float(burst), self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            wait = max(0.0, self.not_before - now)
+            if rate <= 0:
+                return wait
+            self.tokens -= 1.0
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / rate)
+            return wait
+
+    def hold(self, seconds: float) -> None:
+        with self.lock:
+            self.not_before = max(self.not_before, time.monotonic() + seconds)
+
+
+_policy = DEFAULT_POLICY
+_cache: HttpCache | None = None
+_cache_only = False
+_buckets: dict[str, _Bucket] = defaultdict(_Bucket)
+_stats: dict[str, dict[str, float]] = defaultdict(
+    lambda: {"requests": 0, "retries": 0, "errors": 0, "bytes": 0, "cached": 0, "not_modified": 0, "seconds": 0.0, "waited": 0.0}
+)
+_lock = threading.Lock()
+
+
+def configure(policy: FetchPolicy = DEFAULT_POLICY, cache: HttpCache | None = None, cache_only: bool = False) -> None:
+    """Set the rate limit / retry policy and the response cache (cache_only needs a cache)."""
+    global _policy, _cache, _cache_only
+    if cache_only and cache is None:
+        raise ValueError("cache_only needs a cache")
+    _policy, _cache, _cache_only = policy, cache, cache_only
+
+
+def cache_only() -> bool:
+    """Whether fetches must stay off the network (the routers' --cache-only)."""
+    return _cache_only
+
+
+def _bucket(host: str) -> _Bucket:
+    with _lock:
+        return _buckets[host]
+
+
+def _count(host: str, **values: float) -> None:
+    with _lock:
+        row = _stats[host]
+        for key, value in values.items():
+            row[key] += value
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def fetch(url: str, headers: dict[str, str] | None = None, timeout: float = 45, **kwargs) -> requests.Response:
+    """
+    GET url with the host's rate limit and retries, through the cache when one is configured.
+    Returns the final response (check it with raise_for_status); raises the last requests
+    exception if every attempt failed to connect, or CacheMiss in cache_only mode.
+    """
+    policy, cache = _policy, _cache
+    host = (urlparse(url).hostname or "").lower()
+    entry = cache.lookup(url, headers) if cache is not None else None
+    if _cache_only and entry is None:
+        raise CacheMiss(f"not in the HTTP cache: {url}")
+    if entry is not None and (_cache_only or entry["fresh_until"] > time.time()):
+        _count(host, cached=1)
+        return cache.response(url, entry)
+    sent = headers
+    if entry is not None:
+        sent = {**(headers or {}), **cache.conditional_headers(entry)}
+    bucket = _bucket(host)
+    session = get_session()
+    attempt = 0
+    while True:
+        wait = bucket.take(policy.rate, policy.burst)
+        if wait > 0:
+            _count(host, waited=wait)
+            time.sleep(wait)
+        t0 = time.perf_counter()
+        try:
+            resp = session.get(url, headers=sent, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _count(host, requests=1, errors=1, seconds=time.perf_counter() - t0)
+            if attempt >= policy.max_retries:
+                raise
+            delay = None
+        else:
+            _count(host, requests=1, bytes=len(resp.content), seconds=time.perf_counter() - t0)
+            if resp.status_code == 304 and entry is not None:
+                _count(host, not_modified=1)
+                return cache.response(url, cache.refresh(url, entry, resp))
+            if resp.status_code not in RETRY_STATUSES or attempt >= policy.max_retries:
+                if resp.status_code >= 400:
+                    _count(host, errors=1)
+                elif cache is not None:
+                    cache.store(url, headers, resp)
+                return resp
+            delay = retry_after_seconds(resp.headers.get("Retry-After"))
+            if delay is not None:
+                delay = min(delay, policy.backoff_max)
+                bucket.hold(delay)
+            resp.close()
+        if delay is None:
+            delay = random.uniform(0, min(policy.backoff_max, policy.backoff * 2**attempt))
+        attempt += 1
+        _count(host, retries=1)
+        time.sleep(delay)
+
+
+def _reset_after_fork() -> None:
+    global _lock
+    _buckets.clear()
+    _stats.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def stats() -> dict[str, dict[str, float]]:
+    """Per-host counters since the process started."""
+    with _lock:
+        return {host: dict(row) for host, row in _stats.items()}
+
+
+def format_stats() -> str:
+    """One line per host, busiest first."""
+    lines = []
+    for host, row in sorted(stats().items(), key=lambda kv: -kv[1]["seconds"]):
+        n = max(1, row["requests"])
+        lines.append(
+            f"  {host:32s} requests={int(row['requests']):<4d} retries={int(row['retries']):<3d} "
+            f"errors={int(row['errors']):<3d} cached={int(row['cached']):<4d} 304={int(row['not_modified']):<4d} "
+            f"avg={row['seconds'] / n:.2f}s waited={row['waited']:.1f}s "
+            f"kb={row['bytes'] / 1024:.0f}"
+        )
+    return "\n".join(lines)
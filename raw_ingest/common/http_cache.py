@@ -0,0 +1,256 @@
+"""
+On-disk HTTP cache for page fetches (fetch.py), so a repeated batch costs conditional requests
+instead of full downloads.
+
+Bodies live under <root>/<hh>/<sha256(url)>; a SQLite index (<root>/.index.sqlite3) keeps the
+URL's validators (ETag, Last-Modified), the response headers and a freshness deadline computed
+as a private cache would (RFC 9111): Cache-Control max-age, else Expires - Date, else 10% of
+the time since Last-Modified (at most HEURISTIC_MAX), minus Age; no-cache means always
+revalidate. Responses marked no-store, Vary: *, or with a status other than 200 are not
+stored, and an entry only answers requests whose Vary'd headers match.
+
+A fresh entry is served without a request; a stale one is revalidated with If-None-Match /
+If-Modified-Since, and a 304 refreshes it. With cache_only (the routers' --cache-only) every
+fetch is answered from the cache, stale or not, and a miss raises CacheMiss.
+"""
+import email.utils
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+INDEX_NAME = ".index.sqlite3"
+SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url           TEXT PRIMARY KEY,
+    body          TEXT NOT NULL,
+    headers       TEXT NOT NULL,
+    vary          TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    stored_at     REAL NOT NULL,
+    fresh_until   REAL NOT NULL,
+    size          INTEGER NOT NULL
+)
+"""
+# user_version -> statements upgrading the previous version
+_MIGRATIONS: dict[int, tuple[str, ...]] = {}
+# Cap on heuristic freshness (responses with Last-Modified but no explicit lifetime)
+HEURISTIC_MAX = 24 * 3600.0
+# Mode of cached bodies: mkstemp creates 0600 temp files. Fixed, like asset_store.FILE_MODE,
+# rather than read from the umask (which can only be read by setting it process-wide).
+FILE_MODE = 0o644
+# Response headers kept with the body (transfer-level headers are dropped: bodies are decoded)
+_KEEP_HEADERS = ("Content-Type", "Content-Language", "Date", "ETag", "Last-Modified", "Cache-Control", "Expires", "Vary")
+
+
+class CacheMiss(requests.RequestException):
+    """cache_only fetch of a URL that is not in the cache."""
+
+
+def _http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_control(headers) -> dict[str, str]:
+    directives = {}
+    for part in (headers.get("Cache-Control") or "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip().strip('"')
+    return directives
+
+
+def freshness(headers, now: float | None = None) -> float:
+    """Seconds a response with these headers stays fresh from now (0 = revalidate first)."""
+    now = time.time() if now is None else now
+    cc = _cache_control(headers)
+    if "no-cache" in cc or "no-store" in cc:
+        return 0.0
+    date = _http_date(headers.get("Date")) or now
+    if cc.get("max-age", "").isdigit():
+        lifetime = float(cc["max-age"])
+    elif headers.get("Expires"):
+        expires = _http_date(headers.get("Expires"))
+        lifetime = (expires - date) if expires is not None else 0.0
+    else:
+        last_modified = _http_date(headers.get("Last-Modified"))
+        lifetime = min(HEURISTIC_MAX, 0.1 * (date - last_modified)) if last_modified is not None else 0.0
+    age = headers.get("Age") or ""
+    return max(0.0, lifetime - (float(age) if age.isdigit() else 0.0))
+
+
+def _vary_key(vary: str | None, request_headers: dict[str, str] | None) -> str | None:
+    """The request header values a response varies on, as JSON (None when it does not vary)."""
+    names = sorted({n.strip().lower() for n in (vary or "").split(",") if n.strip()})
+    if not names:
+        return None
+    sent = CaseInsensitiveDict(request_headers or {})
+    return json.dumps({n: sent.get(n) for n in names}, sort_keys=True)
+
+
+class HttpCache:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = _open_index(self.root / INDEX_NAME)
+        return self._conn
+
+    def _body_path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    def lookup(self, url: str, request_headers: dict[str, str] | None = None) -> dict | None:
+        """Entry for url (body, headers, etag, last_modified, fresh_until) if it can answer this request."""
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT body, headers, vary, etag, last_modified, fresh_until FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not self._body_path(row[0]).exists():
+            return None
+        entry = dict(zip(("body", "headers", "vary", "etag", "last_modified", "fresh_until"), row))
+        entry["headers"] = json.loads(entry["headers"])
+        if entry["vary"] != _vary_key(entry["headers"].get("Vary"), request_headers):
+            return None
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict[str, str]:
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def response(self, url: str, entry: dict) -> requests.Response:
+        """A 200 requests.Response carrying the cached body and headers."""
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.reason = "OK"
+        resp.url = url
+        resp.headers = CaseInsensitiveDict(entry["headers"])
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp._content = self._body_path(entry["body"]).read_bytes()
+        return resp
+
+    def store(self, url: str, request_headers: dict[str, str] | None, resp: requests.Response) -> bool:
+        """Keep a 200 response unless it is no-store or Vary: *; returns whether it was stored."""
+        if resp.status_code != 200 or "no-store" in _cache_control(resp.headers) or resp.headers.get("Vary", "").strip() == "*":
+            return False
+        headers = {k: resp.headers[k] for k in _KEEP_HEADERS if k in resp.headers}
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        final = self._body_path(name)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".", suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            out.write(resp.content)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, final)
+        self._record(url, name, headers, _vary_key(headers.get("Vary"), request_headers), len(resp.content))
+        return True
+
+    def refresh(self, url: str, entry: dict, resp: requests.Response) -> dict:
+        """Merge a 304's headers into entry and restart its freshness; returns the updated entry."""
+        headers = dict(entry["headers"])
+        headers.update({k: resp.headers[k] for k in _KEEP_HEADERS if k in resp.headers})
+        size = self._body_path(entry["body"]).stat().st_size
+        self._record(url, entry["body"], headers, entry["vary"], size)
+        return dict(entry, headers=headers)
+
+    def _record(self, url: str, name: str, headers: dict[str, str], vary: str | None, size: int) -> None:
+        now = time.time()
+        conn = self.conn
+        with self._lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (url, body, headers, vary, etag, last_modified, stored_at, fresh_until, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    name,
+                    json.dumps(headers),
+                    vary,
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    now,
+                    now + freshness(headers, now),
+                    size,
+                ),
+            )
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _open_index(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another process may have migrated meanwhile
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                for stmt in _SCHEMA.split(";"):
+                    if stmt.strip():
+                        conn.execute(stmt)
+                version = 1
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                for stmt in _MIGRATIONS[v]:
+                    conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return conn
+
+
+# One cache per directory per process; dropped after fork (sqlite handles must not cross)
+_CACHES: dict[Path, HttpCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(root: Path) -> HttpCache:
+    key = Path(root).resolve()
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = _CACHES[key] = HttpCache(key)
+    return cache
+
+
+def _reset_after_fork() -> None:
+    global _CACHES_LOCK
+    _CACHES.clear()
+    _CACHES_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
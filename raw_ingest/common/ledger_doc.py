@@ -0,0 +1,97 @@
+"""
+Record site-router RawDocs in the shared job ledger (<rawdocs_dir>/ledger.sqlite3).
+Vendored subset of ingest/ledger.py: a RawDoc written here is claimed before its meta.json
+appears, so the poller never picks it up for the generic adapter, and marked done once its
+Document is written. A run that dies in between is released on the poller's next pass: at
+once when the poller runs on the same host, otherwise after ledger.STALE_AFTER.
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+LEDGER_NAME = "ledger.sqlite3"
+
+# Keep in sync with ingest/ledger.py
+SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    rawdoc_id   TEXT PRIMARY KEY,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    doc_id      TEXT,
+    stages      TEXT,
+    worker      TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, updated_at);
+"""
+_MIGRATIONS = {
+    2: (
+        "ALTER TABLE jobs ADD COLUMN next_attempt_at REAL",
+        "CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, next_attempt_at)",
+    ),
+}
+
+
+def open_ledger(rawdocs_dir: Path) -> sqlite3.Connection:
+    path = Path(rawdocs_dir) / LEDGER_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                for stmt in _SCHEMA.split(";"):
+                    if stmt.strip():
+                        conn.execute(stmt)
+                version = 1
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                for stmt in _MIGRATIONS[v]:
+                    conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return conn
+
+
+def record_running(rawdocs_dir: Path, rawdoc_id: str) -> None:
+    """Insert rawdoc_id as a running job owned by this process."""
+    now = time.time()
+    conn = open_ledger(rawdocs_dir)
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (rawdoc_id, state, attempts, worker, created_at, updated_at, started_at) "
+            "VALUES (?, 'running', 1, ?, ?, ?, ?)",
+            (rawdoc_id, f"{socket.gethostname()}:{os.getpid()}", now, now, now),
+        )
+    finally:
+        conn.close()
+
+
+def record_done(rawdocs_dir: Path, rawdoc_id: str, doc_id: str) -> None:
+    """Mark rawdoc_id done with its doc_id, whatever its current state."""
+    now = time.time()
+    conn = open_ledger(rawdocs_dir)
+    try:
+        conn.execute(
+            "INSERT INTO jobs (rawdoc_id, state, attempts, doc_id, stages, created_at, updated_at, finished_at) "
+            "VALUES (?, 'done', 1, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (rawdoc_id) DO UPDATE SET state = 'done', doc_id = excluded.doc_id, last_error = NULL, "
+            "updated_at = excluded.updated_at, finished_at = excluded.finished_at",
+            (rawdoc_id, doc_id, json.dumps({}), now, now, now),
+        )
+    finally:
+        conn.close()
@@ -7,6 +7,8 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+from ledger_doc import record_running
+
 
 def write_rawdoc_html(
     html_bytes: bytes,
@@ -15,7 +17,8 @@ def write_rawdoc_html(
 ) -> dict[str, Any]:
     """
     Write data/rawdocs/{uuid}.html and {uuid}.meta.json (singlefile_html, source_uri as given).
-    Returns the RawDoc dict (same keys as schemas/rawdoc.json).
+    Returns the RawDoc dict (same keys as schemas/rawdoc.json). The RawDoc is claimed in the
+    job ledger before its meta.json is written, so the ingest poller leaves it to the caller.
     """
     rawdocs_dir.mkdir(parents=True, exist_ok=True)
     rawdoc_id = str(uuid.uuid4())
@@ -34,6 +37,7 @@ def write_rawdoc_html(
         "content_length": len(html_bytes),
         "metadata": {},
     }
+    record_running(rawdocs_dir, rawdoc_id)
     meta_path = rawdocs_dir / f"{rawdoc_id}.meta.json"
     meta_path.write_text(json.dumps(rawdoc, ensure_ascii=False, indent=2), encoding="utf-8")
     return rawdoc
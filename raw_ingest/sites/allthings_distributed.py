@@ -20,10 +20,10 @@ _COMMON = _RAW_INGEST_ROOT / "common"
 if str(_COMMON) not in sys.path:
     sys.path.insert(0, str(_COMMON))
 
-import requests
 from bs4 import BeautifulSoup
 
 from assets_doc import process_assets
+from fetch import fetch
 from normalize_doc import normalize
 from rawdoc_write import write_rawdoc_html
 from repo_paths import REPO_ROOT
@@ -348,7 +348,7 @@ def run_one(
     timeout: int,
     do_validate: bool,
 ) -> None:
-    r = requests.get(fetch_url, headers=DEFAULT_HEADERS, timeout=timeout)
+    r = fetch(fetch_url, headers=DEFAULT_HEADERS, timeout=timeout)
     r.raise_for_status()
     html_bytes = r.content
 
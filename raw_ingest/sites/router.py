@@ -8,15 +8,33 @@ Fetch URLs on web.archive.org resolve the embedded original URL’s host and dis
 Batch: unsupported hosts print UNSUPPORTED to stderr and skip (exit 0 unless a run fails).
 Single URL: unsupported host -> exit 1.
 
+With --concurrency N, batch jobs run on N threads (fetches and asset downloads are I/O bound).
+Jobs are dispatched per fetch host: at most --per-host jobs of one host run at a time, and a
+host's jobs start at least --host-delay seconds apart (default 1; only applied with
+--concurrency > 1, so serial batches still run back to back), so different sites proceed in
+parallel while each host sees the same load as a serial run. A batch ends with a summary: ok / failed /
+unsupported counts and p50/p95 job latency per site module, then per-host fetch metrics.
+Page fetches go through common/fetch.py (per-host token bucket, retries on 429/5xx honouring
+Retry-After): --rate / --burst / --retries. Pages are cached on disk (common/http_cache.py,
+data/http_cache) and revalidated with conditional GETs, so a repeated batch costs mostly 304s;
+--cache-only replays a batch offline (images come from the asset store only; uncached ones
+are skipped), --no-http-cache disables the cache.
+
 Run from repo: make raw-ingest URL='...'  or  make raw-ingest-batch FILE=...
   cd raw_ingest && python sites/router.py --url '...'
+  cd raw_ingest && python sites/router.py --urls-file urls.txt --concurrency 8 [--per-host 1] [--host-delay 1]
 """
 from __future__ import annotations
 
 import argparse
 import importlib
+import math
 import sys
+import time
+from collections import defaultdict, deque
 from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -25,6 +43,10 @@ _COMMON = _RAW_INGEST_ROOT / "common"
 if str(_COMMON) not in sys.path:
     sys.path.insert(0, str(_COMMON))
 
+import fetch
+import http_cache
+import http_client
+import jsonio
 from repo_paths import REPO_ROOT
 
 import medium_freedium
@@ -106,6 +128,111 @@ def parse_urls_file_line(line: str) -> tuple[str, str] | None:
     return fetch, medium_freedium.canonical_url_from_freedium_fetch(fetch)
 
 
+@dataclass
+class JobResult:
+    fetch_url: str
+    site: str  # run_one's module, or "-" when unsupported
+    status: str  # ok | failed | unsupported
+    seconds: float = 0.0
+    error: str = ""
+
+
+def _run_job(runner: RunOne, fetch_url: str, canonical_url: str, run_args: tuple) -> JobResult:
+    site = runner.__module__
+    t0 = time.perf_counter()
+    try:
+        runner(fetch_url, canonical_url, *run_args)
+    except Exception as e:
+        print("error:", fetch_url, e, file=sys.stderr)
+        return JobResult(fetch_url, site, "failed", time.perf_counter() - t0, str(e))
+    return JobResult(fetch_url, site, "ok", time.perf_counter() - t0)
+
+
+def run_batch(
+    jobs: list[tuple[str, str]],
+    run_args: tuple,
+    concurrency: int = 1,
+    per_host: int = 1,
+    host_delay: float = 0.0,
+) -> list[JobResult]:
+    """
+    Run jobs (fetch_url, canonical_url) on `concurrency` threads with per-host limits; results
+    come back in completion order. Jobs of a host start in file order.
+    """
+    results: list[JobResult] = []
+    queues: dict[str, deque] = defaultdict(deque)
+    for fetch_url, canonical_url in jobs:
+        runner = resolve_run_one(fetch_url)
+        if runner is None:
+            print("UNSUPPORTED:", fetch_url, file=sys.stderr)
+            results.append(JobResult(fetch_url, "-", "unsupported"))
+            continue
+        queues[(urlparse(fetch_url).hostname or "").lower()].append((runner, fetch_url, canonical_url))
+
+    running: dict[str, int] = defaultdict(int)
+    next_start: dict[str, float] = defaultdict(float)
+    inflight: dict = {}
+    with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="router") as pool:
+        while queues or inflight:
+            # Start every job whose host has a free slot and whose delay has passed
+            now = time.monotonic()
+            wake = None
+            for host in list(queues):
+                if len(inflight) >= concurrency:
+                    break
+                if running[host] >= per_host:
+                    continue
+                if next_start[host] > now:
+                    wake = min(wake or next_start[host], next_start[host])
+                    continue
+                runner, fetch_url, canonical_url = queues[host].popleft()
+                if not queues[host]:
+                    del queues[host]
+                print("---", fetch_url, file=sys.stderr)
+                running[host] += 1
+                next_start[host] = now + host_delay
+                inflight[pool.submit(_run_job, runner, fetch_url, canonical_url, run_args)] = host
+            if not inflight:
+                time.sleep(max(0.0, (wake or now) - now))
+                continue
+            timeout = None if wake is None else max(0.0, wake - time.monotonic())
+            done, _ = wait(inflight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                running[inflight.pop(fut)] -= 1
+                results.append(fut.result())
+    return results
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of values (non-empty)."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))]
+
+
+def print_summary(results: list[JobResult], elapsed: float) -> None:
+    """Totals, then per site: jobs, failures and p50/p95 latency of the jobs that ran."""
+    count = defaultdict(int)
+    for r in results:
+        count[r.status] += 1
+    print(
+        f"summary: ok={count['ok']} failed={count['failed']} unsupported={count['unsupported']} wall={elapsed:.1f}s",
+        file=sys.stderr,
+    )
+    by_site: dict[str, list[JobResult]] = defaultdict(list)
+    for r in results:
+        if r.status != "unsupported":
+            by_site[r.site].append(r)
+    for site in sorted(by_site):
+        rs = by_site[site]
+        secs = [r.seconds for r in rs]
+        failed = sum(1 for r in rs if r.status == "failed")
+        print(
+            f"  {site:24s} jobs={len(rs):<4d} failed={failed:<4d} "
+            f"p50={_percentile(secs, 0.5):.2f}s p95={_percentile(secs, 0.95):.2f}s",
+            file=sys.stderr,
+        )
+
+
 def main() -> None:
     _load_registry()
 
@@ -121,7 +248,23 @@ def main() -> None:
     ap.add_argument("--docs", default=None, help="Docs dir (default: <repo>/data/docs)")
     ap.add_argument("--timeout", type=int, default=45, help="HTTP timeout seconds")
     ap.add_argument("--no-validate", action="store_true", help="Skip jsonschema validation")
+    ap.add_argument("--compact", action="store_true", help="Write document JSON without indentation (smaller, faster)")
+    ap.add_argument("--concurrency", type=int, default=1, help="Batch: jobs running at once (threads)")
+    ap.add_argument("--per-host", type=int, default=1, help="Batch: jobs running at once per fetch host")
+    ap.add_argument("--host-delay", type=float, default=1.0, help="Batch with --concurrency > 1: seconds between job starts on one host")
+    ap.add_argument("--rate", type=float, default=fetch.DEFAULT_POLICY.rate, help="Page fetches per second per host (0 = unlimited)")
+    ap.add_argument("--burst", type=int, default=fetch.DEFAULT_POLICY.burst, help="Page fetches per host allowed back to back")
+    ap.add_argument("--retries", type=int, default=fetch.DEFAULT_POLICY.max_retries, help="Retries on 429/5xx and connection errors")
+    ap.add_argument("--http-cache", default=None, help="Page cache dir (default: <repo>/data/http_cache)")
+    ap.add_argument("--no-http-cache", action="store_true", help="Always fetch pages in full")
+    ap.add_argument("--cache-only", action="store_true", help="Offline: pages from the HTTP cache only (misses fail), images from the asset store only (misses skipped)")
     args = ap.parse_args()
+    jsonio.configure(compact=args.compact)
+    if args.cache_only and args.no_http_cache:
+        print("--cache-only needs the HTTP cache", file=sys.stderr)
+        sys.exit(2)
+    cache = None if args.no_http_cache else http_cache.get_cache(Path(args.http_cache or REPO_ROOT / "data" / "http_cache"))
+    fetch.configure(fetch.FetchPolicy(rate=args.rate, burst=max(1, args.burst), max_retries=args.retries), cache, args.cache_only)
 
     rawdocs_dir = Path(args.rawdocs or REPO_ROOT / "data" / "rawdocs")
     assets_dir = Path(args.assets or REPO_ROOT / "data" / "assets")
@@ -161,35 +304,30 @@ def main() -> None:
         )
         jobs = [(single, canonical)]
 
-    failed = 0
-    batch = len(jobs) > 1 or bool(args.urls_file)
-
-    for fetch_url, canonical_url in jobs:
-        if batch:
-            print("---", fetch_url, file=sys.stderr)
-        runner = resolve_run_one(fetch_url)
+    run_args = (rawdocs_dir, assets_dir, docs_dir, args.timeout, do_validate)
+    if not (len(jobs) > 1 or args.urls_file):
+        runner = resolve_run_one(single)
         if runner is None:
-            if batch:
-                print("UNSUPPORTED:", fetch_url, file=sys.stderr)
-            else:
-                print("unsupported site:", fetch_url, file=sys.stderr)
-                sys.exit(1)
-            continue
+            print("unsupported site:", single, file=sys.stderr)
+            sys.exit(1)
         try:
-            runner(
-                fetch_url,
-                canonical_url,
-                rawdocs_dir,
-                assets_dir,
-                docs_dir,
-                args.timeout,
-                do_validate,
-            )
+            runner(jobs[0][0], jobs[0][1], *run_args)
         except Exception as e:
             print("error:", e, file=sys.stderr)
-            failed += 1
+            sys.exit(1)
+        return
 
-    if failed:
+    if args.concurrency > 1:
+        # Concurrent jobs fetch assets from the same CDNs; keep their connections alive
+        http_client.configure(pool_maxsize=http_client.POOL_MAXSIZE * args.concurrency)
+    t0 = time.perf_counter()
+    # Serial batches keep running back to back; the delay paces hosts shared by parallel jobs
+    host_delay = args.host_delay if args.concurrency > 1 else 0.0
+    results = run_batch(jobs, run_args, args.concurrency, max(1, args.per_host), host_delay)
+    print_summary(results, time.perf_counter() - t0)
+    print("fetches:", file=sys.stderr)
+    print(fetch.format_stats(), file=sys.stderr)
+    if any(r.status == "failed" for r in results):
         sys.exit(1)
 
 
@@ -18,10 +18,10 @@ _RAW_INGEST_COMMON = _RAW_PAPER_ROOT.parent / "raw_ingest" / "common"
 if str(_RAW_INGEST_COMMON) not in sys.path:
     sys.path.insert(0, str(_RAW_INGEST_COMMON))
 
-import requests
 from bs4 import BeautifulSoup, NavigableString, Tag
 
 from assets_doc import process_assets
+from fetch import fetch
 from normalize_doc import normalize
 from rawdoc_write import write_rawdoc_html
 from repo_paths import REPO_ROOT
@@ -459,7 +459,7 @@ def run_one(
 
     canonical = (canonical_url or "").strip() or abs_canonical_url(fetch_effective)
 
-    resp = requests.get(
+    resp = fetch(
         fetch_effective,
         headers=DEFAULT_HEADERS,
         timeout=timeout,
@@ -23,6 +23,9 @@ _RAW_INGEST_COMMON = _RAW_PAPER_ROOT.parent / "raw_ingest" / "common"
 if str(_RAW_INGEST_COMMON) not in sys.path:
     sys.path.insert(0, str(_RAW_INGEST_COMMON))
 
+import fetch
+import http_cache
+import jsonio
 from repo_paths import REPO_ROOT
 
 import arxiv_html
@@ -111,7 +114,19 @@ def main() -> None:
     ap.add_argument("--docs", default=None, help="Docs dir (default: <repo>/data/docs)")
     ap.add_argument("--timeout", type=int, default=45, help="HTTP timeout seconds")
     ap.add_argument("--no-validate", action="store_true", help="Skip jsonschema validation")
+    ap.add_argument("--compact", action="store_true", help="Write document JSON without indentation (smaller, faster)")
+    ap.add_argument("--rate", type=float, default=fetch.DEFAULT_POLICY.rate, help="Page fetches per second per host (0 = unlimited)")
+    ap.add_argument("--retries", type=int, default=fetch.DEFAULT_POLICY.max_retries, help="Retries on 429/5xx and connection errors")
+    ap.add_argument("--http-cache", default=None, help="Page cache dir (default: <repo>/data/http_cache)")
+    ap.add_argument("--no-http-cache", action="store_true", help="Always fetch pages in full")
+    ap.add_argument("--cache-only", action="store_true", help="Offline: pages from the HTTP cache only (misses fail), images from the asset store only (misses skipped)")
     args = ap.parse_args()
+    jsonio.configure(compact=args.compact)
+    if args.cache_only and args.no_http_cache:
+        print("--cache-only needs the HTTP cache", file=sys.stderr)
+        sys.exit(2)
+    cache = None if args.no_http_cache else http_cache.get_cache(Path(args.http_cache or REPO_ROOT / "data" / "http_cache"))
+    fetch.configure(fetch.FetchPolicy(rate=args.rate, max_retries=args.retries), cache, args.cache_only)
 
     rawdocs_dir = Path(args.rawdocs or REPO_ROOT / "data" / "rawdocs")
     assets_dir = Path(args.assets or REPO_ROOT / "data" / "assets")